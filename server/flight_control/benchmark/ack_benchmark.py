@@ -0,0 +1,129 @@
+"""
+指令回执测试：在fleet_loadtest的进程内环境中，模拟无人机收到指令后与无人机端flightControl相同地回复
+dispatched和completed回执（中间模拟执行耗时），前端请求带waitAck等待回执，
+统计HTTP请求耗时、服务器测得的往返耗时（command_round_trip_seconds）和执行耗时，并检查是否有无人机未回执
+
+用法（在server/flight_control目录下执行）：
+    python benchmark/ack_benchmark.py
+    python benchmark/ack_benchmark.py --fleet 100 --commands 50 --execution-ms 20 --stage completed
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fleet_loadtest  # noqa: E402  安装amqp_standin并切换到server/flight_control目录
+from fleet_loadtest import SimulatedUAV, SERVICE_NAME, amqp_standin, uavCodec, percentile  # noqa: E402
+from modules import ack  # noqa: E402
+from modules import metrics  # noqa: E402
+
+
+class AckingUAV(SimulatedUAV):
+    """收到指令后回复回执的模拟无人机，回执字段与无人机端flightControl.CommandAck相同"""
+
+    executionTime = 0.0
+
+    def reply(self, dataPackage):
+        data = {"clientName": self.clientName, "dataType": "ack", "dataPackage": dataPackage}
+        properties = amqp_standin.BasicProperties(content_type=uavCodec.contentType(self.codecName),
+                                                  headers={uavCodec.ACCEPT_HEADER: self.codecName})
+        self.client.send(SERVICE_NAME, uavCodec.encode(data, self.codecName), properties)
+
+    def dispatchService(self):
+        while True:
+            messagePackage = self.inbox.get()
+            if messagePackage.get("dataType") not in ("service", "plan"):
+                continue
+            receivedAt = time.time()
+            commandId = messagePackage.get("dataPackage", {}).get("commandId")
+            dispatchedAt = time.time()
+            self.reply({"commandId": commandId, "stage": "dispatched", "receivedAt": receivedAt,
+                        "dispatchedAt": dispatchedAt})
+            if self.executionTime:
+                time.sleep(self.executionTime)
+            self.reply({"commandId": commandId, "stage": "completed", "receivedAt": receivedAt,
+                        "dispatchedAt": dispatchedAt, "completedAt": time.time(), "status": "success", "msg": ""})
+
+
+def operatorWorker(port, fleetNames, count, stage, timeout, httpLatencies, acks):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    body = json.dumps({"command": "start", "clientNameList": fleetNames,
+                       "flyCommand": {"x": 1, "y": 0, "z": 0, "specialInstruction": ""}, "encrypt": False,
+                       "waitAck": timeout, "waitAckStage": stage})
+    for _ in range(count):
+        start = time.perf_counter()
+        conn.request("POST", "/", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        resultList = json.loads(response.read())
+        httpLatencies.append(time.perf_counter() - start)
+        acks.extend(result.get("ack", {"stage": "missing"}) for result in resultList)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指令回执测试（进程内AMQP代理）")
+    parser.add_argument("--fleet", type=int, default=50, help="机群规模")
+    parser.add_argument("--commands", type=int, default=40, help="每个操作员下发的指令数")
+    parser.add_argument("--operators", type=int, default=4, help="并发的前端操作员数")
+    parser.add_argument("--execution-ms", type=float, default=10, help="模拟无人机执行每条指令的耗时（毫秒）")
+    parser.add_argument("--stage", default="completed", choices=ack.STAGES, help="前端等待的回执阶段")
+    parser.add_argument("--timeout", type=float, default=10, help="前端等待回执的秒数")
+    parser.add_argument("--codec", default="binary", choices=["json", "binary"], help="模拟无人机声明的消息编码")
+    args = parser.parse_args()
+
+    AckingUAV.executionTime = args.execution_ms / 1000
+    httpLatencies, acks = [], []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        httpd = fleet_loadtest.startServer(shards=4, batchSize=100, workers=32)
+        uavs = [AckingUAV(f"uav{i:03d}", args.codec, None) for i in range(args.fleet)]
+        for uav in uavs:
+            uav.online()
+        fleet_loadtest.waitOnline([uav.clientName for uav in uavs])
+
+        fleetNames = [uav.clientName for uav in uavs]
+        threads = [threading.Thread(target=operatorWorker, args=(httpd.server_address[1], fleetNames, args.commands,
+                                                                 args.stage, args.timeout, httpLatencies, acks))
+                   for _ in range(args.operators)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        httpd.shutdown()
+
+    stages = {}
+    for item in acks:
+        stages[item["stage"]] = stages.get(item["stage"], 0) + 1
+    roundTrips = sorted(item["roundTripMs"] for item in acks if "roundTripMs" in item)
+    executions = [item["executionMs"] for item in acks if "executionMs" in item]
+    httpLatencies.sort()
+
+    print(f"机群{args.fleet}架，{args.operators}个操作员各{args.commands}条指令，等待{args.stage}回执，"
+          f"模拟执行{args.execution_ms}ms，耗时{elapsed:.2f}s")
+    print(f"回执阶段统计: {stages}")
+    print(f"HTTP请求耗时(ms) p50 {percentile(httpLatencies, 50) * 1000:.2f}  "
+          f"p99 {percentile(httpLatencies, 99) * 1000:.2f}")
+    print(f"往返耗时(ms)     p50 {percentile(roundTrips, 50):.2f}  p95 {percentile(roundTrips, 95):.2f}  "
+          f"p99 {percentile(roundTrips, 99):.2f}")
+    if executions:
+        print(f"执行耗时(ms)     中位数 {statistics.median(executions):.2f}")
+    cumulative, total, count = ack.roundTripSeconds.labels(fleetNames[0]).snapshot()
+    print(f"{fleetNames[0]}的command_round_trip_seconds: 次数{count}，平均{total / count * 1000:.2f}ms"
+          if count else f"{fleetNames[0]}没有往返耗时记录")
+    print(f"等待执行结束回执的指令数: {len(ack.pending)}")
+    text = metrics.render()
+    print("/metrics包含回执指标:", all(name in text for name in ("command_round_trip_seconds_bucket",
+                                                            "command_execution_seconds_bucket",
+                                                            "command_acks_total")))
+
+
+if __name__ == "__main__":
+    main()
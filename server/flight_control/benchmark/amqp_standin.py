@@ -0,0 +1,631 @@
+"""
+进程内的AMQP代理替身，用于在没有RabbitMQ服务器的情况下运行RabbitMQServer/RabbitMQClient。
+
+提供与pika 1.3接口兼容的BlockingConnection和SelectConnection（仅实现本项目用到的部分），
+以及支持direct/topic/fanout交换机、独占匿名队列、发布确认的内存代理。
+必须在导入RabbitMQServer/RabbitMQClient之前调用install()，用替身替换sys.modules中的pika。
+
+    import amqp_standin
+    broker = amqp_standin.install()
+    from modules.RabbitMQServer import RabbitMQServer
+"""
+import collections
+import heapq
+import itertools
+import sys
+import threading
+import time
+import types
+
+
+class AMQPError(Exception):
+    pass
+
+
+class ConnectionClosed(AMQPError):
+    pass
+
+
+class ChannelClosed(AMQPError):
+    pass
+
+
+# ---------------------------------------------------------------- 代理 --
+
+def topicMatches(pattern, routingKey):
+    """AMQP topic匹配：*匹配一个单词，#匹配零个或多个单词"""
+    patternWords = pattern.split(".")
+    keyWords = routingKey.split(".")
+
+    def match(p, k):
+        if p == len(patternWords):
+            return k == len(keyWords)
+        if patternWords[p] == "#":
+            return any(match(p + 1, i) for i in range(k, len(keyWords) + 1))
+        if k == len(keyWords):
+            return False
+        return (patternWords[p] == "*" or patternWords[p] == keyWords[k]) and match(p + 1, k + 1)
+
+    return match(0, 0)
+
+
+class BrokerQueue:
+    def __init__(self, name, owner, arguments):
+        self.name = name
+        self.owner = owner  # 独占队列所属的连接
+        self.arguments = arguments or {}
+        self.messages = collections.deque()
+        self.consumers = []  # 格式：[(channel, consumer_tag, callback, auto_ack), ...]
+        self.roundRobin = 0
+
+
+class Broker:
+    """内存中的AMQP代理，所有连接共享同一个实例"""
+
+    def __init__(self):
+        self.exchanges = {"": "direct"}
+        self.bindings = collections.defaultdict(list)  # 格式：{ exchange: [(routing_key, queue_name), ...] }
+        self.queues = {}
+        self.connections = set()
+        self.lock = threading.RLock()
+
+        self.published = 0
+        self.delivered = 0
+        self.unroutable = 0
+        self._queueIds = itertools.count(1)
+
+    def declareExchange(self, name, exchangeType):
+        with self.lock:
+            existing = self.exchanges.get(name)
+            if existing is not None and existing != exchangeType:
+                raise ChannelClosed(f"交换机{name}已声明为{existing}类型")
+            self.exchanges[name] = exchangeType
+
+    def declareQueue(self, name, connection, exclusive, arguments):
+        with self.lock:
+            if not name:
+                name = f"amq.gen-{next(self._queueIds):06d}"
+            if name not in self.queues:
+                self.queues[name] = BrokerQueue(name, connection if exclusive else None, arguments)
+            return name
+
+    def bindQueue(self, queueName, exchange, routingKey):
+        with self.lock:
+            if exchange not in self.exchanges:
+                raise ChannelClosed(f"交换机{exchange}不存在")
+            if queueName not in self.queues:
+                raise ChannelClosed(f"队列{queueName}不存在")
+            binding = (routingKey, queueName)
+            if binding not in self.bindings[exchange]:
+                self.bindings[exchange].append(binding)
+
+    def route(self, exchange, routingKey):
+        exchangeType = self.exchanges.get(exchange)
+        if exchangeType is None:
+            raise ChannelClosed(f"交换机{exchange}不存在")
+        if exchange == "":
+            return [routingKey] if routingKey in self.queues else []
+        result = []
+        for bindingKey, queueName in self.bindings[exchange]:
+            if exchangeType == "fanout" or \
+                    (exchangeType == "direct" and bindingKey == routingKey) or \
+                    (exchangeType == "topic" and topicMatches(bindingKey, routingKey)):
+                if queueName not in result:
+                    result.append(queueName)
+        return result
+
+    def publish(self, exchange, routingKey, body, properties):
+        """
+        :return: 是否路由到了至少一个队列
+        """
+        with self.lock:
+            self.published += 1
+            queueNames = self.route(exchange, routingKey)
+            if not queueNames:
+                self.unroutable += 1
+            method = types.SimpleNamespace(exchange=exchange, routing_key=routingKey, delivery_tag=0,
+                                           redelivered=False)
+            for queueName in queueNames:
+                brokerQueue = self.queues[queueName]
+                brokerQueue.messages.append((method, properties or BasicProperties(), body))
+                self._dispatch(brokerQueue)
+            return bool(queueNames)
+
+    def consume(self, queueName, channel, consumerTag, callback, autoAck):
+        with self.lock:
+            brokerQueue = self.queues.get(queueName)
+            if brokerQueue is None:
+                raise ChannelClosed(f"队列{queueName}不存在")
+            brokerQueue.consumers.append((channel, consumerTag, callback, autoAck))
+            self._dispatch(brokerQueue)
+
+    def cancelConsumers(self, channel):
+        with self.lock:
+            for brokerQueue in self.queues.values():
+                brokerQueue.consumers = [c for c in brokerQueue.consumers if c[0] is not channel]
+
+    def _dispatch(self, brokerQueue):
+        while brokerQueue.messages and brokerQueue.consumers:
+            index = brokerQueue.roundRobin % len(brokerQueue.consumers)
+            brokerQueue.roundRobin += 1
+            channel, consumerTag, callback, autoAck = brokerQueue.consumers[index]
+            method, properties, body = brokerQueue.messages.popleft()
+            deliver = types.SimpleNamespace(consumer_tag=consumerTag, delivery_tag=channel.nextDeliveryTag(),
+                                            redelivered=False, exchange=method.exchange,
+                                            routing_key=method.routing_key)
+            self.delivered += 1
+            channel.deliver(callback, deliver, properties, body)
+
+    def register(self, connection):
+        with self.lock:
+            self.connections.add(connection)
+
+    def unregister(self, connection):
+        with self.lock:
+            self.connections.discard(connection)
+            # 连接关闭时删除其独占队列
+            for name in [name for name, q in self.queues.items() if q.owner is connection]:
+                del self.queues[name]
+                for bindings in self.bindings.values():
+                    bindings[:] = [b for b in bindings if b[1] != name]
+
+    def disconnectAll(self):
+        """模拟代理重启或网络中断：强制关闭所有连接"""
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.forceClose("代理断开连接")
+
+    def stats(self):
+        with self.lock:
+            return {"published": self.published, "delivered": self.delivered, "unroutable": self.unroutable,
+                    "queues": len(self.queues), "connections": len(self.connections),
+                    "backlog": sum(len(q.messages) for q in self.queues.values())}
+
+
+g_broker = Broker()
+
+
+# ------------------------------------------------------- pika兼容的数据类 --
+
+class PlainCredentials:
+    def __init__(self, username, password, erase_on_connect=False):
+        self.username = username
+        self.password = password
+
+
+class ConnectionParameters:
+    def __init__(self, host="localhost", port=5672, credentials=None, **kwargs):
+        self.host = host
+        self.port = port
+        self.credentials = credentials
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+class BasicProperties:
+    def __init__(self, content_type=None, headers=None, **kwargs):
+        self.content_type = content_type
+        self.headers = headers
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+class _Method:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _Basic:
+    class Ack(_Method):
+        NAME = "Basic.Ack"
+
+    class Nack(_Method):
+        NAME = "Basic.Nack"
+
+    class Deliver(_Method):
+        NAME = "Basic.Deliver"
+
+    class Return(_Method):
+        NAME = "Basic.Return"
+
+
+class _Frame:
+    def __init__(self, method):
+        self.method = method
+
+
+# ----------------------------------------------------------- IO循环 --
+
+class IOLoop:
+    """单线程事件循环：定时器 + 线程安全的回调队列"""
+
+    def __init__(self):
+        self._callbacks = collections.deque()
+        self._timers = []
+        self._timerIds = itertools.count()
+        self._cancelled = set()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self.thread = None
+
+    def add_callback_threadsafe(self, callback):
+        with self._cond:
+            self._callbacks.append(callback)
+            self._cond.notify()
+
+    add_callback = add_callback_threadsafe
+
+    def call_later(self, delay, callback):
+        with self._cond:
+            timerId = next(self._timerIds)
+            heapq.heappush(self._timers, (time.monotonic() + delay, timerId, callback))
+            self._cond.notify()
+            return timerId
+
+    def remove_timeout(self, timerId):
+        with self._cond:
+            self._cancelled.add(timerId)
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+    def start(self):
+        self.thread = threading.current_thread()
+        self._stopping = False
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        self._stopping = False
+                        return
+                    now = time.monotonic()
+                    if self._callbacks:
+                        callback = self._callbacks.popleft()
+                        break
+                    if self._timers and self._timers[0][0] <= now:
+                        _, timerId, callback = heapq.heappop(self._timers)
+                        if timerId in self._cancelled:
+                            self._cancelled.discard(timerId)
+                            continue
+                        break
+                    timeout = self._timers[0][0] - now if self._timers else None
+                    self._cond.wait(timeout)
+            callback()
+
+
+# ------------------------------------------------------- 通道与连接基类 --
+
+class _ChannelBase:
+    def __init__(self, connection, channelNumber):
+        self.connection = connection
+        self.channel_number = channelNumber
+        self.is_open = True
+        self._deliveryTags = itertools.count(1)
+        self._publishTags = itertools.count(1)
+        self._confirming = False
+        self._consumerTags = itertools.count(1)
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    def nextDeliveryTag(self):
+        return next(self._deliveryTags)
+
+    def _checkOpen(self):
+        if not self.is_open or not self.connection.is_open:
+            raise ChannelClosed("通道已关闭")
+
+    def _publish(self, exchange, routing_key, body, properties):
+        """
+        :return: (确认模式下的delivery_tag或None, 是否路由到了队列)
+        """
+        self._checkOpen()
+        if isinstance(body, str):
+            body = body.encode()
+        routed = g_broker.publish(exchange, routing_key, bytes(body), properties)
+        return (next(self._publishTags) if self._confirming else None), routed
+
+    def _consume(self, queue, on_message_callback, auto_ack, consumer_tag):
+        self._checkOpen()
+        consumer_tag = consumer_tag or f"ctag{self.channel_number}.{next(self._consumerTags)}"
+        g_broker.consume(queue, self, consumer_tag, on_message_callback, auto_ack)
+        return consumer_tag
+
+    def _close(self):
+        if self.is_open:
+            self.is_open = False
+            g_broker.cancelConsumers(self)
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        pass
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        pass
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False, callback=None):
+        if callback:
+            self.connection.schedule(callback, _Frame(_Method(NAME="Basic.QosOk")))
+
+
+class _ConnectionBase:
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.is_open = True
+        self._channels = []
+        self._channelNumbers = itertools.count(1)
+        g_broker.register(self)
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+
+# -------------------------------------------------------- 阻塞连接 --
+
+class BlockingChannel(_ChannelBase):
+    def __init__(self, connection, channelNumber):
+        super().__init__(connection, channelNumber)
+        self._inbound = collections.deque()
+        self._cond = threading.Condition()
+        self._consuming = False
+
+    def deliver(self, callback, method, properties, body):
+        with self._cond:
+            self._inbound.append((callback, method, properties, body))
+            self._cond.notify()
+
+    def exchange_declare(self, exchange, exchange_type="direct", **kwargs):
+        self._checkOpen()
+        g_broker.declareExchange(exchange, str(getattr(exchange_type, "value", exchange_type)))
+        return _Frame(_Method(NAME="Exchange.DeclareOk"))
+
+    def queue_declare(self, queue="", exclusive=False, arguments=None, **kwargs):
+        self._checkOpen()
+        name = g_broker.declareQueue(queue, self.connection, exclusive, arguments)
+        return _Frame(_Method(NAME="Queue.DeclareOk", queue=name, message_count=0, consumer_count=0))
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        self._checkOpen()
+        g_broker.bindQueue(queue, exchange, routing_key if routing_key is not None else queue)
+        return _Frame(_Method(NAME="Queue.BindOk"))
+
+    def confirm_delivery(self):
+        # 内存代理的发布是同步完成的，确认模式下basic_publish直接视为已确认
+        self._confirming = True
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        # 阻塞通道不支持退回回调，mandatory消息无法路由时与真实代理一样静默丢弃
+        self._publish(exchange, routing_key, body, properties)
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False, consumer_tag=None,
+                      arguments=None):
+        return self._consume(queue, on_message_callback, auto_ack, consumer_tag)
+
+    def process_data_events(self, time_limit=0):
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        while True:
+            with self._cond:
+                while not self._inbound:
+                    if not self.is_open or not self.connection.is_open:
+                        raise ConnectionClosed("连接已关闭")
+                    if not self._consuming and deadline is None:
+                        return
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return
+                    self._cond.wait(remaining if remaining is not None else 0.5)
+                callback, method, properties, body = self._inbound.popleft()
+            callback(self, method, properties, body)
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+
+    def start_consuming(self):
+        self._consuming = True
+        while self._consuming:
+            self.process_data_events(time_limit=0.5)
+
+    def stop_consuming(self, consumer_tag=None):
+        self._consuming = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def close(self, reply_code=0, reply_text="Normal shutdown"):
+        self._close()
+        self._consuming = False
+        with self._cond:
+            self._cond.notify_all()
+
+
+class BlockingConnection(_ConnectionBase):
+    def __init__(self, parameters=None):
+        super().__init__(parameters)
+        self._callbacks = collections.deque()
+
+    def channel(self, channel_number=None):
+        if not self.is_open:
+            raise ConnectionClosed("连接已关闭")
+        channel = BlockingChannel(self, next(self._channelNumbers))
+        self._channels.append(channel)
+        return channel
+
+    def schedule(self, callback, *args):
+        callback(*args)
+
+    def add_callback_threadsafe(self, callback):
+        callback()
+
+    def process_data_events(self, time_limit=0):
+        for channel in list(self._channels):
+            channel.process_data_events(time_limit)
+
+    def sleep(self, duration):
+        time.sleep(duration)
+
+    def forceClose(self, reason):
+        self.close()
+
+    def close(self, reply_code=200, reply_text="Normal shutdown"):
+        if not self.is_open:
+            return
+        self.is_open = False
+        for channel in self._channels:
+            channel.close()
+        g_broker.unregister(self)
+
+
+# ---------------------------------------------------------- 异步连接 --
+
+class Channel(_ChannelBase):
+    """SelectConnection的异步通道，所有回调都在连接的IO循环线程中执行"""
+
+    def __init__(self, connection, channelNumber):
+        super().__init__(connection, channelNumber)
+        self._closeCallbacks = []
+        self._returnCallbacks = []
+        self._ackNackCallback = None
+
+    def deliver(self, callback, method, properties, body):
+        self.connection.ioloop.add_callback_threadsafe(
+            lambda: self.is_open and callback(self, method, properties, body))
+
+    def add_on_close_callback(self, callback):
+        self._closeCallbacks.append(callback)
+
+    def add_on_cancel_callback(self, callback):
+        pass
+
+    def add_on_return_callback(self, callback):
+        self._returnCallbacks.append(callback)
+
+    def exchange_declare(self, exchange, exchange_type="direct", passive=False, durable=False, auto_delete=False,
+                         internal=False, arguments=None, callback=None):
+        self._checkOpen()
+        g_broker.declareExchange(exchange, str(getattr(exchange_type, "value", exchange_type)))
+        if callback:
+            self.connection.schedule(callback, _Frame(_Method(NAME="Exchange.DeclareOk")))
+
+    def queue_declare(self, queue, passive=False, durable=False, exclusive=False, auto_delete=False, arguments=None,
+                      callback=None):
+        self._checkOpen()
+        name = g_broker.declareQueue(queue, self.connection, exclusive, arguments)
+        if callback:
+            self.connection.schedule(callback, _Frame(_Method(NAME="Queue.DeclareOk", queue=name, message_count=0,
+                                                              consumer_count=0)))
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None, callback=None):
+        self._checkOpen()
+        g_broker.bindQueue(queue, exchange, routing_key if routing_key is not None else queue)
+        if callback:
+            self.connection.schedule(callback, _Frame(_Method(NAME="Queue.BindOk")))
+
+    def confirm_delivery(self, ack_nack_callback, callback=None):
+        self._confirming = True
+        self._ackNackCallback = ack_nack_callback
+        if callback:
+            self.connection.schedule(callback, _Frame(_Method(NAME="Confirm.SelectOk")))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        tag, routed = self._publish(exchange, routing_key, body, properties)
+        if mandatory and not routed:
+            # 与真实代理相同：先退回消息，再确认
+            method = _Basic.Return(reply_code=312, reply_text="NO_ROUTE", exchange=exchange, routing_key=routing_key)
+            for callback in self._returnCallbacks:
+                self.connection.schedule(callback, self, method, properties or BasicProperties(), body)
+        if tag is not None:
+            self.connection.schedule(self._ackNackCallback,
+                                     _Frame(_Basic.Ack(delivery_tag=tag, multiple=False)))
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False, consumer_tag=None,
+                      arguments=None, callback=None):
+        tag = self._consume(queue, on_message_callback, auto_ack, consumer_tag)
+        if callback:
+            self.connection.schedule(callback, _Frame(_Method(NAME="Basic.ConsumeOk", consumer_tag=tag)))
+        return tag
+
+    def close(self, reply_code=0, reply_text="Normal shutdown"):
+        if not self.is_open:
+            return
+        self._close()
+        reason = ChannelClosed(reply_text)
+        for callback in self._closeCallbacks:
+            self.connection.schedule(callback, self, reason)
+
+
+class SelectConnection(_ConnectionBase):
+    def __init__(self, parameters=None, on_open_callback=None, on_open_error_callback=None, on_close_callback=None,
+                 custom_ioloop=None, internal_connection_workflow=True):
+        super().__init__(parameters)
+        self.ioloop = custom_ioloop or IOLoop()
+        self._onCloseCallback = on_close_callback
+        if on_open_callback:
+            self.ioloop.add_callback_threadsafe(lambda: on_open_callback(self))
+
+    def schedule(self, callback, *args):
+        self.ioloop.add_callback_threadsafe(lambda: callback(*args))
+
+    def channel(self, channel_number=None, on_open_callback=None):
+        if not self.is_open:
+            raise ConnectionClosed("连接已关闭")
+        channel = Channel(self, next(self._channelNumbers))
+        self._channels.append(channel)
+        if on_open_callback:
+            self.schedule(on_open_callback, channel)
+        return channel
+
+    def forceClose(self, reason):
+        self.ioloop.add_callback_threadsafe(lambda: self._closeWithReason(reason))
+
+    def close(self, reply_code=200, reply_text="Normal shutdown"):
+        self._closeWithReason(reply_text)
+
+    def _closeWithReason(self, reason):
+        if not self.is_open:
+            return
+        self.is_open = False
+        for channel in self._channels:
+            channel.close(reply_text=reason)
+        g_broker.unregister(self)
+        if self._onCloseCallback:
+            self.schedule(self._onCloseCallback, self, ConnectionClosed(reason))
+
+
+# ------------------------------------------------------------- 安装 --
+
+def buildModule():
+    pika = types.ModuleType("pika")
+    spec = types.ModuleType("pika.spec")
+    exceptions = types.ModuleType("pika.exceptions")
+
+    spec.Basic = _Basic
+    spec.BasicProperties = BasicProperties
+    exceptions.AMQPError = AMQPError
+    exceptions.AMQPConnectionError = ConnectionClosed
+    exceptions.ConnectionClosed = ConnectionClosed
+    exceptions.ChannelClosed = ChannelClosed
+    exceptions.StreamLostError = ConnectionClosed
+
+    pika.PlainCredentials = PlainCredentials
+    pika.ConnectionParameters = ConnectionParameters
+    pika.BasicProperties = BasicProperties
+    pika.BlockingConnection = BlockingConnection
+    pika.SelectConnection = SelectConnection
+    pika.spec = spec
+    pika.exceptions = exceptions
+    pika.broker = g_broker
+    return pika
+
+
+def install():
+    """
+    用替身替换pika模块，必须在导入使用pika的模块之前调用
+    :return: 代理实例
+    """
+    pika = buildModule()
+    sys.modules["pika"] = pika
+    sys.modules["pika.spec"] = pika.spec
+    sys.modules["pika.exceptions"] = pika.exceptions
+    return g_broker
@@ -0,0 +1,103 @@
+"""
+clientPool内存长稳测试：模拟100架无人机持续上报数据，观察服务器接收路径的内存占用是否保持平稳
+
+消息直接放入message.g_messageQueue，由真实的flightControl.messageRecvService消费，
+每处理一批消息记录一次tracemalloc统计的内存占用。
+用法（在server/flight_control目录下执行）：
+    python benchmark/clientpool_soak.py --uavs 100 --messages-per-uav 5000
+    python benchmark/clientpool_soak.py --drop-policy newest
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import message  # noqa: E402
+from modules import flightControl  # noqa: E402
+from modules import telemetry  # noqa: E402
+from modules.ringbuffer import DROP_NEWEST, DROP_OLDEST  # noqa: E402
+
+
+def makePackage(clientName, seq):
+    if seq % 4:
+        return {"clientName": clientName, "dataType": "telemetry",
+                "dataPackage": {"seq": seq, "time": time.time(), "lat": 30.57, "lon": 104.06, "alt": 500.0,
+                                "relativeAlt": 30.0, "vx": 1.0, "vy": 0.0, "vz": 0.0, "roll": 0.0, "pitch": 0.0,
+                                "yaw": 1.5, "xacc": 0.0, "yacc": 0.0, "zacc": -1.0, "xgyro": 0.0, "ygyro": 0.0,
+                                "zgyro": 0.0}}
+    return {"clientName": clientName, "dataType": "status",
+            "dataPackage": {"seq": seq, "mode": "AUTO", "battery": 87.5, "msg": "航点任务执行中"}}
+
+
+def waitProcessed():
+    # 等待接收线程处理完已放入的消息
+    while not message.g_messageQueue.empty():
+        time.sleep(0.01)
+    time.sleep(0.05)
+
+
+def checkAcceptsAfterRead(clientName, seq):
+    """
+    缓冲区满后取出数据，新的数据包应当被接收：DROP_NEWEST下取出前新数据包被丢弃，取出后写入
+    :return: 是否通过
+    """
+    dataBuffer = flightControl.clientPool[clientName]["dataBuffer"]
+    taken = len(flightControl.takeData(clientName))
+    message.g_messageQueue.put(makePackage(clientName, seq))
+    waitProcessed()
+    accepted = dataBuffer.unread == 1 and flightControl.latestData(clientName)["seq"] == seq
+    print(f"{clientName}取出{taken}个数据包后写入新数据包：{'通过' if accepted else '失败'}")
+    return accepted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="clientPool内存长稳测试")
+    parser.add_argument("--uavs", type=int, default=100, help="模拟的无人机数量")
+    parser.add_argument("--messages-per-uav", type=int, default=5000, help="每架无人机上报的消息数")
+    parser.add_argument("--samples", type=int, default=10, help="内存采样次数")
+    parser.add_argument("--capacity", type=int, default=256, help="clientPool每架无人机的缓冲区容量")
+    parser.add_argument("--telemetry-buffer", type=int, default=600, help="每架无人机的遥测缓冲区容量")
+    parser.add_argument("--drop-policy", choices=(DROP_OLDEST, DROP_NEWEST), default=DROP_OLDEST,
+                        help="clientPool缓冲区满时的丢弃策略")
+    args = parser.parse_args()
+
+    flightControl.g_poolCapacity = args.capacity
+    flightControl.g_dropPolicy = args.drop_policy
+    telemetry.g_bufferSize = args.telemetry_buffer
+    threading.Thread(target=flightControl.messageRecvService, daemon=True).start()
+
+    clientNames = [f"uav{i:03d}" for i in range(args.uavs)]
+    chunk = max(1, args.messages_per_uav // args.samples)
+
+    tracemalloc.start()
+    print(f"{'消息总数':>10} {'当前内存(KB)':>14} {'峰值内存(KB)':>14} {'耗时(s)':>9}")
+    seq = 0
+    start = time.perf_counter()
+    for _ in range(args.samples):
+        for _ in range(chunk):
+            seq += 1
+            for clientName in clientNames:
+                message.g_messageQueue.put(makePackage(clientName, seq))
+        waitProcessed()
+
+        current, peak = tracemalloc.get_traced_memory()
+        print(f"{seq * len(clientNames):>10} {current / 1024:>14.1f} {peak / 1024:>14.1f} "
+              f"{time.perf_counter() - start:>9.1f}")
+
+    buffered = sum(len(client["dataBuffer"]) for client in flightControl.clientPool.values())
+    dropped = sum(client["dataBuffer"].dropped for client in flightControl.clientPool.values())
+    droppedAction = "丢弃" if args.drop_policy == DROP_NEWEST else "覆盖"
+    print(f"\nclientPool中缓存{buffered}个数据包，已{droppedAction}{dropped}个；"
+          f"遥测缓存{sum(len(b) for b in telemetry.telemetryPool.values())}帧")
+    # 非遥测的数据包才进入clientPool，序号是4的倍数
+    if not checkAcceptsAfterRead(clientNames[0], (seq // 4 + 1) * 4):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+消息编码对比：JSON与二进制格式在控制指令、航点列表、遥测数据上的消息大小与编解码耗时
+
+用法（在server/flight_control目录下执行）：
+    python benchmark/codec_benchmark.py
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import codec  # noqa: E402
+
+
+def sampleMessages(waypointCount):
+    control = {"clientName": "", "dataType": "service", "serviceType": "flightControl",
+               "dataPackage": {"data": {"x": 1.5, "y": 0, "z": -0.5, "specialInstruction": "continue start"},
+                               "encrypt": False}}
+    encrypted = {"dataType": "service", "serviceType": "flightControl",
+                 "dataPackage": {"data": os.urandom(80), "encrypt": True}}
+    waypoints = {"dataType": "plan", "serviceType": "flightControl",
+                 "dataPackage": {"data": {"waypoints": [{"lat": 30.5728 + i * 1e-5, "lon": 104.0668 + i * 2e-5,
+                                                         "alt": 30.0 + i % 5} for i in range(waypointCount)]},
+                                 "encrypt": False}}
+    telemetry = {"clientName": "uav01", "dataType": "telemetry",
+                 "dataPackage": {"seq": 12345, "time": time.time(), "lat": 30.5728123, "lon": 104.0668456,
+                                 "alt": 512.25, "relativeAlt": 30.12, "vx": 1.2, "vy": -0.4, "vz": 0.05,
+                                 "roll": 0.01, "pitch": -0.02, "yaw": 1.57, "xacc": 0.01, "yacc": 0.02,
+                                 "zacc": -0.98, "xgyro": 0.001, "ygyro": 0.002, "zgyro": 0.003}}
+    return [("控制指令", control), ("加密控制指令", encrypted), (f"{waypointCount}个航点", waypoints),
+            ("遥测数据", telemetry)]
+
+
+def timeit(func, minTime):
+    count = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= minTime:
+            return elapsed / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON与二进制消息编码对比")
+    parser.add_argument("--waypoints", type=int, default=500, help="航点列表中的航点数")
+    parser.add_argument("--min-time", type=float, default=0.3, help="每项测试的最短时间（秒）")
+    args = parser.parse_args()
+
+    print(f"{'消息':<12} {'编码':<7} {'大小(B)':>9} {'编码(us)':>10} {'解码(us)':>10}")
+    for name, message in sampleMessages(args.waypoints):
+        for codecName in (codec.JSON, codec.BINARY):
+            body = codec.encode(message, codecName)
+            decoded = codec.decode(body, codecName)
+            if codecName == codec.BINARY:
+                assert codec.encode(decoded, codecName) == body, f"{name}二进制编解码结果不一致"
+            encodeTime = timeit(lambda: codec.encode(message, codecName), args.min_time)
+            decodeTime = timeit(lambda: codec.decode(body, codecName), args.min_time)
+            print(f"{name:<12} {codecName:<7} {len(body):>9} {encodeTime:>10.2f} {decodeTime:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+机群端到端压力测试：不依赖RabbitMQ服务器，在一个进程内运行完整的服务器发送/接收路径和N架模拟无人机
+
+服务器侧使用真实的HttpServer、fleet、flightControl、message和RabbitMQServer（发送分片+发布确认），
+无人机侧使用无人机端的RabbitMQClient和codec，消息经amqp_standin的内存代理路由
+（server_to_client直连交换机、client_to_server主题交换机）。
+每条指令从HTTP POST开始计时，到模拟无人机的飞行控制分发处（对应无人机端flightControl.messageRecvService
+解码出控制指令、调用flightControl之前）为止，统计不同机群规模下的吞吐量和p50/p95/p99延迟。
+
+用法（在server/flight_control目录下执行）：
+    python benchmark/fleet_loadtest.py
+    python benchmark/fleet_loadtest.py --fleet-sizes 10,100,500 --commands 100 --operators 8
+    python benchmark/fleet_loadtest.py --codec json --chaos     # 测试中途断开所有代理连接，观察重连和丢失
+"""
+import argparse
+import contextlib
+import http.client
+import importlib.util
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCHMARK_DIR)
+UAV_MODULES_DIR = os.path.join(os.path.dirname(os.path.dirname(SERVER_DIR)), "uav", "modules")
+
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+import amqp_standin  # noqa: E402
+
+broker = amqp_standin.install()
+
+from modules import message  # noqa: E402
+from modules import flightControl  # noqa: E402
+from modules import fleet  # noqa: E402
+from modules import HttpServer as httpServerModule  # noqa: E402
+from modules.RabbitMQServer import RabbitMQServer  # noqa: E402
+
+SERVICE_NAME = "flightControl"
+
+
+def loadUavModule(name):
+    # 服务器和无人机都有名为modules的包，无人机端的模块以别名加载，避免与服务器的模块冲突
+    spec = importlib.util.spec_from_file_location(f"uav_{name}", os.path.join(UAV_MODULES_DIR, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+uavCodec = loadUavModule("codec")
+uavRabbitMQClient = loadUavModule("RabbitMQClient")
+
+
+def percentile(sortedValues, p):
+    if not sortedValues:
+        return float("nan")
+    index = min(len(sortedValues) - 1, int(round(p / 100 * (len(sortedValues) - 1))))
+    return sortedValues[index]
+
+
+class Recorder:
+    """记录每条指令的发出时间和每架无人机的分发时间"""
+
+    def __init__(self):
+        self.sentAt = {}  # 格式：{ 指令编号: POST开始时间 }
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.done = threading.Condition(self.lock)
+        self.expected = 0
+        self.received = 0
+
+    def sent(self, commandId, startTime, fleetSize):
+        with self.lock:
+            self.sentAt[commandId] = startTime
+            self.expected += fleetSize
+
+    def dispatched(self, commandId, dispatchTime):
+        with self.lock:
+            startTime = self.sentAt.get(commandId)
+            if startTime is None:
+                return
+            self.latencies.append(dispatchTime - startTime)
+            self.received += 1
+            if self.received >= self.expected:
+                self.done.notify_all()
+
+    def waitAll(self, timeout):
+        deadline = time.perf_counter() + timeout
+        with self.lock:
+            while self.received < self.expected:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.done.wait(remaining)
+            return self.received, self.expected
+
+
+class SimulatedUAV:
+    """
+    模拟无人机：无人机端RabbitMQClient（单个IO线程收发）+ 一个分发线程，
+    分发线程与无人机端flightControl.messageRecvService相同，从接收队列取出消息后按dataType分发
+    """
+
+    def __init__(self, clientName, codecName, recorder):
+        self.clientName = clientName
+        self.codecName = codecName
+        self.recorder = recorder
+        self.inbox = queue.Queue()
+        self.client = uavRabbitMQClient.RabbitMQClient(host="standin", port=5672, client_name=clientName,
+                                                       userName="guest", password="guest")
+
+        self.client.receive(self.onMessage)
+        threading.Thread(target=self.dispatchService, daemon=True).start()
+
+    def online(self):
+        data = {"clientName": self.clientName, "dataType": "online", "dataPackage": {}}
+        properties = amqp_standin.BasicProperties(content_type=uavCodec.contentType(self.codecName),
+                                                  headers={uavCodec.ACCEPT_HEADER: self.codecName})
+        self.client.send(SERVICE_NAME, uavCodec.encode(data, self.codecName), properties)
+
+    def onMessage(self, ch, method, properties, body):
+        self.inbox.put(uavCodec.decode(body, uavCodec.codecOf(properties.content_type)))
+
+    def dispatchService(self):
+        while True:
+            messagePackage = self.inbox.get()
+            if messagePackage.get("dataType") not in ("service", "plan"):
+                continue
+            flyCommand = messagePackage.get("dataPackage", {}).get("data") or {}
+            self.recorder.dispatched(flyCommand.get("loadTestId"), time.perf_counter())
+
+
+def startServer(shards, batchSize, workers):
+    # 与message.init相同，但接收线程设为守护线程，测试结束后进程可以直接退出
+    message.g_serviceType = SERVICE_NAME
+    message.rabbitMQ = RabbitMQServer(host="standin", port=5672, userName="guest", password="guest",
+                                      service_type=SERVICE_NAME, shards=shards, batch_size=batchSize)
+    threading.Thread(target=message.rabbitMQ.receive, args=(message.messageReceiveCallBack,), daemon=True).start()
+    threading.Thread(target=flightControl.messageRecvService, daemon=True).start()
+    fleet.init(workers=64, deadline=10)
+
+    httpd = httpServerModule.ConcurrentHTTPServer(("127.0.0.1", 0), httpServerModule.HttpServer, workers)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def operatorWorker(port, fleetNames, commandIds, recorder, httpLatencies, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    for commandId in commandIds:
+        body = json.dumps({
+            "command": "start",
+            "clientNameList": fleetNames,
+            "flyCommand": {"x": 1, "y": 0, "z": 0, "specialInstruction": "", "loadTestId": commandId},
+            "encrypt": False,
+        })
+        start = time.perf_counter()
+        recorder.sent(commandId, start, len(fleetNames))
+        try:
+            conn.request("POST", "/", body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except Exception as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        httpLatencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def waitOnline(clientNames, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(name in flightControl.clientPool and name in message.clientCodecs for name in clientNames):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def runFleet(port, uavs, fleetSize, commands, operators, commandIds, chaos):
+    recorder = Recorder()
+    for uav in uavs:
+        uav.recorder = recorder
+    fleetNames = [uav.clientName for uav in uavs[:fleetSize]]
+
+    ids = [next(commandIds) for _ in range(commands)]
+    httpLatencies = []
+    errors = []
+    threads = [threading.Thread(target=operatorWorker,
+                                args=(port, fleetNames, ids[i::operators], recorder, httpLatencies, errors))
+               for i in range(operators)]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    if chaos:
+        time.sleep(0.05)
+        broker.disconnectAll()
+    for t in threads:
+        t.join()
+    received, expected = recorder.waitAll(timeout=15 if chaos else 10)
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(recorder.latencies)
+    httpLatencies.sort()
+    return {
+        "fleet": fleetSize,
+        "commands": commands,
+        "errors": len(errors),
+        "delivered": received,
+        "lost": expected - received,
+        "throughput": received / elapsed if elapsed > 0 else 0,
+        "httpP50": percentile(httpLatencies, 50) * 1000,
+        "httpP99": percentile(httpLatencies, 99) * 1000,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+    }
+
+
+def printReport(title, rows):
+    print(f"\n== {title} ==")
+    print(f"{'fleet':>6} {'commands':>9} {'errors':>7} {'delivered':>10} {'lost':>6} {'msg/s':>9} "
+          f"{'http p50':>9} {'http p99':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9}")
+    for row in rows:
+        print(f"{row['fleet']:>6} {row['commands']:>9} {row['errors']:>7} {row['delivered']:>10} {row['lost']:>6} "
+              f"{row['throughput']:>9.0f} {row['httpP50']:>9.2f} {row['httpP99']:>9.2f} "
+              f"{row['p50']:>9.2f} {row['p95']:>9.2f} {row['p99']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="机群端到端压力测试（进程内AMQP代理）")
+    parser.add_argument("--fleet-sizes", default="10,50,100,200", help="机群规模，逗号分隔")
+    parser.add_argument("--commands", type=int, default=50, help="每种规模下发的指令数（每条指令发给整个机群）")
+    parser.add_argument("--operators", type=int, default=4, help="并发的前端操作员（HTTP客户端）数")
+    parser.add_argument("--codec", default="binary", choices=["json", "binary"], help="模拟无人机声明的消息编码")
+    parser.add_argument("--shards", type=int, default=4, help="服务器发送分片数")
+    parser.add_argument("--batch-size", type=int, default=100, help="发送分片每批发布的消息数")
+    parser.add_argument("--workers", type=int, default=32, help="HTTP服务器的工作线程数")
+    parser.add_argument("--chaos", action="store_true", help="每种规模测试开始后断开所有代理连接一次")
+    args = parser.parse_args()
+
+    fleetSizes = [int(size) for size in args.fleet_sizes.split(",")]
+    commandIds = itertools.count(1)
+
+    # logger的便捷函数和发送路径会print每条消息，测试期间丢弃控制台输出
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        httpd = startServer(args.shards, args.batch_size, args.workers)
+        uavs = [SimulatedUAV(f"uav{i:03d}", args.codec, None) for i in range(max(fleetSizes))]
+        for uav in uavs:
+            uav.online()
+        online = waitOnline([uav.clientName for uav in uavs])
+
+        rows = []
+        for fleetSize in fleetSizes:
+            rows.append(runFleet(httpd.server_address[1], uavs, fleetSize, args.commands, args.operators,
+                                 commandIds, args.chaos))
+            if args.chaos:
+                # 断线后无人机的接收队列被删除，重新上线前发给它的消息不可路由
+                for uav in uavs:
+                    uav.online()
+                waitOnline([uav.clientName for uav in uavs])
+        httpd.shutdown()
+
+    if not online:
+        print("警告：部分模拟无人机未在10秒内完成上线")
+    printReport(f"codec={args.codec}, shards={args.shards}, batch={args.batch_size}, "
+                f"operators={args.operators}{', chaos' if args.chaos else ''}", rows)
+    print(f"\n代理统计: {broker.stats()}")
+    print(f"发送统计: { {k: v for k, v in message.rabbitMQ.metrics().items() if k != 'shards'} }")
+
+
+if __name__ == "__main__":
+    main()
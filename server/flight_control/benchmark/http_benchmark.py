@@ -0,0 +1,149 @@
+"""
+HTTP前端压力测试：统计1、10、100个并发客户端下的吞吐量（requests/s）与p50/p99延迟
+
+用法（在server/flight_control目录下执行）：
+    python benchmark/http_benchmark.py                       # 进程内启动服务器，使用模拟的飞控后端
+    python benchmark/http_benchmark.py --compare             # 同时测试原单线程HTTPServer作为对照
+    python benchmark/http_benchmark.py --url http://127.0.0.1:39004/   # 压测已运行的服务器
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from http.server import HTTPServer
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import flightControl  # noqa: E402
+from modules import HttpServer as httpServerModule  # noqa: E402
+
+
+def simulatedFlightControl(delay):
+    """模拟飞控后端：固定耗时后返回成功，用于隔离HTTP层的开销"""
+
+    def handler(clientName, flyCommand, isEncrypt, isPlan=False):
+        time.sleep(delay)
+        return {"clientName": clientName, "status": "success", "msg": "执行成功！", "time": time.time()}
+
+    return handler
+
+
+class SingleThreadHandler(httpServerModule.HttpServer):
+    protocol_version = "HTTP/1.0"
+
+
+def startServer(concurrent, workers):
+    if concurrent:
+        httpd = httpServerModule.ConcurrentHTTPServer(("127.0.0.1", 0), httpServerModule.HttpServer, workers)
+    else:
+        httpd = HTTPServer(("127.0.0.1", 0), SingleThreadHandler)
+        httpd.workerSemaphore = threading.BoundedSemaphore(1)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, "127.0.0.1", httpd.server_address[1]
+
+
+def clientWorker(host, port, body, requests, latencies, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/", body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except Exception as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def percentile(sortedValues, p):
+    if not sortedValues:
+        return float("nan")
+    index = min(len(sortedValues) - 1, int(round(p / 100 * (len(sortedValues) - 1))))
+    return sortedValues[index]
+
+
+def runLoad(host, port, clients, requestsPerClient, body):
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=clientWorker, args=(host, port, body, requestsPerClient, latencies, errors))
+               for _ in range(clients)]
+    # logger的便捷函数会print每条日志，压测期间丢弃控制台输出
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed if elapsed > 0 else 0,
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+    }
+
+
+def printReport(title, rows):
+    print(f"\n== {title} ==")
+    print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>10} {'p50(ms)':>9} {'p99(ms)':>9}")
+    for row in rows:
+        print(f"{row['clients']:>8} {row['requests']:>9} {row['errors']:>7} {row['rps']:>10.1f} "
+              f"{row['p50']:>9.2f} {row['p99']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP前端压力测试")
+    parser.add_argument("--url", help="压测已运行的服务器，不指定则在进程内启动")
+    parser.add_argument("--clients", default="1,10,100", help="并发客户端数，逗号分隔")
+    parser.add_argument("--requests", type=int, default=50, help="每个客户端的请求数")
+    parser.add_argument("--uavs", type=int, default=5, help="每个请求中的无人机数量")
+    parser.add_argument("--handler-delay", type=float, default=0.002, help="模拟飞控后端每架无人机的耗时（秒）")
+    parser.add_argument("--workers", type=int, default=32, help="并发服务器的工作线程数")
+    parser.add_argument("--compare", action="store_true", help="同时测试原单线程HTTPServer")
+    args = parser.parse_args()
+
+    clientCounts = [int(c) for c in args.clients.split(",")]
+    body = json.dumps({
+        "command": "start",
+        "clientNameList": [f"uav{i:02d}" for i in range(args.uavs)],
+        "flyCommand": {"x": 1, "y": 0, "z": 0, "specialInstruction": ""},
+        "encrypt": False,
+    }).encode()
+
+    if args.url:
+        target = urlparse(args.url)
+        rows = [runLoad(target.hostname, target.port or 80, c, args.requests, body) for c in clientCounts]
+        printReport(args.url, rows)
+        return
+
+    flightControl.flightControl = simulatedFlightControl(args.handler_delay)
+    modes = [("concurrent", True)] + ([("single-thread", False)] if args.compare else [])
+    for name, concurrent in modes:
+        httpd, host, port = startServer(concurrent, args.workers)
+        rows = [runLoad(host, port, c, args.requests, body) for c in clientCounts]
+        httpd.shutdown()
+        httpd.server_close()
+        printReport(f"{name} (workers={args.workers if concurrent else 1}, "
+                    f"backend {args.handler_delay * 1000:.1f}ms x {args.uavs} UAV)", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+日志开销测试：对比原来的同步日志（调用线程写文件并print，发送路径上打印整个消息）与队列日志
+（调用线程只入队，后台线程写文件和控制台，消息内容延迟格式化）下，服务器flightControl分发一条指令
+（加密前的flightControl.flightControl -> message.send -> 发送分片入队）以及无人机端记录一条收到的指令的耗时
+
+控制台输出重定向到临时文件，--disk-latency-ms模拟SD卡等慢存储每次写入的附加延迟。
+用法（在server/flight_control目录下执行）：
+    python benchmark/logging_benchmark.py
+    python benchmark/logging_benchmark.py --count 5000 --disk-latency-ms 0,2
+"""
+import argparse
+import contextlib
+import importlib.util
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCHMARK_DIR)
+UAV_MODULES_DIR = os.path.join(os.path.dirname(os.path.dirname(SERVER_DIR)), "uav", "modules")
+
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+import amqp_standin  # noqa: E402
+
+amqp_standin.install()
+
+from modules import codec  # noqa: E402
+from modules import flightControl  # noqa: E402
+from modules import logger  # noqa: E402
+from modules import message  # noqa: E402
+from modules.RabbitMQServer import RabbitMQServer  # noqa: E402
+
+SERVICE_NAME = "flightControl"
+
+
+def loadUavLogger():
+    spec = importlib.util.spec_from_file_location("uav_Logger", os.path.join(UAV_MODULES_DIR, "Logger.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+uavLoggerModule = loadUavLogger()
+
+
+def slowHandlerClass(base, latency):
+    """每次写入附加latency秒延迟，模拟慢存储"""
+
+    class SlowHandler(base):
+        def emit(self, record):
+            if latency:
+                time.sleep(latency)
+            super().emit(record)
+
+    return SlowHandler
+
+
+# ------------------------------------------------------------ 原同步日志 --
+
+@contextlib.contextmanager
+def legacyLogging(path, latency):
+    """还原原来的日志方式：文件处理器直接挂在logger上，便捷函数先print再写文件，发送路径打印整个消息"""
+    root = logging.getLogger()
+    handler = slowHandlerClass(RotatingFileHandler, latency)(path, maxBytes=1024 * 1024 * 5, backupCount=3,
+                                                             encoding="utf-8")
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+    def legacyInfo(msg, *args):
+        # 原来的调用方用f-string，调用时就已格式化
+        msg = msg % args if args else msg
+        print(msg)
+        root.info(msg)
+
+    def legacySend(clientName, data):
+        data["serviceType"] = message.g_serviceType
+        codecName = message.clientCodecs.get(clientName, codec.JSON)
+        dataBytes = codec.encode(data, codecName)
+        print(f"[message.send] 编码后的消息: {dataBytes}")
+        message.rabbitMQ.send(clientName, dataBytes, codec.contentType(codecName))
+        shard = message.rabbitMQ.shard_of(clientName)
+        print(f"[RabbitMQ.send] 入队 client: {clientName}, message: {dataBytes}")
+        print(f"[RabbitMQ.send] 当前队列长度: {len(shard.queue)}")
+        legacyInfo(f"向{clientName}发送消息：{data}")
+
+    def legacyMessageSend(clientName, dataType, data):
+        sendData = {"dataType": dataType, "dataPackage": data}
+        print(f"[messageSend] 将发送给 {clientName} 的数据: {sendData}")
+        message.send(clientName, sendData)
+
+    # 分发路径上原来的两条info日志现在是debug级别，原方式下同样按info输出
+    saved = (logger.info, logger.debug, message.send, flightControl.messageSend)
+    logger.info, logger.debug, message.send, flightControl.messageSend = (legacyInfo, legacyInfo, legacySend,
+                                                                          legacyMessageSend)
+    try:
+        yield
+    finally:
+        logger.info, logger.debug, message.send, flightControl.messageSend = saved
+        root.removeHandler(handler)
+        handler.close()
+
+
+@contextlib.contextmanager
+def queuedLogging(path, latency):
+    saved = logger.RotatingFileHandler
+    logger.RotatingFileHandler = slowHandlerClass(saved, latency)
+    try:
+        logger.init(path, "info")
+    finally:
+        logger.RotatingFileHandler = saved
+    try:
+        yield
+    finally:
+        stats = logger.stats()
+        logger.shutdown()
+        logging.getLogger().removeHandler(logger.queueHandler)
+        queuedLogging.lastStats = stats
+
+
+# ---------------------------------------------------------------- 测试 --
+
+def planCommand(count):
+    return {"waypoints": [{"lat": 30.57 + i * 1e-5, "lon": 104.06, "alt": 30} for i in range(count)]}
+
+
+def timeDispatch(count, isPlan, flyCommand):
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        flightControl.flightControl(f"uav{i % 100:03d}", dict(flyCommand), False, isPlan=isPlan)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def timeUavLog(count, uavLogger, legacy, dataPackage):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        if legacy:
+            text = f"接收到服务器发送的控制指令：{dataPackage}"
+            print(text)
+            uavLogger.info(text)
+        else:
+            uavLogger.info("接收到服务器发送的控制指令：%s", dataPackage)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def legacyUavLogger(path, latency):
+    """原来的无人机端Logger：文件处理器直接挂在logger上"""
+    uavLogger = logging.getLogger(f"legacy-{path}")
+    uavLogger.setLevel(logging.INFO)
+    handler = slowHandlerClass(RotatingFileHandler, latency)(path, maxBytes=1024 * 1024 * 5, backupCount=3,
+                                                             encoding="utf-8")
+    uavLogger.addHandler(handler)
+    return uavLogger, handler
+
+
+def summary(timings):
+    timings = sorted(timings)
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志开销测试")
+    parser.add_argument("--count", type=int, default=3000, help="每项测试的调用次数")
+    parser.add_argument("--disk-latency-ms", default="0,2", help="模拟的每次写入附加延迟（毫秒），逗号分隔")
+    parser.add_argument("--waypoints", type=int, default=200, help="任务规划指令的航点数")
+    args = parser.parse_args()
+
+    workDir = tempfile.mkdtemp()
+    message.g_serviceType = SERVICE_NAME
+    message.rabbitMQ = RabbitMQServer(host="standin", port=5672, userName="guest", password="guest",
+                                      service_type=SERVICE_NAME)
+    cases = [("service", False, {"x": 1, "y": 0, "z": 0, "specialInstruction": ""}),
+             ("plan", True, planCommand(args.waypoints))]
+    dataPackage = {"data": cases[0][2], "encrypt": False}
+
+    rows = []
+    for latencyMs in [float(l) for l in args.disk_latency_ms.split(",")]:
+        latency = latencyMs / 1000
+        for mode in ("legacy", "queued"):
+            path = os.path.join(workDir, f"{mode}-{latencyMs}.log")
+            with open(os.path.join(workDir, "stdout.txt"), "a") as stdout, contextlib.redirect_stdout(stdout):
+                context = legacyLogging(path, latency) if mode == "legacy" else queuedLogging(path, latency)
+                with context:
+                    results = [(name, summary(timeDispatch(args.count, isPlan, flyCommand)))
+                               for name, isPlan, flyCommand in cases]
+
+                if mode == "legacy":
+                    uavLogger, handler = legacyUavLogger(path + ".uav", latency)
+                    results.append(("uav log", summary(timeUavLog(args.count, uavLogger, True, dataPackage))))
+                    uavLogger.removeHandler(handler)
+                    handler.close()
+                    dropped = "-"
+                else:
+                    saved = uavLoggerModule.RotatingFileHandler
+                    uavLoggerModule.RotatingFileHandler = slowHandlerClass(saved, latency)
+                    uavLogger = uavLoggerModule.Logger(path + ".uav", "info")
+                    uavLoggerModule.RotatingFileHandler = saved
+                    results.append(("uav log", summary(timeUavLog(args.count, uavLogger, False, dataPackage))))
+                    dropped = queuedLogging.lastStats["dropped"] + uavLogger.stats()["dropped"]
+                    uavLogger.shutdown()
+                    uavLogger.logger.removeHandler(uavLogger.queueHandler)
+            rows.append((latencyMs, mode, results, dropped))
+
+    print(f"每项{args.count}次，任务规划指令{args.waypoints}个航点，单位微秒")
+    print(f"{'disk(ms)':>8} {'mode':>7} " + " ".join(f"{name + ' p50':>14} {name + ' p99':>14}"
+                                                    for name, _ in rows[0][2]) + f" {'dropped':>8}")
+    for latencyMs, mode, results, dropped in rows:
+        print(f"{latencyMs:>8.1f} {mode:>7} " + " ".join(f"{p50:>14.1f} {p99:>14.1f}" for _, (p50, p99) in results)
+              + f" {dropped:>8}")
+
+
+if __name__ == "__main__":
+    main()
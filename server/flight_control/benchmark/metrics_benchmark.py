@@ -0,0 +1,137 @@
+"""
+指标开销测试：
+1. 计数器inc、直方图observe在1个和多个线程下的单次耗时，以及抓取一次/metrics的耗时；
+2. 进程内启动服务器（RabbitMQ使用amqp_standin），向100架无人机发送指令，对比开启指标与把inc/observe
+   替换为空函数时的HTTP请求耗时，得到热路径上的开销比例。
+
+用法（在server/flight_control目录下执行）：
+    python benchmark/metrics_benchmark.py
+    python benchmark/metrics_benchmark.py --requests 500 --fleet 100
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+import amqp_standin  # noqa: E402
+
+amqp_standin.install()
+
+from modules import metrics  # noqa: E402
+from modules import message  # noqa: E402
+from modules import fleet  # noqa: E402
+from modules import HttpServer as httpServerModule  # noqa: E402
+from modules.RabbitMQServer import RabbitMQServer  # noqa: E402
+
+SERVICE_NAME = "flightControl"
+
+
+def perOp(func, count, threads):
+    """
+    :return: 每次调用的平均耗时（纳秒），多线程时为所有线程的总调用次数平均
+    """
+    def run():
+        for _ in range(count):
+            func()
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (count * threads) * 1e9
+
+
+def microBenchmark(count):
+    counter = metrics.Counter("bench_total", "测试计数器")
+    histogram = metrics.Histogram("bench_seconds", "测试直方图")
+    labelled = metrics.Histogram("bench_labelled_seconds", "测试直方图", ("command",))
+    child = labelled.labels("start")
+
+    print(f"{'operation':>28} {'1 thread(ns)':>13} {'8 threads(ns)':>14}")
+    for name, func in (("baseline (empty call)", lambda: None),
+                       ("counter.inc()", counter.inc),
+                       ("histogram.observe()", lambda: histogram.observe(0.003)),
+                       ("labels('start').observe()", lambda: labelled.labels("start").observe(0.003)),
+                       ("cached child.observe()", lambda: child.observe(0.003))):
+        print(f"{name:>28} {perOp(func, count, 1):>13.0f} {perOp(func, count // 8, 8):>14.0f}")
+    assert counter.value() == count + count // 8 * 8
+
+
+def startServer():
+    message.g_serviceType = SERVICE_NAME
+    message.rabbitMQ = RabbitMQServer(host="standin", port=5672, userName="guest", password="guest",
+                                      service_type=SERVICE_NAME)
+    fleet.init(workers=64, deadline=10)
+    httpd = httpServerModule.ConcurrentHTTPServer(("127.0.0.1", 0), httpServerModule.HttpServer, 32)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd.server_address[1]
+
+
+def timeRequests(port, fleetNames, count):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    body = json.dumps({"command": "start", "clientNameList": fleetNames,
+                       "flyCommand": {"x": 1, "y": 0, "z": 0, "specialInstruction": ""}, "encrypt": False})
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        connection.request("POST", "/", body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        timings.append((time.perf_counter() - start) * 1000)
+    connection.close()
+    return timings
+
+
+@contextlib.contextmanager
+def metricsDisabled():
+    saved = (metrics.Counter.inc, metrics.Histogram.observe)
+    metrics.Counter.inc = lambda self, amount=1: None
+    metrics.Histogram.observe = lambda self, value: None
+    try:
+        yield
+    finally:
+        metrics.Counter.inc, metrics.Histogram.observe = saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指标开销测试")
+    parser.add_argument("--ops", type=int, default=400000, help="微基准的调用次数")
+    parser.add_argument("--requests", type=int, default=300, help="每轮HTTP请求数")
+    parser.add_argument("--fleet", type=int, default=100, help="每条指令的无人机数")
+    parser.add_argument("--rounds", type=int, default=3, help="开启/关闭指标交替测试的轮数")
+    args = parser.parse_args()
+
+    microBenchmark(args.ops)
+
+    port = startServer()
+    fleetNames = [f"uav{i:03d}" for i in range(args.fleet)]
+    timeRequests(port, fleetNames, 50)  # 预热
+    enabled, disabled = [], []
+    for _ in range(args.rounds):
+        enabled += timeRequests(port, fleetNames, args.requests)
+        with metricsDisabled():
+            disabled += timeRequests(port, fleetNames, args.requests)
+    on, off = statistics.median(enabled), statistics.median(disabled)
+    print(f"\n{args.fleet}架无人机的start指令，每种{len(enabled)}次：开启指标p50 {on:.3f}ms，关闭指标p50 {off:.3f}ms，"
+          f"开销{(on - off) / off:+.2%}")
+
+    start = time.perf_counter()
+    text = metrics.render()
+    print(f"抓取一次/metrics：{(time.perf_counter() - start) * 1000:.2f}ms，{len(text.splitlines())}行")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+任务规划缓存测试：同一区域重复规划时，未命中（重新计算）、内存命中和磁盘命中（模拟服务器重启）的耗时对比
+
+用法（在server/flight_control目录下执行）：
+    python benchmark/mission_cache_benchmark.py
+    python benchmark/mission_cache_benchmark.py --uavs 100 --waypoint-spacing 5
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import mission_cache  # noqa: E402
+from modules.mission_plan import plan_coverage, PLANNER_VERSION  # noqa: E402
+from mission_plan_benchmark import areas  # noqa: E402
+
+
+def timePlan(area, clientNameList, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, _, hit = mission_cache.plan(area, clientNameList, params, plan_coverage, PLANNER_VERSION)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), hit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务规划缓存测试")
+    parser.add_argument("--uavs", type=int, default=100, help="无人机数量")
+    parser.add_argument("--waypoint-spacing", type=float, default=20, help="航线上的航点间隔（米）")
+    parser.add_argument("--repeat", type=int, default=20, help="内存命中的重复次数")
+    args = parser.parse_args()
+
+    clientNameList = [f"uav{i:03d}" for i in range(args.uavs)]
+    params = {"waypoint_spacing": args.waypoint_spacing}
+    path = os.path.join(tempfile.mkdtemp(), "mission_cache.db")
+
+    rows = []
+    # logger的便捷函数会print每条日志，测试期间丢弃控制台输出
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        mission_cache.init(path, capacity=64)
+        for name, area in areas(1000).items():
+            miss, _ = timePlan(area, clientNameList, params, 1)
+            memory, memoryHit = timePlan(area, clientNameList, params, args.repeat)
+            rows.append([name, miss, memory, memoryHit])
+
+        # 重新初始化相当于服务器重启，内存层为空，只能从磁盘读取
+        mission_cache.init(path, capacity=64)
+        for row, area in zip(rows, areas(1000).values()):
+            disk, diskHit = timePlan(area, clientNameList, params, 1)
+            row += [disk, diskHit]
+        stats = mission_cache.getStats()
+
+    print(f"{args.uavs}架无人机，航点间隔{args.waypoint_spacing}米，磁盘缓存{path}")
+    print(f"{'area':>10} {'miss(ms)':>9} {'memory(ms)':>11} {'disk(ms)':>9}")
+    for name, miss, memory, memoryHit, disk, diskHit in rows:
+        assert memoryHit and diskHit
+        print(f"{name:>10} {miss:>9.2f} {memory:>11.3f} {disk:>9.2f}")
+    print(f"\n重启后的缓存统计: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+任务规划性能测试：1平方公里区域、100架无人机的覆盖航线规划耗时、航点数和各机航程均衡度
+
+用法（在server/flight_control目录下执行）：
+    python benchmark/mission_plan_benchmark.py
+    python benchmark/mission_plan_benchmark.py --uavs 200 --footprint 30 --waypoint-spacing 10
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.mission_plan import plan_coverage  # noqa: E402
+
+LAT0, LON0 = 30.57, 104.06
+
+
+def offset(north, east):
+    """以(LAT0, LON0)为原点，向北north米、向东east米处的经纬度"""
+    return {"lat": LAT0 + north / 111320, "lon": LON0 + east / (111320 * math.cos(math.radians(LAT0)))}
+
+
+def areas(side):
+    half = side / 2
+    return {
+        "square": [offset(0, 0), offset(0, side), offset(side, side), offset(side, 0)],
+        "L-shape": [offset(0, 0), offset(0, side), offset(half, side), offset(half, half), offset(side, half),
+                    offset(side, 0)],
+        # 面积约为正方形的一半的不规则凸多边形，航线方向不与任何坐标轴平行
+        "irregular": [offset(0, 0.2 * side), offset(0.1 * side, side), offset(0.7 * side, 0.9 * side),
+                      offset(side, 0.4 * side), offset(0.6 * side, 0)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务规划性能测试")
+    parser.add_argument("--uavs", type=int, default=100, help="无人机数量")
+    parser.add_argument("--side", type=float, default=1000, help="区域边长（米），默认1平方公里")
+    parser.add_argument("--footprint", type=float, default=40, help="相机地面覆盖宽度（米）")
+    parser.add_argument("--sidelap", type=float, default=0.2, help="旁向重叠率")
+    parser.add_argument("--waypoint-spacing", type=float, default=20, help="航线上的航点间隔（米）")
+    parser.add_argument("--repeat", type=int, default=20, help="每个区域重复规划的次数")
+    args = parser.parse_args()
+
+    clientNameList = [f"uav{i:03d}" for i in range(args.uavs)]
+    print(f"{args.uavs}架无人机，相机覆盖宽度{args.footprint}米，旁向重叠率{args.sidelap}，"
+          f"航点间隔{args.waypoint_spacing}米")
+    print(f"{'area':>10} {'tracks':>7} {'waypoints':>10} {'length(km)':>11} {'balance':>8} "
+          f"{'median(ms)':>11} {'max(ms)':>9}")
+    for name, area in areas(args.side).items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            _, stats = plan_coverage(area, clientNameList, footprint=args.footprint, sidelap=args.sidelap,
+                                     waypoint_spacing=args.waypoint_spacing)
+            timings.append((time.perf_counter() - start) * 1000)
+        # balance：航程最长的无人机与最短的无人机之比
+        print(f"{name:>10} {stats['tracks']:>7} {stats['waypoints']:>10} {stats['trackLength'] / 1000:>11.1f} "
+              f"{stats['maxLength'] / stats['minLength']:>8.3f} {statistics.median(timings):>11.2f} "
+              f"{max(timings):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+航点简化测试：不同容差下删除的航点数、最大偏差、耗时，以及按每项上传耗时估算的任务上传时间
+
+每项上传耗时默认取uav/benchmark/mission_upload_benchmark.py在模拟自驾仪上测得的约6ms，
+串口数传链路上可用--item-ms指定实测值。
+用法（在server/flight_control目录下执行）：
+    python benchmark/simplify_benchmark.py
+    python benchmark/simplify_benchmark.py --tolerances 0.2,1,5 --item-ms 40
+"""
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.mission_plan import plan_coverage, simplify_waypoints, to_geo  # noqa: E402
+from mission_plan_benchmark import areas  # noqa: E402
+
+LAT0, LON0 = 30.57, 104.06
+
+
+def toWaypoints(x, y, alt):
+    lats, lons = to_geo(np.asarray(x), np.asarray(y), LAT0, LON0)
+    return [{"lat": lat, "lon": lon, "alt": a} for lat, lon, a in zip(lats.tolist(), lons.tolist(), alt)]
+
+
+def missions():
+    # 半径200米的环绕航线，每1米一个点，高度在30~50米之间起伏
+    t = np.linspace(0, 4 * math.pi, 2514)
+    orbit = toWaypoints(200 * np.cos(t), 200 * np.sin(t), (40 + 10 * np.sin(3 * t)).tolist())
+
+    # 1平方公里的测绘航线，每2米一个点（单架无人机）
+    survey = plan_coverage(areas(1000)["square"], ["uav000"], waypoint_spacing=2)[0]["uav000"]
+
+    # 带GPS噪声（标准差0.3米）的手绘轨迹，每0.5米一个点
+    rng = np.random.default_rng(1)
+    s = np.arange(0, 1500, 0.5)
+    freehand = toWaypoints(s + rng.normal(0, 0.3, s.size), 80 * np.sin(s / 150) + rng.normal(0, 0.3, s.size),
+                           [30] * s.size)
+    return {"orbit": orbit, "survey": survey, "freehand": freehand}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="航点简化测试")
+    parser.add_argument("--tolerances", default="0.1,0.5,1,2", help="简化容差（米），逗号分隔")
+    parser.add_argument("--item-ms", type=float, default=6.0, help="每个任务项的上传耗时（毫秒），用于估算上传时间")
+    args = parser.parse_args()
+
+    print(f"{'mission':>9} {'tol(m)':>7} {'before':>7} {'after':>6} {'removed':>8} {'maxDev(m)':>10} "
+          f"{'time(ms)':>9} {'upload(s)':>14}")
+    for name, waypoints in missions().items():
+        for tolerance in [float(t) for t in args.tolerances.split(",")]:
+            _, stats = simplify_waypoints(waypoints, tolerance)
+            before = stats["before"] * args.item_ms / 1000
+            after = stats["after"] * args.item_ms / 1000
+            print(f"{name:>9} {tolerance:>7.1f} {stats['before']:>7} {stats['after']:>6} {stats['removed']:>8} "
+                  f"{stats['maxDeviation']:>10.3f} {stats['computeMs']:>9.2f} {before:>6.1f} -> {after:<5.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+服务器启动测试：统计从启动进程到第一条HTTP指令返回的时间，并打印最后一次启动的各阶段耗时报告
+
+每次在子进程中用进程内的RabbitMQ替身（amqp_standin）启动main.py，配置文件复制到临时目录并改用空闲端口，
+父进程不断尝试连接，端口可用后立即发送一条指令。
+用法（在server/flight_control目录下执行）：
+    python benchmark/startup_benchmark.py
+    python benchmark/startup_benchmark.py --runs 10
+"""
+import argparse
+import http.client
+import json
+import os
+import runpy
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def runChild(workDir):
+    """子进程入口：安装RabbitMQ替身后按正常方式启动服务器"""
+    sys.path.insert(0, BENCHMARK_DIR)
+    import amqp_standin
+    amqp_standin.install()
+
+    sys.path.insert(0, ROOT)
+    os.chdir(workDir)
+    sys.argv = ["main.py", "--startup-report"]
+    runpy.run_path(os.path.join(ROOT, "main.py"), run_name="__main__")
+
+
+def freePort():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def prepare(port):
+    workDir = tempfile.mkdtemp()
+    with open(os.path.join(ROOT, "config.json"), "r") as fp:
+        config = json.loads(fp.read())
+    config["http"]["host"] = "127.0.0.1"
+    config["http"]["port"] = port
+    config["missionCache"]["path"] = os.path.join(workDir, "mission_cache.db")
+    config["logger"]["fileName"] = os.path.join(workDir, "flightControl.log")
+    with open(os.path.join(workDir, "config.json"), "w") as fp:
+        json.dump(config, fp)
+    return workDir
+
+
+def firstCommand(port, timeout=30):
+    """
+    不断尝试连接，连接成功后发送一条不涉及无人机的指令
+    :return: 指令返回时的time.perf_counter()
+    """
+    body = json.dumps({"command": "start", "clientNameList": [], "flyCommand": {}})
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        try:
+            connection.request("POST", "/", body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            if response.status == 200:
+                return time.perf_counter()
+        except OSError:
+            time.sleep(0.002)
+        finally:
+            connection.close()
+    raise RuntimeError("服务器启动超时")
+
+
+def runOnce():
+    port = freePort()
+    workDir = prepare(port)
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", workDir],
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        seconds = firstCommand(port) - start
+    finally:
+        child.terminate()
+        output, _ = child.communicate()
+        shutil.rmtree(workDir, ignore_errors=True)
+    report = output[output.find("phase"):] if "phase" in output else output
+    return seconds, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务器启动测试")
+    parser.add_argument("--runs", type=int, default=5, help="启动次数")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        runChild(args.child)
+        return
+
+    timings = []
+    report = ""
+    for _ in range(args.runs):
+        seconds, report = runOnce()
+        timings.append(seconds * 1000)
+    print(f"启动到第一条指令返回（{args.runs}次）：中位数{statistics.median(timings):.0f}ms，"
+          f"最小{min(timings):.0f}ms，最大{max(timings):.0f}ms")
+    print(f"\n最后一次启动的各阶段耗时（相对main.py导入startup模块的时刻）：\n{report}")
+
+
+if __name__ == "__main__":
+    main()
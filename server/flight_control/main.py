@@ -1,34 +1,97 @@
 import json
+import sys
+from modules import startup
 from modules import logger
 from modules.HttpServer import HttpServer
 from modules import message
 from modules import flightControl
+from modules import fleet
+from modules import ack
+from modules import telemetry
+from modules import mission_cache
+from modules import render
+
+# 启动耗时报告，命令行加--startup-report时在启动完成后打印各阶段耗时
+STARTUP_REPORT = "--startup-report" in sys.argv
+
+
+def onReady():
+    logger.info(f"启动完成，耗时{startup.elapsed() * 1000:.0f}ms")
+    if STARTUP_REPORT:
+        print(startup.report())
+    # 任务规划和渲染依赖NumPy，启动完成后在后台预先导入，不延长启动时间
+    startup.warmUp(["modules.mission_plan"])
+
 
 if __name__ == "__main__":
-    with open("config.json", "r") as fp:
+    startup.record("imports", startup.g_bootTime)
+
+    with startup.phase("config"), open("config.json", "r") as fp:
         config = json.loads(fp.read())
 
         serviceName = config.get("name")
 
         logFileName = config.get("logger").get("fileName")
         logLevel = config.get("logger").get("level")
+        logQueueSize = config.get("logger").get("queueSize", 10000)
 
         rabbitMQHost = config.get("rabbitMQ").get("host")
         rabbitMQPort = config.get("rabbitMQ").get("port")
         rabbitMQUserName = config.get("rabbitMQ").get("userName")
         rabbitMQPassword = config.get("rabbitMQ").get("password")
+        publisherShards = config.get("rabbitMQ").get("publisherShards", 4)
+        publishBatchSize = config.get("rabbitMQ").get("publishBatchSize", 100)
 
         httpServerHost = config.get("http").get("host")
         httpServerPort = config.get("http").get("port")
+        httpServerWorkers = config.get("http").get("workers", 32)
+        httpKeepAliveTimeout = config.get("http").get("keepAliveTimeout", 30)
+
+        fleetWorkers = config.get("fleet", {}).get("workers", 64)
+        fleetDeadline = config.get("fleet", {}).get("deadline", 10)
+
+        telemetryBufferSize = config.get("telemetry", {}).get("bufferSize", 600)
+
+        missionCachePath = config.get("missionCache", {}).get("path", "mission_cache.db")
+        missionCacheCapacity = config.get("missionCache", {}).get("capacity", 64)
+        missionCacheMaxRows = config.get("missionCache", {}).get("maxRows", 1000)
+
+        renderCacheSize = config.get("render", {}).get("cacheSize", 32)
+
+        clientPoolCapacity = config.get("clientPool", {}).get("capacity", 256)
+        clientPoolDropPolicy = config.get("clientPool", {}).get("dropPolicy", "oldest")
+
+        ackTtl = config.get("ack", {}).get("ttl", 3600)
+        ackKeepCompleted = config.get("ack", {}).get("keepCompleted", 60)
+        ackMaxPendingPerClient = config.get("ack", {}).get("maxPendingPerClient", 256)
 
     # 初始化log模块
-    logger.init(logFileName, logLevel)
+    with startup.phase("logger"):
+        logger.init(logFileName, logLevel, logQueueSize)
+
+    # 初始化遥测缓存，必须在接收消息之前
+    telemetry.init(telemetryBufferSize)
+
+    # 初始化指令回执跟踪，必须在接收消息之前
+    ack.init(ackTtl, ackKeepCompleted, ackMaxPendingPerClient)
 
     # 初始化消息队列
-    message.init(rabbitMQHost, rabbitMQPort, rabbitMQUserName, rabbitMQPassword, serviceName)
+    with startup.phase("broker connect"):
+        message.init(rabbitMQHost, rabbitMQPort, rabbitMQUserName, rabbitMQPassword, serviceName,
+                     publisherShards, publishBatchSize)
     #
     # # 初始化飞行控制服务
-    flightControl.init()
+    flightControl.init(clientPoolCapacity, clientPoolDropPolicy)
+
+    # 初始化任务规划缓存
+    with startup.phase("mission cache"):
+        mission_cache.init(missionCachePath, missionCacheCapacity, missionCacheMaxRows)
+
+    # 初始化航线渲染服务
+    render.init(renderCacheSize)
+
+    # 初始化机群指令分发线程池
+    fleet.init(fleetWorkers, fleetDeadline)
 
     # 初始化http服务器，必须在最后
-    HttpServer.init(httpServerHost, httpServerPort)
+    HttpServer.init(httpServerHost, httpServerPort, httpServerWorkers, httpKeepAliveTimeout, onReady)
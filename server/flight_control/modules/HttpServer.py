@@ -1,100 +1,347 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 import json
+import threading
+import time
+from modules import ack
 from modules import logger
 from modules import flightControl
-from modules.mission_plan import draw_track, generate_mission_plan
+from modules import fleet
+from modules import database
+from modules import telemetry
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from modules import mission_cache
+from modules import render
+from modules import startup
+from modules import metrics
+
+COMMANDS = ("start", "stop", "plan", "mission_plan", "mission_start")
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# command标签：POST为指令名（未知指令为other，无法解析的请求为invalid），GET为“GET 路径”
+requestSeconds = metrics.histogram("http_request_duration_seconds", "HTTP请求从读取到响应完成的耗时（秒）",
+                                   ("command",))
+
+
+class ConcurrentHTTPServer(ThreadingHTTPServer):
+    """
+    并发HTTP服务器：每个连接一个守护线程以支持HTTP/1.1长连接，
+    同一时刻真正执行的指令数由workers限制，避免慢请求阻塞其他操作员的请求
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, serverAddress, handlerClass, workers):
+        super().__init__(serverAddress, handlerClass)
+        self.workerSemaphore = threading.BoundedSemaphore(workers)
 
-import matplotlib.pyplot as plt
-mission_cache = {}  # 格式：{ "uav01": [waypoint1, waypoint2, ...], ... }
 
 class HttpServer(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 开启keep-alive
+    timeout = 30  # 长连接空闲超时（秒）
+    disable_nagle_algorithm = True  # 响应头和响应体分两次写入，长连接下需关闭Nagle算法避免40ms延迟
+
     @classmethod
-    def init(cls, host, port):
-        httpd = HTTPServer((host, port), HttpServer)
-        logger.info("http服务器初始化成功")
+    def init(cls, host, port, workers=32, keepAliveTimeout=30, onReady=None):
+        """
+        :param onReady: 端口绑定成功、开始接受请求前的回调
+        """
+        cls.timeout = keepAliveTimeout
+        with startup.phase("http bind"):
+            httpd = ConcurrentHTTPServer((host, port), cls, workers)
+        logger.info(f"http服务器初始化成功，工作线程数：{workers}")
+        if onReady is not None:
+            onReady()
         httpd.serve_forever()
 
+    def log_message(self, format, *args):
+        # 请求日志已由logger记录，不再逐条输出到stderr
+        pass
+
+    def sendJson(self, code, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'X-Requested-With, Content-Type')
+        self.end_headers()
+        self.wfile.write(body)
+        return body
+
+    def sendBytes(self, code, contentType, body):
+        self.send_response(code)
+        self.send_header('Content-type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def sendEmpty(self, code, contentType=None):
+        self.send_response(code)
+        if contentType:
+            self.send_header('Content-type', contentType)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'X-Requested-With, Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def do_GET(self):
-        if self.path == '/favicon.ico':
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path == '/favicon.ico':
             # 忽略 favicon.ico 请求
-            self.send_response(200)
-            self.send_header('Content-type', 'image/x-icon')
-            self.end_headers()
+            self.sendEmpty(200, 'image/x-icon')
+            return
+        if url.path == '/telemetry':
+            self.handleTelemetry(parse_qs(url.query))
+        elif url.path == '/render':
+            self.handleRender(parse_qs(url.query))
+        elif url.path == '/metrics':
+            self.sendBytes(200, METRICS_CONTENT_TYPE, metrics.render().encode('utf-8'))
+        else:
+            self.sendEmpty(404)
+            return
+        requestSeconds.labels(f"GET {url.path}").observe(time.perf_counter() - start)
+
+    def handleTelemetry(self, query):
+        """
+        GET /telemetry                              所有无人机的最新一帧
+        GET /telemetry?clientName=uav01             该无人机的最新一帧
+        GET /telemetry?clientName=uav01&since=N     该无人机序号大于等于N的所有帧，可选limit
+        """
+        try:
+            clientName = query.get("clientName", [None])[0]
+            if clientName is not None and "since" in query:
+                limit = int(query["limit"][0]) if "limit" in query else None
+                result = telemetry.since(clientName, int(query["since"][0]), limit)
+            else:
+                result = telemetry.latest(clientName)
+            self.sendJson(200, result)
+        except ValueError as e:
+            logger.error(f"遥测查询参数错误: {e}")
+            self.sendEmpty(400)
+
+    def handleRender(self, query):
+        """
+        GET /render?planId=...                      该任务规划的航线图（PNG）
+        GET /render?planId=...&format=svg&wait=5    可选格式png/svg，wait为最多等待渲染的秒数
+        图片在后台线程渲染并按planId缓存；等待超时返回202，稍后重新请求即可
+        """
+        planId = query.get("planId", [None])[0]
+        fmt = query.get("format", ["png"])[0]
+        if not planId or fmt not in render.CONTENT_TYPES:
+            self.sendEmpty(400)
+            return
+        try:
+            wait = float(query.get("wait", [5])[0])
+            image = render.submit(planId, fmt).result(timeout=wait)
+        except FutureTimeoutError:
+            self.sendJson(202, {"status": "rendering", "planId": planId})
+            return
+        except KeyError:
+            self.sendEmpty(404)
+            return
+        except Exception as e:
+            logger.error(f"渲染航线图失败: {e}")
+            self.sendEmpty(500)
             return
+        self.sendBytes(200, render.CONTENT_TYPES[fmt], image)
 
     def do_POST(self):
+        start = time.perf_counter()
+        command = "invalid"
         try:
             params = self.rfile.read(int(self.headers['content-length']))
             params = json.loads(params)
+            command = params.get("command") if params.get("command") in COMMANDS else "other"
+
+            logger.info("接收到前端请求：%s", params)
+            if startup.firstCommand():
+                logger.info(f"启动后接收到第一条指令，距启动{startup.g_firstCommand * 1000:.0f}ms")
+
+            waitAckTimeout, waitAckStage = waitAckParams(params)
+            with self.server.workerSemaphore:
+                resultList = handleCommand(params)
+            if waitAckTimeout is not None:
+                # 等待回执不占用工作线程名额
+                waitAcks(resultList, waitAckTimeout, waitAckStage)
 
-            logger.info(f"接收到前端请求：{params}")
-
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'X-Requested-With, Content-Type')
-            self.end_headers()
-
-            command = params.get("command")
-            clientNameList = params.get("clientNameList")
-            flyCommand = params.get("flyCommand")
-            isEncrypt = params.get("encrypt")
-
-            resultList = []
-            if command == "start" or command == "stop":
-                # 遍历列表，逐个处理
-                for clientName in clientNameList:
-                    result = flightControl.flightControl(clientName, flyCommand, isEncrypt)
-                    resultList.append(result)
-            if command == "plan":
-                for clientName in clientNameList:
-                    result = flightControl.flightControl(clientName, flyCommand, isEncrypt, isPlan=True)
-                    resultList.append(result)
-            if command == "mission_plan":
-                area = flyCommand.get("area")
-                waypoint_dict = generate_mission_plan(area, clientNameList)
-                for client_name, waypoints in waypoint_dict.items():
-                     mission_cache[client_name] = waypoints
-                # draw_track(waypoint_dict,flyCommand)
-                resultList = {
-                    "status": "success",
-                    "msg": "任务规划成功！",
-                    "waypoints": waypoint_dict
-                }
-            if command == "mission_start":
-                success = 0
-                for clientName in clientNameList:
-                    flyCommand_single = {
-                        "waypoints": mission_cache[clientName]
-                    }
-                    result = flightControl.flightControl(clientName, flyCommand_single, isEncrypt, isPlan=True)
-                    if result.get("status") == "success":
-                        success = success + 1
-                if success == len(clientNameList):
-                    resultList.append({
-                        "status": "success",
-                        "msg": "执行成功！"
-                    })
-                else:
-                    resultList.append({
-                        "status": "failed",
-                        "msg": "未连接到服务器！"
-                    })
-
-            self.wfile.write(json.dumps(resultList).encode('utf-8'))
-            logger.info(f"响应前端：{json.dumps(resultList).encode('utf-8')}")
+            body = self.sendJson(200, resultList)
+            logger.info("响应前端：%s", body)
         except Exception as e:
             logger.error(f"处理POST请求时发生异常: {e}")
-            self.send_response(400)
-            self.end_headers()
+            self.sendEmpty(400)
+        requestSeconds.labels(command).observe(time.perf_counter() - start)
+
+
+# 前端任务规划参数名与plan_coverage参数名的对应关系
+PLAN_PARAMS = {
+    "footprint": "footprint",
+    "sidelap": "sidelap",
+    "angle": "angle",
+    "waypointSpacing": "waypoint_spacing",
+    "altitude": "altitude",
+    "altitudeStep": "altitude_step",
+}
+
+
+def planParams(flyCommand):
+    """
+    :param flyCommand: 形如{"area": [...], "footprint": 40, "sidelap": 0.2, ...}，未给出的参数使用默认值
+    :return: plan_coverage的关键字参数
+    """
+    return {name: flyCommand[key] for key, name in PLAN_PARAMS.items() if flyCommand.get(key) is not None}
+
+
+def simplifyMission(clientName, waypoints, tolerance):
+    """
+    按容差简化航点，减少上传的任务项
+    :param tolerance: 允许的最大偏差（米），为空时不简化
+    """
+    if not tolerance or not waypoints:
+        return waypoints
+    # 规划模块依赖NumPy，启动时不导入，由启动完成后的后台预热或第一次使用时导入
+    from modules.mission_plan import simplify_waypoints
+    waypoints, stats = simplify_waypoints(waypoints, tolerance)
+    logger.info(f"{clientName}航点简化：{stats['before']} -> {stats['after']}，删除{stats['removed']}个，"
+                f"最大偏差{stats['maxDeviation']:.2f}米，耗时{stats['computeMs']:.1f}ms")
+    return waypoints
+
+
+def waitAckParams(params):
+    """
+    解析等待回执的参数，必须在发送指令之前调用，参数错误时指令不发送
+    :param params: 前端请求，"waitAck"为最多等待的秒数，"waitAckStage"为dispatched（默认，等到无人机开始执行）
+                   或completed（等到执行结束）
+    :return: (等待秒数, 阶段)，不等待回执时返回(None, None)
+    :raises ValueError: 参数错误
+    """
+    if not params.get("waitAck"):
+        return None, None
+    timeout = float(params["waitAck"])
+    if timeout < 0:
+        raise ValueError(f"waitAck不能为负数：{timeout}")
+    stage = params.get("waitAckStage", ack.DISPATCHED)
+    if stage not in ack.STAGES:
+        raise ValueError(f"未知的waitAckStage：{stage}")
+    return timeout, stage
+
+
+def waitAcks(resultList, timeout, stage):
+    """
+    等待各无人机的指令回执，写入每架无人机result的"ack"字段
+    :param timeout: 最多等待的秒数
+    :param stage: dispatched（等到无人机开始执行）或completed（等到执行结束）
+    """
+    if not isinstance(resultList, list):
+        return
+    # mission_start的每架无人机结果在汇总结果的"results"中
+    results = [result for item in resultList for result in item.get("results", [item])]
+    ack.waitAll(results, timeout, stage)
+
+
+def handleCommand(params):
+    """
+    处理前端的JSON指令（start/stop/plan/mission_plan/mission_start）
+    :param params: 前端请求，形如{"command": ..., "clientNameList": [...], "flyCommand": {...}, "encrypt": bool}，
+                   可选"waitAck"时等待无人机回执，见waitAcks
+    :return: 响应前端的结果
+    """
+    command = params.get("command")
+    clientNameList = params.get("clientNameList")
+    flyCommand = params.get("flyCommand")
+    isEncrypt = params.get("encrypt")
+    deadline = params.get("deadline")  # 可选，单次请求的截止时间（秒）
+    # 可选，航点简化容差（米），对plan指令的航点和mission_start的规划结果生效
+    simplifyTolerance = flyCommand.get("simplifyTolerance") if isinstance(flyCommand, dict) else None
+
+    if command == "plan" and simplifyTolerance and flyCommand.get("waypoints"):
+        # 同一组航点发给所有无人机，只需简化一次，必须在批量加密之前
+        flyCommand = dict(flyCommand, waypoints=simplifyMission(",".join(clientNameList or []),
+                                                                 flyCommand["waypoints"], simplifyTolerance))
+
+    ciphertexts = {}
+    prefetched = False
+    if isEncrypt and clientNameList:
+        # 一次查询预取整个机群的密钥，避免每架无人机单独查询数据库
+        try:
+            keys = database.prefetchIdentityKeys(clientNameList)
+            if command in ("start", "stop", "plan"):
+                # 同一条指令发给所有无人机，批量加密
+                ciphertexts = flightControl.encryptForFleet(clientNameList, flyCommand, keys)
+                prefetched = True
+        except Exception as e:
+            logger.error(f"批量预取密钥失败: {e}")
+
+    resultList = []
+    if command == "start" or command == "stop":
+        # 并行分发给每架无人机，结果按列表顺序返回
+        resultList = fleet.fanOut(clientNameList,
+                                  lambda clientName: flightControl.flightControl(
+                                      clientName, flyCommand, isEncrypt, ciphertext=ciphertexts.get(clientName),
+                                      prefetched=prefetched),
+                                  deadline)
+    if command == "plan":
+        resultList = fleet.fanOut(clientNameList,
+                                  lambda clientName: flightControl.flightControl(
+                                      clientName, flyCommand, isEncrypt, isPlan=True,
+                                      ciphertext=ciphertexts.get(clientName), prefetched=prefetched),
+                                  deadline)
+    if command == "mission_plan":
+        from modules.mission_plan import plan_coverage, PLANNER_VERSION
+        area = flyCommand.get("area")
+        planId, plan, hit = mission_cache.plan(area, clientNameList, planParams(flyCommand), plan_coverage,
+                                               PLANNER_VERSION)
+        waypoint_dict = plan["waypoints"]
+        # 预先在后台渲染航线图，前端随后请求/render时通常已经就绪
+        render.submit(planId, "png")
+        resultList = {
+            "status": "success",
+            "msg": "任务规划成功！",
+            "planId": planId,
+            "cached": hit,
+            "waypoints": waypoint_dict,
+            "stats": plan["stats"]
+        }
+    if command == "mission_start":
+        planId = (flyCommand or {}).get("planId")  # 可选，不指定时使用每架无人机最近一次的规划
 
+        def startMission(clientName):
+            waypoints = mission_cache.waypointsFor(clientName, planId)
+            if waypoints is None:
+                return {"clientName": clientName, "status": "error", "msg": "未找到该无人机的任务规划！"}
+            waypoints = simplifyMission(clientName, waypoints, simplifyTolerance)
+            flyCommand_single = {
+                "waypoints": waypoints
+            }
+            return flightControl.flightControl(clientName, flyCommand_single, isEncrypt, isPlan=True)
 
+        results = fleet.fanOut(clientNameList, startMission, deadline)
+        success = sum(1 for result in results if result.get("status") == "success")
+        if success == len(clientNameList):
+            resultList.append({
+                "status": "success",
+                "msg": "执行成功！"
+            })
+        elif any(result.get("msg") == "未找到该无人机的任务规划！" for result in results):
+            resultList.append({
+                "status": "failed",
+                "msg": "部分无人机没有任务规划，请先进行任务规划！"
+            })
+        else:
+            resultList.append({
+                "status": "failed",
+                "msg": "未连接到服务器！"
+            })
+        if params.get("waitAck"):
+            resultList[-1]["results"] = results
 
+    return resultList
@@ -1,11 +1,277 @@
-import queue
+import collections
 import time
+import zlib
 import pika
 import threading
+from modules import metrics
+
+confirmSeconds = metrics.histogram("rabbitmq_publish_confirm_seconds", "消息从入队到Broker确认的耗时（秒）")
+reconnectSeconds = metrics.histogram("rabbitmq_reconnect_seconds", "发送连接从断开到重新可以发布的耗时（秒）",
+                                     buckets=(0.5, 1, 2, 3, 5, 10, 30, 60, 120))
+
+
+class RateMeter:
+    """按秒分桶统计最近window秒内的平均速率"""
+
+    def __init__(self, window=5):
+        self.window = window
+        self._buckets = [0] * (window + 1)
+        self._seconds = [0] * (window + 1)
+
+    def mark(self, count=1):
+        now = int(time.time())
+        index = now % len(self._buckets)
+        if self._seconds[index] != now:
+            self._seconds[index] = now
+            self._buckets[index] = 0
+        self._buckets[index] += count
+
+    def rate(self):
+        now = int(time.time())
+        # 不统计当前还未结束的一秒
+        total = sum(count for second, count in zip(self._seconds, self._buckets) if now - self.window <= second < now)
+        return total / self.window
+
+
+class PublisherShard:
+    """
+    发送分片：独占一个线程、一个异步连接和一个开启了发布确认的通道。
+    同一无人机的消息总是进入同一个分片，保证单机消息有序；每次从队列中批量取出消息发布，
+    由Broker异步确认，不需要每条消息等待一次往返。连接断开时未确认的消息放回队列头部，重连后重发。
+    消息以mandatory发布，无人机队列尚未绑定（刚启动或重连中）时Broker退回消息，return_delay秒后重发，
+    最多重发max_retries次，仍然退回的消息丢弃并计入unroutable。
+    """
+
+    def __init__(self, server, index):
+        self.server = server
+        self.index = index
+
+        self.queue = collections.deque()
+        self.connection = None
+        self.channel = None
+
+        # 格式：{ delivery_tag: (client_name, message, content_type, 入队时间, 已退回次数) }
+        self._pending = collections.OrderedDict()
+        self._returnedTags = set()  # 已被Broker退回、等待确认的delivery_tag
+        self._delayed = []  # 被退回、等待return_delay秒后重发的消息
+        self._deliveryTag = 0
+        self._wakeScheduled = False
+
+        self.published = 0
+        self.confirmed = 0
+        self.nacked = 0
+        self.returned = 0
+        self.unroutable = 0
+        self.reconnects = 0
+        self.lastConfirmLatency = 0.0
+        self._disconnectedAt = None
+        self.rateMeter = RateMeter()
+
+        self.thread = threading.Thread(target=self._run, name=f"publisher-{index}")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def enqueue(self, item):
+        self.queue.append(item)
+        connection = self.connection
+        if connection is not None and not self._wakeScheduled:
+            self._wakeScheduled = True
+            try:
+                connection.ioloop.add_callback_threadsafe(self._drain)
+            except Exception:
+                self._wakeScheduled = False
+
+    def _run(self):
+        while self.server.running:
+            try:
+                self.connection = pika.SelectConnection(
+                    self.server.connection_parameters(),
+                    on_open_callback=self._onConnectionOpen,
+                    on_open_error_callback=self._onConnectionOpenError,
+                    on_close_callback=self._onConnectionClosed
+                )
+                self.connection.ioloop.start()
+            except Exception as e:
+                print(f"[publisher-{self.index}] 发送连接异常: {e}")
+            self.connection = None
+            self.channel = None
+            self._requeuePending()
+            if self.server.running:
+                self.reconnects += 1
+                if self._disconnectedAt is None:
+                    self._disconnectedAt = time.perf_counter()
+                print(f"[publisher-{self.index}] 发送连接断开，{self.server.retry_delay}秒后重连")
+                time.sleep(self.server.retry_delay)
+
+    def _onConnectionOpen(self, connection):
+        connection.channel(on_open_callback=self._onChannelOpen)
+
+    def _onConnectionOpenError(self, connection, error):
+        print(f"[publisher-{self.index}] 无法建立发送连接: {error}")
+        connection.ioloop.stop()
+
+    def _onConnectionClosed(self, connection, reason):
+        self.channel = None
+        connection.ioloop.stop()
+
+    def _onChannelOpen(self, channel):
+        self.channel = channel
+        channel.add_on_close_callback(self._onChannelClosed)
+        channel.add_on_return_callback(self._onReturn)
+        channel.exchange_declare(exchange='server_to_client', exchange_type='direct',
+                                 callback=lambda frame: channel.confirm_delivery(self._onConfirm,
+                                                                                 callback=self._onConfirmSelected))
+
+    def _onChannelClosed(self, channel, reason):
+        print(f"[publisher-{self.index}] 发送通道关闭: {reason}")
+        self.channel = None
+        if self.connection is not None and self.connection.is_open:
+            self.connection.close()
+
+    def _onConfirmSelected(self, frame):
+        self._deliveryTag = 0
+        self._returnedTags.clear()
+        if self._disconnectedAt is not None:
+            reconnectSeconds.observe(time.perf_counter() - self._disconnectedAt)
+            self._disconnectedAt = None
+        self._drain()
+        # 兜底的定时唤醒，防止唤醒回调丢失导致消息滞留
+        self._scheduleTick()
+
+    def _scheduleTick(self):
+        if self.connection is not None and self.connection.is_open:
+            self.connection.ioloop.call_later(0.2, self._tick)
+
+    def _tick(self):
+        self._drain()
+        self._scheduleTick()
+
+    def _drain(self):
+        self._wakeScheduled = False
+        channel = self.channel
+        if channel is None or not channel.is_open:
+            return
+
+        batch = 0
+        while self.queue and batch < self.server.batch_size and len(self._pending) < self.server.max_in_flight:
+            item = self.queue.popleft()
+            client_name, message, content_type = item[:3]
+            # message_id为delivery_tag，Broker退回消息时据此找到对应的待确认消息
+            properties = pika.BasicProperties(content_type=content_type, message_id=str(self._deliveryTag + 1))
+            try:
+                channel.basic_publish(exchange='server_to_client', routing_key=f'{client_name}', body=message,
+                                      properties=properties, mandatory=True)
+            except Exception as e:
+                print(f"[publisher-{self.index}] 发布消息失败: {e}")
+                self.queue.appendleft(item)
+                return
+            self._deliveryTag += 1
+            self._pending[self._deliveryTag] = item
+            self.published += 1
+            batch += 1
+
+        if self.queue and len(self._pending) < self.server.max_in_flight:
+            # 还有剩余消息，先让IO循环把这一批写出去再继续
+            self._wakeScheduled = True
+            self.connection.ioloop.add_callback(self._drain)
+
+    def _onReturn(self, channel, method, properties, body):
+        # Broker先发送basic.return，再确认同一条消息
+        try:
+            self._returnedTags.add(int(properties.message_id))
+        except (TypeError, ValueError):
+            print(f"[publisher-{self.index}] 无法识别被退回的消息: {method.routing_key}")
+
+    def _retryReturned(self):
+        self.queue.extend(self._delayed)
+        self._delayed = []
+        self._drain()
+
+    def _onConfirm(self, frame):
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        if method.multiple:
+            tags = [tag for tag in self._pending if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag] if method.delivery_tag in self._pending else []
+
+        now = time.time()
+        nackedItems = []
+        returnedItems = []
+        for tag in tags:
+            item = self._pending.pop(tag)
+            if tag in self._returnedTags:
+                self._returnedTags.discard(tag)
+                returnedItems.append(item)
+            elif acked:
+                self.lastConfirmLatency = now - item[3]
+                confirmSeconds.observe(self.lastConfirmLatency)
+            else:
+                nackedItems.append(item)
+
+        if returnedItems:
+            self._handleReturned(returnedItems)
+        if acked:
+            confirmed = len(tags) - len(returnedItems)
+            self.confirmed += confirmed
+            self.rateMeter.mark(confirmed)
+        else:
+            # Broker拒收的消息放回队列头部重发
+            self.nacked += len(nackedItems)
+            self.queue.extendleft(reversed(nackedItems))
+
+        if self.queue:
+            self._drain()
+
+    def _handleReturned(self, items):
+        # 无人机队列尚未绑定时消息被退回，稍后重发；超过重试次数的消息丢弃
+        self.returned += len(items)
+        retries = [item[:4] + (item[4] + 1,) for item in items if item[4] < self.server.max_retries]
+        dropped = len(items) - len(retries)
+        if dropped:
+            self.unroutable += dropped
+            print(f"[publisher-{self.index}] {dropped}条消息无法投递到无人机队列，已丢弃")
+        if retries:
+            if not self._delayed:
+                self.connection.ioloop.call_later(self.server.return_delay, self._retryReturned)
+            self._delayed.extend(retries)
+
+    def _requeuePending(self):
+        # 连接断开时等待重发的退回消息一并放回队列
+        self.queue.extend(self._delayed)
+        self._delayed = []
+        if self._pending:
+            self.queue.extendleft(reversed(list(self._pending.values())))
+            self._pending.clear()
+
+    def close(self):
+        connection = self.connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(connection.close)
+            except Exception:
+                pass
+
+    def metrics(self):
+        return {
+            "queueDepth": len(self.queue),
+            "inFlight": len(self._pending),
+            "published": self.published,
+            "confirmed": self.confirmed,
+            "nacked": self.nacked,
+            "returned": self.returned,
+            "unroutable": self.unroutable,
+            "reconnects": self.reconnects,
+            "publishRate": self.rateMeter.rate(),
+            "lastConfirmLatency": self.lastConfirmLatency,
+        }
 
 
 class RabbitMQServer:
-    def __init__(self, host, port, userName, password, service_type, message_ttl=10000, max_retries=3):
+    def __init__(self, host, port, userName, password, service_type, message_ttl=10000, max_retries=3,
+                 shards=4, batch_size=100, max_in_flight=1000, retry_delay=2, return_delay=0.5):
         self.host = host
         self.port = port
         self.userName = userName
@@ -13,45 +279,35 @@ class RabbitMQServer:
         self.service_type = service_type
         self.message_ttl = message_ttl
         self.max_retries = max_retries
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.retry_delay = retry_delay
+        self.return_delay = return_delay  # 被退回的消息重发前等待的秒数
 
         # 初始化连接
         self.credentials = pika.PlainCredentials(self.userName, self.password)
-        self.init_send_connection()
         self.init_receive_connection()
 
-        # 创建消息队列
-        self.message_queue = queue.Queue()
-
-        # 启动发送线程
+        # 启动发送分片，每个分片一个线程和一个连接
         self.running = True
-        self.send_thread = threading.Thread(target=self._process_message_queue)
-        self.send_thread.daemon = True
-        self.send_thread.start()
+        self.shards = [PublisherShard(self, index) for index in range(shards)]
+        for shard in self.shards:
+            shard.start()
 
-    def create_connection(self):
-        # 创建连接,添加心跳检测
-        return pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=self.host,
-                port=self.port,
-                credentials=self.credentials,
-                heartbeat=60,  # 添加心跳检测
-                blocked_connection_timeout=300,
-                connection_attempts=3,
-                retry_delay=5
-            )
+    def connection_parameters(self):
+        return pika.ConnectionParameters(
+            host=self.host,
+            port=self.port,
+            credentials=self.credentials,
+            heartbeat=60,  # 添加心跳检测
+            blocked_connection_timeout=300,
+            connection_attempts=3,
+            retry_delay=5
         )
 
-    def init_send_connection(self):
-        if hasattr(self, 'sendConnection') and self.sendConnection.is_open:
-            try:
-                self.sendConnection.close()
-            except:
-                pass
-
-        self.sendConnection = self.create_connection()
-        self.sendChannel = self.sendConnection.channel()
-        self.sendChannel.exchange_declare(exchange='server_to_client', exchange_type='direct')
+    def create_connection(self):
+        # 创建连接,添加心跳检测
+        return pika.BlockingConnection(self.connection_parameters())
 
     def init_receive_connection(self):
         if hasattr(self, 'receiveConnection') and self.receiveConnection.is_open:
@@ -75,54 +331,36 @@ class RabbitMQServer:
             routing_key=f"{self.service_type}"
         )
 
-    def send(self, client_name, message):
-        # 将消息放入队列
-        self.message_queue.put((client_name, message))
+    def shard_of(self, client_name):
+        # 使用稳定的哈希，保证同一无人机总是落在同一分片
+        return self.shards[zlib.crc32(client_name.encode()) % len(self.shards)]
 
-        print(f"[RabbitMQ.send] 入队 client: {client_name}, message: {message}")
-        print(f"[RabbitMQ.send] 当前队列长度: {self.message_queue.qsize()}")
+    def send(self, client_name, message, content_type=None):
+        # 将消息放入该无人机所在分片的队列
+        shard = self.shard_of(client_name)
+        shard.enqueue((client_name, message, content_type, time.time(), 0))
 
+    def queue_depth(self):
+        return sum(len(shard.queue) for shard in self.shards)
 
-    def _send_message(self, client_name, message):
-        routing_key = f'{client_name}'
-        for retry in range(self.max_retries):
-            try:
-                self.sendChannel.basic_publish(
-                    exchange='server_to_client',
-                    routing_key=routing_key,
-                    body=message
-                )
-                print(f" [x] Sent to {client_name}: {message}")
-                return
-            except Exception:
-                print(f"Send connection lost, reconnecting {retry + 1}/{self.max_retries}")
-                try:
-                    # 重新建立连接，发送消息
-                    self.init_send_connection()
-                    self.sendChannel.basic_publish(
-                        exchange='server_to_client',
-                        routing_key=routing_key,
-                        body=message
-                    )
-                    return
-                except Exception:
-                    print(f"Failed to reconnect send connection")
-                    if retry == self.max_retries - 1:
-                        raise
-                    time.sleep(1)
-
-    def _process_message_queue(self):
-        while self.running:
-            try:
-                # 从队列中获取消息
-                client_name, message = self.message_queue.get(timeout=1)
-                self._send_message(client_name, message)
-            except queue.Empty:
-                # 队列为空时继续循环
-                continue
-            except Exception as e:
-                print(f"Error processing message: {e}")
-                time.sleep(1)
+    def metrics(self):
+        """
+        发送统计
+        :return: 字典，包含总队列长度、每秒确认数（最近5秒平均）、累计发布/确认/拒收/退回/无法投递/重连次数及各分片明细
+        """
+        shards = [shard.metrics() for shard in self.shards]
+        return {
+            "queueDepth": sum(m["queueDepth"] for m in shards),
+            "inFlight": sum(m["inFlight"] for m in shards),
+            "published": sum(m["published"] for m in shards),
+            "confirmed": sum(m["confirmed"] for m in shards),
+            "nacked": sum(m["nacked"] for m in shards),
+            "returned": sum(m["returned"] for m in shards),
+            "unroutable": sum(m["unroutable"] for m in shards),
+            "reconnects": sum(m["reconnects"] for m in shards),
+            "publishRate": sum(m["publishRate"] for m in shards),
+            "shards": shards,
+        }
 
     def receive(self, callback):
         # 开始消费消息
@@ -146,5 +384,6 @@ class RabbitMQServer:
 
     def close(self):
         self.running = False
-        self.sendChannel.close()
+        for shard in self.shards:
+            shard.close()
         self.receiveChannel.close()
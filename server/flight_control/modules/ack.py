@@ -0,0 +1,191 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from modules import logger
+from modules import metrics
+
+# 指令回执的阶段：无人机开始执行指令时回复dispatched，执行结束（或解密失败等无法执行）时回复completed
+DISPATCHED = "dispatched"
+COMPLETED = "completed"
+STAGES = (DISPATCHED, COMPLETED)
+
+g_ttl = 3600
+g_keepCompleted = 60
+g_maxPendingPerClient = 256
+pending = OrderedDict()  # 等待执行结束回执的指令，按发送顺序排列，格式：{ 指令ID: PendingCommand, ... }
+# 每架无人机等待回执的指令ID，按发送顺序排列，格式：{ "uav01": OrderedDict({ 指令ID: None, ... }), ... }
+# 不回复回执的无人机（旧版本或离线）按摇杆频率收到指令时，只保留最近g_maxPendingPerClient条
+clientPending = {}
+recent = OrderedDict()  # 最近执行结束的指令，按结束顺序排列，保留g_keepCompleted秒供HTTP请求读取回执
+_pendingLock = threading.Lock()
+# 指令ID：进程标识 + 自增序号，服务器重启后不会与之前发出的指令重复
+_idPrefix = f"{os.getpid():x}{int(time.time()):x}"
+_idCounter = itertools.count(1)
+
+roundTripSeconds = metrics.histogram("command_round_trip_seconds",
+                                     "指令从服务器发出到收到无人机第一个回执的耗时（秒）", ("clientName",))
+executionSeconds = metrics.histogram("command_execution_seconds", "无人机从开始执行到执行结束的耗时（秒）",
+                                     ("clientName",), buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+                                                               600, 1800))
+ackCounter = metrics.counter("command_acks_total", "收到的指令回执数，result为success/error/unknown（指令已过期或不存在）",
+                             ("stage", "result"))
+expiredCounter = metrics.counter("command_ack_expired_total",
+                                 "未收到执行结束回执就不再跟踪的指令数，reason为ttl（超过保留时间）/limit（超过每架无人机的上限）",
+                                 ("reason",))
+metrics.gauge("command_pending_acks", "等待执行结束回执的指令数", lambda: len(pending))
+
+
+class PendingCommand:
+    def __init__(self, clientName, commandId):
+        self.clientName = clientName
+        self.commandId = commandId
+        self.sentAt = time.time()  # 服务器时钟，随指令发给无人机
+        self.sentMonotonic = time.monotonic()
+        self.completedMonotonic = None
+        self.roundTrip = None  # 秒
+        self.ack = {}  # 无人机回执中的时间戳等字段，为无人机时钟
+        self.dispatched = threading.Event()
+        self.completed = threading.Event()
+
+    def result(self):
+        """
+        :return: 回执字典，包含阶段、往返耗时以及无人机端收到、开始执行、执行结束的时刻
+        """
+        stage = COMPLETED if self.completed.is_set() else DISPATCHED if self.dispatched.is_set() else "timeout"
+        result = {"stage": stage}
+        if self.roundTrip is not None:
+            result["roundTripMs"] = round(self.roundTrip * 1000, 3)
+        for key in ("status", "msg", "code", "receivedAt", "dispatchedAt", "completedAt"):
+            if key in self.ack:
+                result[key] = self.ack[key]
+        executionTime = _executionTime(self.ack)
+        if executionTime is not None:
+            result["executionMs"] = round(executionTime * 1000, 3)
+        return result
+
+
+def init(ttl=3600, keepCompleted=60, maxPendingPerClient=256):
+    """
+    :param ttl: 指令等待执行结束回执的最长时间（秒），超过后不再跟踪
+    :param keepCompleted: 执行结束的指令保留的时间（秒），HTTP请求等待回执的时间不能超过该值
+    :param maxPendingPerClient: 每架无人机最多跟踪的未执行结束的指令数，超过后不再跟踪最早的指令
+    """
+    global g_ttl, g_keepCompleted, g_maxPendingPerClient
+    g_ttl = ttl
+    g_keepCompleted = keepCompleted
+    g_maxPendingPerClient = maxPendingPerClient
+    logger.info(f"指令回执服务初始化成功，等待回执{ttl}秒")
+
+
+def track(clientName):
+    """
+    登记一条即将发给无人机的指令，必须在发送之前调用，避免回执先于登记到达
+    :return: PendingCommand，其commandId和sentAt随指令一起发送
+    """
+    command = PendingCommand(clientName, f"{_idPrefix}-{next(_idCounter)}")
+    with _pendingLock:
+        _expire(command.sentMonotonic)
+        pending[command.commandId] = command
+        commandIds = clientPending.setdefault(clientName, OrderedDict())
+        commandIds[command.commandId] = None
+        while len(commandIds) > g_maxPendingPerClient:
+            oldestId, _ = commandIds.popitem(last=False)
+            del pending[oldestId]
+            expiredCounter.labels("limit").inc()
+    return command
+
+
+def _untrack(command):
+    del pending[command.commandId]
+    commandIds = clientPending[command.clientName]
+    del commandIds[command.commandId]
+    if not commandIds:
+        del clientPending[command.clientName]
+
+
+def _expire(now):
+    # 两个字典都按时间顺序排列，只需检查最早的指令
+    while pending:
+        command = next(iter(pending.values()))
+        if now - command.sentMonotonic < g_ttl:
+            break
+        _untrack(command)
+        expiredCounter.labels("ttl").inc()
+    while recent:
+        command = next(iter(recent.values()))
+        if now - command.completedMonotonic < g_keepCompleted:
+            break
+        del recent[command.commandId]
+
+
+def _executionTime(ack):
+    if ack.get("dispatchedAt") is None or ack.get("completedAt") is None:
+        return None
+    return ack["completedAt"] - ack["dispatchedAt"]
+
+
+def resolve(clientName, ack):
+    """
+    处理无人机发回的回执
+    :param ack: 形如{"commandId": ..., "stage": "dispatched"/"completed", "receivedAt": ..., "dispatchedAt": ...,
+                "completedAt": ..., "status": "success"/"error", "msg": ..., "code": 可选的错误码}，
+                时刻为无人机端的time.time()
+    """
+    now = time.monotonic()
+    stage = ack.get("stage")
+    with _pendingLock:
+        command = pending.get(ack.get("commandId"))
+        if command is not None and (command.clientName != clientName or stage not in STAGES):
+            # 其他无人机或格式错误的回执不能影响该指令的跟踪
+            command = None
+        if command is not None and stage == COMPLETED:
+            _untrack(command)
+            command.completedMonotonic = now
+            recent[command.commandId] = command
+    if command is None:
+        ackCounter.labels(str(stage), "unknown").inc()
+        logger.warning(f"收到{clientName}未知指令的回执：{ack}")
+        return
+
+    command.ack.update(ack)
+    if command.roundTrip is None:
+        # 往返耗时只用服务器时钟计算，不受无人机时钟偏差影响
+        command.roundTrip = now - command.sentMonotonic
+        roundTripSeconds.labels(clientName).observe(command.roundTrip)
+    ackCounter.labels(stage, ack.get("status", "success")).inc()
+
+    if stage == COMPLETED:
+        executionTime = _executionTime(command.ack)
+        if executionTime is not None:
+            executionSeconds.labels(clientName).observe(executionTime)
+        command.dispatched.set()
+        command.completed.set()
+    else:
+        command.dispatched.set()
+
+
+def find(commandId):
+    """
+    :return: 等待回执或最近执行结束的指令，不存在时返回None
+    """
+    with _pendingLock:
+        return pending.get(commandId) or recent.get(commandId)
+
+
+def waitAll(resultList, timeout, stage=DISPATCHED):
+    """
+    等待各无人机的回执，所有无人机共用一个截止时间，结果写入每个result的"ack"字段
+    :param resultList: 带"commandId"的result字典列表，没有commandId（未发送）的跳过
+    :param timeout: 最多等待的秒数，不超过执行结束的指令的保留时间
+    :param stage: 等到dispatched（开始执行）还是completed（执行结束）
+    """
+    deadline = time.monotonic() + min(timeout, g_keepCompleted)
+    commands = [(result, find(result["commandId"])) for result in resultList if result.get("commandId")]
+    commands = [(result, command) for result, command in commands if command is not None]
+    for result, command in commands:
+        event = command.completed if stage == COMPLETED else command.dispatched
+        event.wait(max(0.0, deadline - time.monotonic()))
+    for result, command in commands:
+        result["ack"] = command.result()
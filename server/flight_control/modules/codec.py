@@ -0,0 +1,160 @@
+"""
+服务器与无人机之间的消息编解码。
+
+JSON：原有格式，密文以base64字符串放在dataPackage["data"]中，兼容旧版本客户端。
+二进制：固定结构的消息头 + 消息体，消息体按内容选择最紧凑的编码：
+    BODY_JSON       dataPackage的紧凑JSON
+    BODY_CIPHER     原始密文字节（不做base64）+ 其余字段的JSON
+    BODY_WAYPOINTS  航点数组，每个航点为<ddd（纬度、经度、高度）+ 其余字段的JSON
+    BODY_TELEMETRY  固定字段的遥测数据，见TELEMETRY_FIELDS
+
+发送方通过AMQP消息属性content_type标明编码；无人机在消息头ACCEPT_HEADER中声明自己能解析的编码，
+服务器据此决定向该无人机发送哪种格式，未声明的客户端一律使用JSON。
+"""
+import base64
+import json
+import struct
+
+JSON = "json"
+BINARY = "binary"
+
+CONTENT_TYPES = {
+    JSON: "application/json",
+    BINARY: "application/x-uav-binary",
+}
+CODECS = {contentType: codecName for codecName, contentType in CONTENT_TYPES.items()}
+ACCEPT_HEADER = "x-accept-codec"
+
+MAGIC = b"UB"
+VERSION = 1
+
+BODY_JSON = 0
+BODY_CIPHER = 1
+BODY_WAYPOINTS = 2
+BODY_TELEMETRY = 3
+
+# 魔数、版本、消息体类型、clientName/dataType/serviceType的字节长度
+_HEADER = struct.Struct("<2sBBBBB")
+_LENGTH = struct.Struct("<I")
+_WAYPOINT = struct.Struct("<ddd")
+
+# 遥测数据字段，顺序即二进制编码顺序
+TELEMETRY_FIELDS = ("seq", "time", "lat", "lon", "alt", "relativeAlt", "vx", "vy", "vz",
+                    "roll", "pitch", "yaw", "xacc", "yacc", "zacc", "xgyro", "ygyro", "zgyro")
+_TELEMETRY = struct.Struct("<Iddd14f")
+
+
+def contentType(codecName):
+    return CONTENT_TYPES[codecName]
+
+
+def codecOf(contentType):
+    """根据AMQP的content_type判断编码，未知或为空时按JSON处理"""
+    return CODECS.get(contentType, JSON)
+
+
+def _jsonDefault(obj):
+    if isinstance(obj, (bytes, bytearray)):
+        return base64.b64encode(obj).decode()
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+
+def _compactJson(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_jsonDefault).encode()
+
+
+def encode(message, codecName=JSON):
+    """
+    编码消息
+    :param message: 消息字典，形如{"clientName": ..., "dataType": ..., "serviceType": ..., "dataPackage": ...}
+    :param codecName: JSON或BINARY
+    :return: 字节串
+    """
+    if codecName == BINARY:
+        return encodeBinary(message)
+    return json.dumps(message, default=_jsonDefault).encode()
+
+
+def decode(body, codecName=JSON):
+    if codecName == BINARY:
+        return decodeBinary(body)
+    return json.loads(body.decode())
+
+
+def _isWaypointList(waypoints):
+    return (isinstance(waypoints, list) and
+            all(isinstance(wp, dict) and wp.keys() == {"lat", "lon", "alt"} for wp in waypoints))
+
+
+def _encodeBody(dataType, dataPackage):
+    if isinstance(dataPackage, dict):
+        data = dataPackage.get("data")
+        if isinstance(data, (bytes, bytearray)):
+            rest = {k: v for k, v in dataPackage.items() if k != "data"}
+            return BODY_CIPHER, b"".join((_LENGTH.pack(len(data)), data, _compactJson(rest)))
+
+        if isinstance(data, dict) and data.keys() == {"waypoints"} and _isWaypointList(data["waypoints"]):
+            waypoints = data["waypoints"]
+            packed = b"".join(_WAYPOINT.pack(wp["lat"], wp["lon"], wp["alt"]) for wp in waypoints)
+            rest = {k: v for k, v in dataPackage.items() if k != "data"}
+            return BODY_WAYPOINTS, b"".join((_LENGTH.pack(len(waypoints)), packed, _compactJson(rest)))
+
+        if dataType == "telemetry" and dataPackage.keys() == set(TELEMETRY_FIELDS):
+            return BODY_TELEMETRY, _TELEMETRY.pack(*(dataPackage[field] for field in TELEMETRY_FIELDS))
+
+    return BODY_JSON, _compactJson(dataPackage)
+
+
+def _decodeBody(bodyType, body):
+    if bodyType == BODY_JSON:
+        return json.loads(body.decode())
+
+    if bodyType == BODY_CIPHER:
+        (length,) = _LENGTH.unpack_from(body)
+        start = _LENGTH.size
+        dataPackage = {"data": body[start:start + length]}
+        dataPackage.update(json.loads(body[start + length:].decode()))
+        return dataPackage
+
+    if bodyType == BODY_WAYPOINTS:
+        (count,) = _LENGTH.unpack_from(body)
+        start = _LENGTH.size
+        end = start + count * _WAYPOINT.size
+        waypoints = [{"lat": lat, "lon": lon, "alt": alt} for lat, lon, alt in _WAYPOINT.iter_unpack(body[start:end])]
+        dataPackage = {"data": {"waypoints": waypoints}}
+        dataPackage.update(json.loads(body[end:].decode()))
+        return dataPackage
+
+    if bodyType == BODY_TELEMETRY:
+        return dict(zip(TELEMETRY_FIELDS, _TELEMETRY.unpack(body)))
+
+    raise ValueError(f"未知的消息体类型: {bodyType}")
+
+
+def encodeBinary(message):
+    clientName = (message.get("clientName") or "").encode()
+    dataType = (message.get("dataType") or "").encode()
+    serviceType = (message.get("serviceType") or "").encode()
+    bodyType, body = _encodeBody(message.get("dataType"), message.get("dataPackage"))
+    header = _HEADER.pack(MAGIC, VERSION, bodyType, len(clientName), len(dataType), len(serviceType))
+    return b"".join((header, clientName, dataType, serviceType, body))
+
+
+def decodeBinary(data):
+    magic, version, bodyType, clientNameLen, dataTypeLen, serviceTypeLen = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("不是有效的二进制消息")
+
+    offset = _HEADER.size
+    fields = []
+    for length in (clientNameLen, dataTypeLen, serviceTypeLen):
+        fields.append(data[offset:offset + length].decode())
+        offset += length
+    clientName, dataType, serviceType = fields
+
+    message = {"dataType": dataType, "dataPackage": _decodeBody(bodyType, data[offset:])}
+    if clientName:
+        message["clientName"] = clientName
+    if serviceType:
+        message["serviceType"] = serviceType
+    return message
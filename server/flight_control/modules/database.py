@@ -1,18 +1,49 @@
 import pymysql
 from pymysql.err import MySQLError
 import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from . import logger
+from . import metrics
 
-with open("config.json", "r") as fp:
-    config = json.loads(fp.read())
-    host = config.get("database").get("host")
-    port = config.get("database").get("port")
-    user = config.get("database").get("user")
-    password = config.get("database").get("password")
-    keyDatabase = config.get("database").get("keyDatabase")
+host = None
+port = None
+user = None
+password = None
+keyDatabase = None
+poolSize = 8
+keyCacheTTL = 300
+_configLoaded = False
+_configLock = threading.Lock()
+
+
+def loadConfig():
+    """
+    第一次访问数据库时才读取配置，导入本模块不再产生文件读取
+    """
+    global host, port, user, password, keyDatabase, poolSize, keyCacheTTL, _configLoaded
+    if _configLoaded:
+        return
+    with _configLock:
+        if _configLoaded:
+            return
+        with open("config.json", "r") as fp:
+            config = json.loads(fp.read())
+            host = config.get("database").get("host")
+            port = config.get("database").get("port")
+            user = config.get("database").get("user")
+            password = config.get("database").get("password")
+            keyDatabase = config.get("database").get("keyDatabase")
+            poolSize = config.get("database").get("poolSize", 8)
+            keyCacheTTL = config.get("database").get("keyCacheTTL", 300)
+        identityKeyCache.ttl = keyCacheTTL
+        _configLoaded = True
 
 
 def connect(database):
+    loadConfig()
     connection = pymysql.connect(
         host=host,
         port=port,
@@ -24,9 +55,128 @@ def connect(database):
     return connection
 
 
+class ConnectionPool:
+    """
+    有界MySQL连接池：连接用完归还而不是关闭，空闲超过healthCheckInterval的连接在取出时先ping检查
+    """
+
+    def __init__(self, database, maxSize=8, timeout=10, healthCheckInterval=30):
+        self.database = database
+        self.maxSize = maxSize
+        self.timeout = timeout
+        self.healthCheckInterval = healthCheckInterval
+
+        # 格式：(connection, 归还时间)，后进先出，优先复用刚用过的连接；
+        # 丢弃连接时放入(None, 0)，唤醒等待的线程新建连接
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._freed = 0  # 队列中(None, 0)的个数
+
+    def _newConnection(self):
+        with self._lock:
+            if self._created >= self.maxSize:
+                return None
+            self._created += 1
+        try:
+            return connect(self.database)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _discard(self, connection):
+        with self._lock:
+            self._created -= 1
+            self._freed += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+        # 空出了一个连接名额，等待中的线程不必等到超时
+        self._idle.put((None, 0))
+
+    def _get(self, timeout=None):
+        """
+        :return: (connection, 归还时间)，取到(None, 0)表示有空出的名额
+        """
+        entry = self._idle.get_nowait() if timeout is None else self._idle.get(timeout=timeout)
+        if entry[0] is None:
+            with self._lock:
+                self._freed -= 1
+        return entry
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        try:
+            connection, releasedAt = self._get()
+        except queue.Empty:
+            connection = None
+        while connection is None:
+            connection = self._newConnection()
+            if connection is not None:
+                return connection
+            # 连接数已达上限，等待其他线程归还或丢弃连接
+            try:
+                connection, releasedAt = self._get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise MySQLError(f"获取{self.database}数据库连接超时")
+
+        if time.time() - releasedAt > self.healthCheckInterval:
+            try:
+                connection.ping(reconnect=True)
+            except Exception as e:
+                logger.warning(f"数据库连接健康检查失败，重新建立连接: {e}")
+                self._discard(connection)
+                return self.acquire()
+        return connection
+
+    def release(self, connection, broken=False):
+        if broken:
+            self._discard(connection)
+        else:
+            self._idle.put((connection, time.time()))
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        broken = False
+        try:
+            yield connection
+        except (MySQLError, OSError) as e:
+            # 操作错误（如连接断开）时丢弃该连接，普通SQL错误回滚后继续复用
+            broken = isinstance(e, (pymysql.err.OperationalError, pymysql.err.InterfaceError, OSError))
+            raise
+        finally:
+            self.release(connection, broken)
+
+    def stats(self):
+        return {"size": self._created, "idle": self._idle.qsize() - self._freed, "maxSize": self.maxSize}
+
+
+pools = {}
+_poolsLock = threading.Lock()
+
+
+def getPool(database):
+    pool = pools.get(database)
+    if pool is None:
+        loadConfig()
+        with _poolsLock:
+            pool = pools.get(database)
+            if pool is None:
+                pool = ConnectionPool(database, maxSize=poolSize)
+                pools[database] = pool
+    return pool
+
+
+queryCounter = metrics.counter("db_queries_total", "MySQL查询次数", ("database", "status"))
+querySeconds = metrics.histogram("db_query_seconds", "MySQL查询耗时（秒），包括从连接池取出连接", ("database",))
+
+
 def executeSqlCommand(database, command, arg):
     """
-    使用提供的数据库凭证连接到MySQL服务器并执行传入的MySQL命令。
+    从连接池中取出连接执行传入的MySQL命令。
 
     参数:
         command (str): 要执行的MySQL命令。
@@ -35,30 +185,135 @@ def executeSqlCommand(database, command, arg):
     返回:
         tuple: 查询结果和受影响的行数。
     """
-    connection = connect(database)
-
+    start = time.perf_counter()
+    status = "error"
     try:
-        with connection.cursor() as cursor:
-            cursor.execute(command, arg)
-            result = cursor.fetchall()
-
-        # 提交更改
-        connection.commit()
-
-        return result
-    except MySQLError as e:
-        logger.error(f"执行mysql命令时出错: {e}")
-        if connection:
-            connection.rollback()
-        raise
+        with getPool(database).connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(command, arg)
+                    result = cursor.fetchall()
+
+                # 提交更改
+                connection.commit()
+
+                status = "ok"
+                return result
+            except MySQLError as e:
+                logger.error(f"执行mysql命令时出错: {e}")
+                try:
+                    connection.rollback()
+                except MySQLError:
+                    pass
+                raise
     finally:
-        connection.close()
+        querySeconds.labels(database).observe(time.perf_counter() - start)
+        queryCounter.labels(database, status).inc()
+
+
+class IdentityKeyCache:
+    """
+    无人机身份密钥缓存，条目超过ttl秒后失效，命中与未命中次数可通过stats()获取
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._keys = {}  # 格式：{ "uav01": (agreeKey, 过期时间), ... }
+        self._lock = threading.Lock()
+
+    def get(self, clientName):
+        with self._lock:
+            entry = self._keys.get(clientName)
+            if entry is not None and entry[1] > time.time():
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, clientName, key):
+        with self._lock:
+            self._keys[clientName] = (key, time.time() + self.ttl)
+
+    def invalidate(self, clientName=None):
+        with self._lock:
+            if clientName is None:
+                self._keys.clear()
+            else:
+                self._keys.pop(clientName, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._keys),
+                    "hitRate": self.hits / total if total else 0.0}
+
+
+identityKeyCache = IdentityKeyCache(keyCacheTTL)
 
 
 def queryIdentityKey(clientName):
+    key = identityKeyCache.get(clientName)
+    if key is not None:
+        return key
+
+    loadConfig()
     result = executeSqlCommand(keyDatabase, "SELECT agreeKey FROM identityAuthTable WHERE clientName = %s",
                                (clientName,))
     if result:
+        identityKeyCache.put(clientName, result[0][0])
         return result[0][0]
     else:
         return None
+
+
+def prefetchIdentityKeys(clientNameList):
+    """
+    用一条IN (...)查询批量加载缓存中缺失或已过期的密钥，每架无人机只计一次命中或未命中
+    :param clientNameList: 无人机名称列表
+    :return: 字典，形如{"uav01": agreeKey, ...}，未查询到密钥的无人机不包含在内，
+             调用方不应再对这些无人机调用queryIdentityKey，否则同一次查询会被重复计为未命中
+    """
+    keys = {}
+    missing = []
+    for clientName in dict.fromkeys(clientNameList):
+        key = identityKeyCache.get(clientName)
+        if key is not None:
+            keys[clientName] = key
+        else:
+            missing.append(clientName)
+
+    if missing:
+        loadConfig()
+        placeholders = ", ".join(["%s"] * len(missing))
+        result = executeSqlCommand(keyDatabase,
+                                   f"SELECT clientName, agreeKey FROM identityAuthTable WHERE clientName IN ({placeholders})",
+                                   tuple(missing))
+        for clientName, key in result:
+            identityKeyCache.put(clientName, key)
+            keys[clientName] = key
+
+    return keys
+
+
+def invalidateIdentityKey(clientName=None):
+    """
+    使密钥缓存失效，密钥更新（重新认证）后必须调用；无人机回复解密失败或未查询到密钥时由flightControl调用
+    :param clientName: 无人机名称，None表示清空全部缓存
+    """
+    identityKeyCache.invalidate(clientName)
+
+
+metrics.counterFunc("identity_key_cache_lookups_total", "身份密钥缓存查询次数，result为hit/miss",
+                    lambda: {"hit": identityKeyCache.hits, "miss": identityKeyCache.misses}, ("result",))
+metrics.gauge("db_pool_connections", "连接池中的连接数，state为open（已建立）/idle（空闲）",
+              lambda: {(database, state): pool.stats()[key] for database, pool in list(pools.items())
+                       for state, key in (("open", "size"), ("idle", "idle"))}, ("database", "state"))
+
+
+def getStats():
+    return {
+        "identityKeyCache": identityKeyCache.stats(),
+        "pools": {database: pool.stats() for database, pool in pools.items()},
+    }
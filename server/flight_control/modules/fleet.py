@@ -0,0 +1,99 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from modules import logger
+
+executor = None
+g_deadline = 10
+_initLock = threading.Lock()
+
+
+def init(workers=64, deadline=10):
+    """
+    初始化机群指令分发线程池
+    :param workers: 线程池大小，即同时处理的无人机数量上限
+    :param deadline: 默认的单次请求截止时间（秒）
+    """
+    global executor, g_deadline
+
+    g_deadline = deadline
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fleet")
+    logger.info(f"机群指令分发服务初始化成功，线程数：{workers}")
+
+
+def _getExecutor():
+    global executor
+    if executor is None:
+        with _initLock:
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="fleet")
+    return executor
+
+
+class DeadlineExceeded(Exception):
+    """线程池排队超过截止时间，指令未发送"""
+
+
+def _timedCall(func, clientName, startTime, deadline):
+    dispatchTime = time.perf_counter()
+    if dispatchTime - startTime > deadline:
+        # 排队时已超过截止时间，fanOut已返回或即将返回timeout，不再发送
+        raise DeadlineExceeded()
+    result = func(clientName)
+    finishTime = time.perf_counter()
+    return result, dispatchTime - startTime, finishTime - startTime
+
+
+def fanOut(clientNameList, func, deadline=None):
+    """
+    将每架无人机的指令处理并行分发到线程池，按clientNameList的顺序返回结果
+    :param clientNameList: 无人机名称列表
+    :param func: 单架无人机的处理函数，形如func(clientName)，返回result字典
+    :param deadline: 本次请求的截止时间（秒），None使用默认值，超时未开始处理的无人机不再发送指令，返回timeout；
+                     已开始处理但未完成的无人机仍可能收到指令，返回pending
+    :return: result字典列表，每个result附带"timing"：{"startMs": 开始处理时刻, "finishMs": 指令入队时刻}，
+             均为相对分发开始的毫秒数
+    """
+    if deadline is None:
+        deadline = g_deadline
+
+    startTime = time.perf_counter()
+    pool = _getExecutor()
+    futures = [pool.submit(_timedCall, func, clientName, startTime, deadline) for clientName in clientNameList]
+    wait(futures, timeout=deadline)
+
+    resultList = []
+    finishOffsets = []
+    for clientName, future in zip(clientNameList, futures):
+        if not future.done():
+            # cancel()对已经开始执行的任务无效，这些无人机稍后仍会收到指令，不能报告为timeout
+            if future.cancel():
+                resultList.append({"clientName": clientName, "status": "timeout",
+                                   "msg": f"超过{deadline}秒未开始发送，指令未发送！", "time": time.time()})
+            else:
+                resultList.append({"clientName": clientName, "status": "pending",
+                                   "msg": f"超过{deadline}秒仍在发送，指令可能稍后送达！", "time": time.time()})
+            continue
+
+        try:
+            result, startOffset, finishOffset = future.result()
+        except DeadlineExceeded:
+            resultList.append({"clientName": clientName, "status": "timeout",
+                               "msg": f"超过{deadline}秒未开始发送，指令未发送！", "time": time.time()})
+            continue
+        except Exception as e:
+            logger.error(f"向{clientName}分发指令时发生异常: {e}")
+            resultList.append({"clientName": clientName, "status": "error", "msg": f"指令发送异常：{e}",
+                               "time": time.time()})
+            continue
+
+        result["timing"] = {"startMs": round(startOffset * 1000, 3), "finishMs": round(finishOffset * 1000, 3)}
+        finishOffsets.append(finishOffset)
+        resultList.append(result)
+
+    if finishOffsets:
+        skew = (max(finishOffsets) - min(finishOffsets)) * 1000
+        logger.info(f"机群指令分发完成：{len(finishOffsets)}/{len(clientNameList)}架，"
+                    f"总耗时{(time.perf_counter() - startTime) * 1000:.1f}ms，首末无人机时间差{skew:.1f}ms")
+
+    return resultList
@@ -1,17 +1,40 @@
 import json
-import random
-import queue
-import base64
 import threading
+from modules import ack
 from modules import logger
 from modules import message
 from modules import database
 from modules import sm4
+from modules import telemetry
+from modules import metrics
+from modules.ringbuffer import RingBuffer, DROP_OLDEST
+
+clientPool = {}  # 格式：{ "uav01": {"dataBuffer": RingBuffer, "exit": False}, ... }
+g_poolCapacity = 256
+g_dropPolicy = DROP_OLDEST
+# 无人机因密钥问题无法解密指令时回执中的错误码，收到后使该无人机的密钥缓存失效
+KEY_ERROR_CODES = ("decrypt", "noKey")
+# 没有错误码的旧版本无人机按错误信息判断
+KEY_ERROR_MSGS = ("解密控制指令失败！", "未查询到加密密钥！")
+
+metrics.gauge("client_pool_size", "各无人机缓存的数据包数",
+              lambda: {clientName: len(client["dataBuffer"]) for clientName, client in list(clientPool.items())},
+              ("clientName",))
+sm4Seconds = metrics.histogram("sm4_encrypt_seconds", "SM4加密指令的耗时（秒），mode为batch（整个机群）或single",
+                               ("mode",))
+sm4BatchSeconds = sm4Seconds.labels("batch")
+sm4SingleSeconds = sm4Seconds.labels("single")
+
+
+def init(poolCapacity=256, dropPolicy=DROP_OLDEST):
+    """
+    :param poolCapacity: 每架无人机缓存的数据包数量，超过后按dropPolicy丢弃
+    :param dropPolicy: DROP_OLDEST覆盖最旧的数据包，DROP_NEWEST在未被takeData取出的数据包已满时丢弃新到的数据包
+    """
+    global g_poolCapacity, g_dropPolicy
+    g_poolCapacity = poolCapacity
+    g_dropPolicy = dropPolicy
 
-clientPool = {}
-
-
-def init():
     # 启动消息接收线程
     threading.Thread(target=messageRecvService).start()
 
@@ -20,57 +43,126 @@ def init():
 
 def messageRecvService():
     while True:
-        messageBytes = message.recv()
-        messagePackage = json.loads(messageBytes.decode())
+        messagePackage = message.recv()
 
         clientName = messagePackage.get("clientName")
         dataType = messagePackage.get("dataType")
         dataPackage = messagePackage.get("dataPackage")
 
         if clientName not in clientPool:
-            clientPool[clientName] = {"dataQueue": queue.Queue(), "exit": False}
+            clientPool[clientName] = {"dataBuffer": RingBuffer(g_poolCapacity, g_dropPolicy), "exit": False}
             logger.info(f"{clientName}成功连接！")
 
-        dataQueue = clientPool.get(clientName).get('dataQueue')
-        dataQueue.put(dataPackage)
+        if dataType == "telemetry":
+            # 遥测数据单独存入每架无人机的环形缓冲区，供HTTP查询
+            telemetry.put(clientName, dataPackage)
+            continue
+        if dataType == "ack":
+            ack.resolve(clientName, dataPackage)
+            if isinstance(dataPackage, dict) and dataPackage.get("status") == "error" and (
+                    dataPackage.get("code") in KEY_ERROR_CODES or dataPackage.get("msg") in KEY_ERROR_MSGS):
+                # 无人机重新认证后密钥已更新，下一条指令重新查询数据库
+                database.invalidateIdentityKey(clientName)
+                logger.warning(f"{clientName}解密指令失败，已清除其密钥缓存")
+            continue
+
+        dataBuffer = clientPool.get(clientName).get('dataBuffer')
+        dataBuffer.append(dataPackage)
+
+
+def latestData(clientName):
+    """
+    :return: 该无人机最新的数据包，没有则返回None
+    """
+    client = clientPool.get(clientName)
+    entry = client["dataBuffer"].latest() if client else None
+    return entry[2] if entry else None
+
+
+def takeData(clientName, limit=None):
+    """
+    取出该无人机尚未取出的数据包，DROP_NEWEST策略下取出后缓冲区才能接收新的数据包
+    :return: [(序号, 接收时间, 数据包), ...]
+    """
+    client = clientPool.get(clientName)
+    return client["dataBuffer"].consume(limit) if client else []
+
+
+def dataSince(clientName, seq=0, limit=None):
+    """
+    :return: 该无人机序号大于等于seq的数据包，形如[(序号, 接收时间, 数据包), ...]
+    """
+    client = clientPool.get(clientName)
+    return client["dataBuffer"].since(seq, limit) if client else []
 
 
 def messageSend(clientName, dataType, data):
     sendData = {"dataType": dataType, "dataPackage": data}
-    print(f"[messageSend] 将发送给 {clientName} 的数据: {sendData}")
     message.send(clientName, sendData)
 
-def flightControl(clientName, flyCommand, isEncrypt, isPlan=False): #修改flightControl方法，添加isPlan参数
+
+def commandSend(clientName, dataType, dataPackage):
+    """
+    发送需要回执的指令：指令ID和发送时刻放在加密数据之外，无人机解密失败时也能回复
+    :return: ack.PendingCommand
+    """
+    command = ack.track(clientName)
+    dataPackage["commandId"] = command.commandId
+    dataPackage["sentAt"] = command.sentAt
+    messageSend(clientName, dataType, dataPackage)
+    return command
+
+
+def encryptForFleet(clientNameList, flyCommand, keys):
+    """
+    用每架无人机的密钥批量加密同一条指令
+    :param clientNameList: 无人机名称列表
+    :param flyCommand: 飞行控制指令
+    :param keys: 密钥字典，形如{"uav01": agreeKey, ...}，没有密钥的无人机不加密
+    :return: 密文字典，形如{"uav01": 密文字节串, ...}
+    """
+    clientNames = [clientName for clientName in clientNameList if keys.get(clientName)]
+    flyCommandBytes = json.dumps(flyCommand).encode()
+    with sm4BatchSeconds.time():
+        encryptedList = sm4.encrypt_batch([keys[clientName].encode() for clientName in clientNames], flyCommandBytes)
+    return dict(zip(clientNames, encryptedList))
+
+
+def flightControl(clientName, flyCommand, isEncrypt, isPlan=False, ciphertext=None, prefetched=False): #修改flightControl方法，添加isPlan参数
+    """
+    :param ciphertext: 可选，已用encryptForFleet加密好的密文，为None时查询密钥后单独加密
+    :param prefetched: 已用database.prefetchIdentityKeys预取过密钥时为True，此时ciphertext为None表示没有密钥，不再查询
+    :return: result字典，"commandId"为指令ID，无人机据此发回回执，"time"为发送时刻
+    """
     if isEncrypt:
-        key = database.queryIdentityKey(clientName)
-        if key:
-            flyCommandBytes = json.dumps(flyCommand).encode()
-            encryptedDataBytes = sm4.encrypt(key.encode(), flyCommandBytes)
-            encryptedData = base64.b64encode(encryptedDataBytes).decode()
-
-            flyCommand = {"data": encryptedData, "encrypt": True}
-            messageSend(clientName, "service", flyCommand)
-            result = {"clientName": clientName, "status": "success", "msg": "成功发送加密飞行控制指令！",
-                      "time": random.random()}
+        encryptedDataBytes = ciphertext
+        if encryptedDataBytes is None and not prefetched:
+            key = database.queryIdentityKey(clientName)
+            if key:
+                flyCommandBytes = json.dumps(flyCommand).encode()
+                with sm4SingleSeconds.time():
+                    encryptedDataBytes = sm4.encrypt(key.encode(), flyCommandBytes)
+        if encryptedDataBytes is not None:
+            # 密文以原始字节传给message，JSON编码时转为base64，二进制编码时直接发送
+            command = commandSend(clientName, "service", {"data": encryptedDataBytes, "encrypt": True})
+            result = {"clientName": clientName, "status": "success", "msg": "成功发送加密飞行控制指令！"}
         else:
             logger.error(f"未查询到{clientName}的密钥，已自动切换为未加密模式！")
 
-            flyCommand = {"data": flyCommand, "encrypt": False}
-            messageSend(clientName, "service", flyCommand)
-            result = {"clientName": clientName, "status": "error", "msg": "未查询到密钥，自动切换为未加密模式！",
-                      "time": random.random()}
+            command = commandSend(clientName, "service", {"data": flyCommand, "encrypt": False})
+            result = {"clientName": clientName, "status": "error", "msg": "未查询到密钥，自动切换为未加密模式！"}
     else:
         if isPlan:  #如果为任务规划任务
             flyCommand = {"data": flyCommand, "encrypt": False}
-            logger.info(f"已发送任务控制指令：{flyCommand}")
-            messageSend(clientName, "plan", flyCommand)
-            result = {"clientName": clientName, "status": "success", "msg": "执行成功！", "time": random.random()}
+            logger.info("已发送任务控制指令：%s", flyCommand)
+            command = commandSend(clientName, "plan", flyCommand)
+            result = {"clientName": clientName, "status": "success", "msg": "执行成功！"}
         else:
-            logger.info("成功到了飞机控制处")
-            flyCommand = {"data": flyCommand, "encrypt": False}
-            messageSend(clientName, "service", flyCommand)
-            logger.info("消息发送到了无人机端")
-            result = {"clientName": clientName, "status": "success", "msg": "执行成功！", "time": random.random()}
+            logger.debug("成功到了飞机控制处")
+            command = commandSend(clientName, "service", {"data": flyCommand, "encrypt": False})
+            logger.debug("消息发送到了无人机端")
+            result = {"clientName": clientName, "status": "success", "msg": "执行成功！"}
 
+    result["commandId"] = command.commandId
+    result["time"] = command.sentAt
     return result
-
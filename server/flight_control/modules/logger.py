@@ -1,12 +1,67 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from modules import metrics
 
 # 创建 logger
 logger = logging.getLogger()
+listener = None
+queueHandler = None
 
+_callSites = {}  # 限流和抽样的调用点状态，格式：{ (代码对象, 行号): [上次输出时间, 调用次数, 省略条数] }
+_callSitesLock = threading.Lock()
+g_suppressed = 0
 
-def init(logFileName, logLevel):
-    global logger
+
+metrics.gauge("log_queue_depth", "日志队列中等待写入的记录数", lambda: stats()["queued"])
+metrics.counterFunc("log_records_discarded_total", "未写入的日志数，reason为dropped（队列满）/suppressed（限流和抽样）",
+                    lambda: {"dropped": stats()["dropped"], "suppressed": stats()["suppressed"]}, ("reason",))
+
+
+_IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None))
+
+
+def _isImmutable(args):
+    if isinstance(args, tuple):
+        return all(isinstance(arg, _IMMUTABLE_TYPES) for arg in args)
+    return isinstance(args, _IMMUTABLE_TYPES)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    有界队列日志处理器：调用线程只把日志记录放入队列，格式化和写文件都在QueueListener的后台线程中完成，
+    队列满时丢弃新的日志并计数，调用线程不会因为磁盘慢而被阻塞
+    """
+
+    def __init__(self, capacity):
+        super().__init__(queue.Queue(capacity))
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 不可变的参数原样交给后台线程，由后台线程格式化；字典、列表等可能在记录日志后被调用线程修改，
+        # 此时在调用线程中先格式化，避免后台线程输出修改后的内容或遍历时出错
+        if record.args and not _isImmutable(record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def init(logFileName, logLevel, queueSize=10000, console=True):
+    """
+    :param queueSize: 日志队列容量，写入跟不上时超出的日志被丢弃
+    :param console: 是否同时输出到控制台（在后台线程中输出）
+    """
+    global logger, listener, queueHandler
 
     if logLevel == "info":
         logger.setLevel(logging.INFO)
@@ -26,33 +81,112 @@ def init(logFileName, logLevel):
     # 设置日志格式
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     handler.setFormatter(formatter)
-
-    # 添加 handler 到 logger
-    logger.addHandler(handler)
+    handlers = [handler]
+
+    if console:
+        # 与原来print的输出一致，只输出消息本身，debug级别不输出
+        consoleHandler = logging.StreamHandler(sys.stdout)
+        consoleHandler.setLevel(logging.INFO)
+        # pika等第三方库的日志只写入文件
+        consoleHandler.addFilter(lambda record: record.name == logger.name)
+        handlers.append(consoleHandler)
+
+    # 调用线程只入队，由listener线程写文件和控制台
+    queueHandler = BoundedQueueHandler(queueSize)
+    logger.addHandler(queueHandler)
+    listener = QueueListener(queueHandler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(shutdown)
 
     logger.info("日志模块初始化成功")
 
 
+def shutdown():
+    """
+    停止后台线程，退出前写完队列中的日志
+    """
+    global listener
+    if listener is None:
+        return
+    try:
+        listener.stop()
+    except queue.Full:
+        pass
+    listener = None
+
+
+def stats():
+    """
+    :return: 字典，包含队列中待写入的日志数、队列满时丢弃的日志数、被限流和抽样省略的日志数
+    """
+    return {
+        "queued": queueHandler.queue.qsize() if queueHandler else 0,
+        "dropped": queueHandler.dropped if queueHandler else 0,
+        "suppressed": g_suppressed,
+    }
+
+
+def _allow(every, sample):
+    """
+    按调用点限流和抽样
+    :param every: 同一调用点两次输出的最小间隔（秒）
+    :param sample: 同一调用点每sample次调用输出一次
+    :return: 允许输出时返回上次输出后被省略的条数，否则返回None
+    """
+    global g_suppressed
+    frame = sys._getframe(3)  # 调用方 -> info等 -> _log -> _allow
+    key = (frame.f_code, frame.f_lineno)
+    now = time.monotonic()
+    with _callSitesLock:
+        state = _callSites.get(key)
+        if state is None:
+            state = _callSites[key] = [float("-inf"), 0, 0]
+        state[1] += 1
+        if (sample and (state[1] - 1) % sample) or (every and now - state[0] < every):
+            state[2] += 1
+            g_suppressed += 1
+            return None
+        state[0] = now
+        suppressed, state[2] = state[2], 0
+        return suppressed
+
+
+def _log(level, message, args, every, sample):
+    if every is not None or sample is not None:
+        suppressed = _allow(every, sample)
+        if suppressed is None:
+            return
+        if suppressed:
+            if not args:
+                message = message.replace("%", "%%")
+            message += "（此前省略%d条）"
+            args += (suppressed,)
+    logger.log(level, message, *args)
+
+
 # 提供一些方便的函数
-def debug(message):
-    logger.debug(message)
+# message可以使用%格式的占位符，参数通过args传入，日志级别未开启时不会把参数转换为字符串；
+# 高频调用点可用every（最小间隔秒数）限流或sample（每N次输出一次）抽样
+def debug(message, *args, every=None, sample=None):
+    if logger.isEnabledFor(logging.DEBUG):
+        _log(logging.DEBUG, message, args, every, sample)
 
 
-def info(message):
-    print(message)
-    logger.info(message)
+def info(message, *args, every=None, sample=None):
+    if logger.isEnabledFor(logging.INFO):
+        _log(logging.INFO, message, args, every, sample)
 
 
-def warning(message):
-    print(message)
-    logger.warning(message)
+def warning(message, *args, every=None, sample=None):
+    if logger.isEnabledFor(logging.WARNING):
+        _log(logging.WARNING, message, args, every, sample)
 
 
-def error(message):
-    print(message)
-    logger.error(message)
+def error(message, *args, every=None, sample=None):
+    if logger.isEnabledFor(logging.ERROR):
+        _log(logging.ERROR, message, args, every, sample)
 
 
-def critical(message):
-    print(message)
-    logger.critical(message)
+def critical(message, *args, every=None, sample=None):
+    if logger.isEnabledFor(logging.CRITICAL):
+        _log(logging.CRITICAL, message, args, every, sample)
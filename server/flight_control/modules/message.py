@@ -1,21 +1,51 @@
 import threading
 import queue
-import json
 from modules.RabbitMQServer import RabbitMQServer
 from modules import logger
+from modules import codec
+from modules import metrics
 
 rabbitMQ = None
 g_messageQueue = queue.Queue()
 g_serviceType = ""
+clientCodecs = {}  # 各无人机声明支持的编码，格式：{ "uav01": "binary", ... }，未声明的使用JSON
 
+receivedCounter = metrics.counter("messages_received_total", "接收到的客户端消息数", ("dataType",))
+metrics.gauge("message_receive_queue_depth", "已接收、等待飞行控制服务处理的消息数",
+              lambda: g_messageQueue.qsize())
 
-def init(host, port, userName, password, serviceType):
+
+def _shardMetric(key):
+    # 各发送分片的统计，标签为分片序号；未初始化时不输出
+    def read():
+        if rabbitMQ is None:
+            return None
+        return {str(index): shard[key] for index, shard in enumerate(rabbitMQ.metrics()["shards"])}
+
+    return read
+
+
+metrics.gauge("rabbitmq_publish_queue_depth", "发送分片队列中等待发布的消息数",
+              _shardMetric("queueDepth"), ("shard",))
+metrics.gauge("rabbitmq_publish_in_flight", "已发布、等待Broker确认的消息数",
+              _shardMetric("inFlight"), ("shard",))
+metrics.counterFunc("rabbitmq_published_total", "发布的消息数", _shardMetric("published"), ("shard",))
+metrics.counterFunc("rabbitmq_confirmed_total", "Broker确认的消息数", _shardMetric("confirmed"), ("shard",))
+metrics.counterFunc("rabbitmq_nacked_total", "Broker拒收的消息数", _shardMetric("nacked"), ("shard",))
+metrics.counterFunc("rabbitmq_returned_total", "无人机队列未绑定、被Broker退回的消息数（含重发后成功投递的）",
+                    _shardMetric("returned"), ("shard",))
+metrics.counterFunc("rabbitmq_unroutable_total", "多次退回后丢弃的消息数", _shardMetric("unroutable"), ("shard",))
+metrics.counterFunc("rabbitmq_reconnects_total", "发送连接重连次数", _shardMetric("reconnects"), ("shard",))
+
+
+def init(host, port, userName, password, serviceType, publisherShards=4, publishBatchSize=100):
     global rabbitMQ, g_serviceType
 
     g_serviceType = serviceType
     # 连接到RabbitMQ服务器
     try:
-        rabbitMQ = RabbitMQServer(host=host, port=port, userName=userName, password=password, service_type=serviceType)
+        rabbitMQ = RabbitMQServer(host=host, port=port, userName=userName, password=password, service_type=serviceType,
+                                  shards=publisherShards, batch_size=publishBatchSize)
     except:
         logger.critical("连接RabbitMQ服务器失败")
         exit(0)
@@ -33,19 +63,39 @@ def send(clientName, data):
     :return: 无
     """
     data["serviceType"] = g_serviceType
-    dataBytes = json.dumps(data).encode()
+    codecName = clientCodecs.get(clientName, codec.JSON)
+    dataBytes = codec.encode(data, codecName)
 
-    print(f"[message.send] 编码后的消息: {dataBytes}")
-
-    rabbitMQ.send(clientName, dataBytes)
-    logger.info(f"向{clientName}发送消息：{data}")
+    rabbitMQ.send(clientName, dataBytes, codec.contentType(codecName))
+    logger.debug("向%s发送消息：%s", clientName, data)
 
 
 def recv():
+    """
+    :return: 解码后的客户端消息字典，形如{"clientName": ..., "dataType": ..., "dataPackage": ...}
+    """
     clientData = g_messageQueue.get()
     return clientData
 
 
 def messageReceiveCallBack(ch, method, properties, body):
-    g_messageQueue.put(body)
-    logger.info(f"接收到客户端消息：{body}")
+    try:
+        messagePackage = codec.decode(body, codec.codecOf(properties.content_type))
+    except Exception as e:
+        logger.error(f"解析客户端消息失败: {e}")
+        return
+
+    # 记录客户端声明的编码，之后发给该客户端的消息使用该编码
+    headers = properties.headers or {}
+    acceptCodec = headers.get(codec.ACCEPT_HEADER)
+    clientName = messagePackage.get("clientName")
+    if clientName and acceptCodec in codec.CONTENT_TYPES:
+        clientCodecs[clientName] = acceptCodec
+
+    g_messageQueue.put(messagePackage)
+    receivedCounter.labels(messagePackage.get("dataType")).inc()
+    if messagePackage.get("dataType") == "telemetry":
+        # 遥测消息每架无人机每秒数条，只抽样记录
+        logger.debug("接收到客户端遥测：%s", messagePackage, sample=100)
+    else:
+        logger.info("接收到客户端消息：%s", messagePackage)
@@ -0,0 +1,205 @@
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from modules import logger
+from modules import metrics
+
+g_cache = None
+
+planComputeSeconds = metrics.histogram("mission_plan_compute_seconds", "缓存未命中时任务规划的计算耗时（秒）")
+metrics.counterFunc("mission_plan_cache_requests_total", "任务规划缓存查询次数，result为memory/disk/miss",
+                    lambda: {"memory": g_cache.hits, "disk": g_cache.diskHits,
+                             "miss": g_cache.misses} if g_cache else None, ("result",))
+
+
+def planKey(area, clientNameList, params, version):
+    """
+    规划结果的内容地址：区域、无人机列表（顺序影响分配）、规划参数和规划器版本的SHA-256
+    """
+    content = json.dumps({"area": area, "clients": clientNameList, "params": params, "version": version},
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class MissionCache:
+    """
+    两级任务规划缓存：内存中的LRU + SQLite磁盘表。
+    相同区域、机群和参数的规划直接返回缓存结果，磁盘中的结果在服务器重启后仍然有效；
+    同时记录每架无人机最近一次规划的planId，mission_start未指定planId时使用。
+    同一planId同时只计算一次，并发的相同请求等待正在进行的计算；磁盘表最多保留maxRows条规划。
+    """
+
+    def __init__(self, path, capacity=64, maxRows=1000):
+        self.capacity = capacity
+        self.maxRows = maxRows
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.computeMs = 0.0  # 未命中时规划耗时的累计值
+
+        self._memory = collections.OrderedDict()  # 格式：{ planId: {"waypoints": {...}, "stats": {...}, "area": [...]} }
+        self._computing = {}  # 正在计算的规划，格式：{ planId: Future }
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS plans (planId TEXT PRIMARY KEY, createdAt REAL, plan TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS clientPlans (clientName TEXT PRIMARY KEY, planId TEXT)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS plansCreatedAt ON plans (createdAt)")
+
+    def _remember(self, planId, plan):
+        self._memory[planId] = plan
+        self._memory.move_to_end(planId)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def get(self, planId, record=True):
+        """
+        :param record: 是否计入命中率统计，执行任务时读取航点不计入
+        :return: {"waypoints": {...}, "stats": {...}}，不存在时返回None
+        """
+        with self._lock:
+            plan = self._memory.get(planId)
+            if plan is not None:
+                self._memory.move_to_end(planId)
+                self.hits += record
+                return plan
+            row = self._db.execute("SELECT plan FROM plans WHERE planId = ?", (planId,)).fetchone()
+            if row is None:
+                return None
+            plan = json.loads(row[0])
+            self._remember(planId, plan)
+            self.diskHits += record
+            return plan
+
+    def put(self, planId, plan):
+        with self._lock:
+            self._remember(planId, plan)
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO plans VALUES (?, ?, ?)",
+                                 (planId, time.time(), json.dumps(plan)))
+                # 只保留最近的maxRows条规划，被删除的规划再次请求时重新计算
+                self._db.execute("DELETE FROM plans WHERE planId IN "
+                                 "(SELECT planId FROM plans ORDER BY createdAt DESC LIMIT -1 OFFSET ?)",
+                                 (self.maxRows,))
+
+    def compute(self, planId, planner):
+        """
+        读取缓存，未命中时调用planner计算并写入缓存；其他线程正在计算同一planId时等待其结果
+        :param planner: 无参数函数，返回{"waypoints": {...}, "stats": {...}, "area": [...]}
+        :return: (规划, 是否命中缓存)
+        """
+        plan = self.get(planId)
+        if plan is not None:
+            return plan, True
+
+        with self._lock:
+            # get之后其他线程可能已经算完
+            plan = self._memory.get(planId)
+            if plan is not None:
+                self.hits += 1
+                return plan, True
+            future = self._computing.get(planId)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._computing[planId] = future
+            else:
+                self.hits += 1
+        if not owner:
+            return future.result(), True
+
+        try:
+            start = time.perf_counter()
+            plan = planner()
+            seconds = time.perf_counter() - start
+            planComputeSeconds.observe(seconds)
+            self.put(planId, plan)
+            with self._lock:
+                self.misses += 1
+                self.computeMs += seconds * 1000
+            future.set_result(plan)
+            return plan, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._computing[planId]
+
+    def assign(self, planId, clientNameList):
+        """记录这些无人机最近一次规划的planId"""
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO clientPlans VALUES (?, ?)",
+                                 [(clientName, planId) for clientName in clientNameList])
+
+    def planOf(self, clientName):
+        with self._lock:
+            row = self._db.execute("SELECT planId FROM clientPlans WHERE clientName = ?", (clientName,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.diskHits + self.misses
+            return {
+                "hits": self.hits,
+                "diskHits": self.diskHits,
+                "misses": self.misses,
+                "hitRate": (self.hits + self.diskHits) / lookups if lookups else 0.0,
+                "size": len(self._memory),
+                "computeMs": self.computeMs,
+            }
+
+
+def init(path="mission_cache.db", capacity=64, maxRows=1000):
+    """
+    :param path: SQLite数据库文件路径
+    :param capacity: 内存中缓存的规划数
+    :param maxRows: 磁盘中保留的规划数，超过后删除最早的规划
+    """
+    global g_cache
+    g_cache = MissionCache(path, capacity, maxRows)
+    logger.info(f"任务规划缓存初始化成功，内存容量{capacity}，磁盘缓存{path}，最多保留{maxRows}条")
+
+
+def plan(area, clientNameList, params, planner, version=0):
+    """
+    查询缓存，未命中时调用planner规划并写入缓存，并发的相同请求只规划一次
+    :param planner: 形如planner(area, clientNameList, **params)，返回(waypoint_dict, stats)
+    :param version: 规划器版本，规划算法改变后旧的缓存自动失效
+    :return: (planId, {"waypoints": {...}, "stats": {...}, "area": [...]}, 是否命中缓存)
+    """
+    planId = planKey(area, clientNameList, params, version)
+
+    def compute():
+        waypoint_dict, stats = planner(area, clientNameList, **params)
+        return {"waypoints": waypoint_dict, "stats": stats, "area": area}
+
+    cached, hit = g_cache.compute(planId, compute)
+    g_cache.assign(planId, clientNameList)
+
+    cacheStats = g_cache.stats()
+    logger.info(f"任务规划{planId[:12]}{'命中缓存' if hit else '重新计算'}，"
+                f"规划耗时{cached['stats'].get('computeMs', 0):.1f}ms，缓存命中率{cacheStats['hitRate']:.1%}")
+    return planId, cached, hit
+
+
+def waypointsFor(clientName, planId=None):
+    """
+    :param planId: 任务规划编号，None表示该无人机最近一次的规划
+    :return: 该无人机的航点列表，没有规划时返回None
+    """
+    planId = planId or g_cache.planOf(clientName)
+    if planId is None:
+        return None
+    cached = g_cache.get(planId, record=False)
+    if cached is None:
+        return None
+    return cached["waypoints"].get(clientName)
+
+
+def getStats():
+    return g_cache.stats()
@@ -1,59 +1,392 @@
-import matplotlib.pyplot as plt
+import io
+import math
+import time
+import numpy as np
 
+PLANNER_VERSION = 1  # 规划算法或输出格式改变时加1，使旧的缓存结果失效
+EARTH_RADIUS = 6378137.0  # WGS84长半轴（米）
+MIN_TRACK_SPACING = 5  # 最小航线间距（米）
 
+DEFAULT_FOOTPRINT = 40  # 默认相机地面覆盖宽度（米，垂直于航线方向）
+DEFAULT_SIDELAP = 0.2  # 默认旁向重叠率
+DEFAULT_ALTITUDE = 30
+DEFAULT_ALTITUDE_STEP = 5  # 相邻无人机的高度差（米），避免起降和转场时相撞
 
-import math
 
-def generate_mission_plan(area, clientNameList):
-    num_uav = len(clientNameList)
-    total_sections = 2 * num_uav  # 每架无人机两块区域
+def to_local(lats, lons, lat0, lon0):
+    """经纬度转换为以(lat0, lon0)为原点的局部平面坐标（米，x向东，y向北），适用于数公里范围内的区域"""
+    x = np.radians(np.asarray(lons, dtype=float) - lon0) * EARTH_RADIUS * math.cos(math.radians(lat0))
+    y = np.radians(np.asarray(lats, dtype=float) - lat0) * EARTH_RADIUS
+    return x, y
 
-    waypoint_dict = {}
 
-    # 区域边界
-    lat_min = min(p["lat"] for p in area)
-    lat_max = max(p["lat"] for p in area)
-    lon_min = min(p["lon"] for p in area)
-    lon_max = max(p["lon"] for p in area)
+def to_geo(x, y, lat0, lon0):
+    lats = lat0 + np.degrees(np.asarray(y) / EARTH_RADIUS)
+    lons = lon0 + np.degrees(np.asarray(x) / (EARTH_RADIUS * math.cos(math.radians(lat0))))
+    return lats, lons
+
+
+def longest_edge_angle(polygon):
+    """
+    :param polygon: (N, 2)的局部平面坐标
+    :return: 最长边的方向角（弧度），沿最长边扫描通常转弯次数最少
+    """
+    edges = np.roll(polygon, -1, axis=0) - polygon
+    longest = edges[np.argmax(np.hypot(edges[:, 0], edges[:, 1]))]
+    return math.atan2(longest[1], longest[0])
+
+
+def sweep_tracks(polygon, spacing, angle):
+    """
+    计算覆盖多边形的往复（牛耕式）航线
+    :param polygon: (N, 2)的局部平面坐标，顶点按顺序排列，可以是凹多边形
+    :param spacing: 航线间距（米）
+    :param angle: 航线方向（弧度）
+    :return: (M, 2, 2)的航线段数组，按飞行顺序排列，每段为[起点, 终点]
+    """
+    c, s = math.cos(angle), math.sin(angle)
+    rotation = np.array([[c, -s], [s, c]])
+    # 旋转到航线方向与x轴平行，扫描线为y=常数
+    rotated = polygon @ rotation
+    yMin, yMax = rotated[:, 1].min(), rotated[:, 1].max()
+    ys = np.arange(yMin + spacing / 2, yMax, spacing)
+    if ys.size == 0:
+        ys = np.array([(yMin + yMax) / 2])
+
+    # 所有扫描线与所有边同时求交，边按半开区间[y0, y1)计算，避免扫描线经过顶点时重复计数
+    x0, y0 = rotated[:, 0], rotated[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    Y = ys[:, None]
+    crossing = ((y0 <= Y) & (Y < y1)) | ((y1 <= Y) & (Y < y0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xs = x0 + (Y - y0) * (x1 - x0) / (y1 - y0)
+    xs = np.sort(np.where(crossing, xs, np.nan), axis=1)
+
+    # 按奇偶规则两两配对，凹多边形的一条扫描线上可能有多段
+    pairs = int(crossing.sum(axis=1).max()) // 2
+    if pairs == 0:
+        return np.empty((0, 2, 2))
+    starts = xs[:, 0:2 * pairs:2]
+    ends = xs[:, 1:2 * pairs:2]
+    lines = np.broadcast_to(np.arange(ys.size)[:, None], starts.shape)
+    valid = ~np.isnan(ends) & (ends - starts > 1e-6)
+    starts, ends, lines = starts[valid], ends[valid], lines[valid]
+
+    # 往复排序：每条扫描线从离上一条航线终点较近的一端开始，凹多边形的缺口处不会产生长距离转场
+    order = np.lexsort((starts, lines))
+    starts, ends, lines = starts[order], ends[order], lines[order]
+    bounds = np.flatnonzero(np.diff(lines)) + 1
+    reverse = np.zeros(starts.size, dtype=bool)
+    position = starts[0]
+    for first, last in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [starts.size]))):
+        if abs(ends[last - 1] - position) < abs(starts[first] - position):
+            reverse[first:last] = True
+            position = starts[first]
+        else:
+            position = ends[last - 1]
+    order = np.lexsort((np.where(reverse, -starts, starts), lines))
+    starts, ends, lines, reverse = starts[order], ends[order], lines[order], reverse[order]
+    fromX = np.where(reverse, ends, starts)
+    toX = np.where(reverse, starts, ends)
+
+    segments = np.empty((starts.size, 2, 2))
+    segments[:, 0, 0] = fromX
+    segments[:, 1, 0] = toX
+    segments[:, :, 1] = ys[lines][:, None]
+    return segments @ rotation.T
+
+
+def split_by_length(points, weights, count):
+    """
+    把折线按加权长度等分成count段
+    :param points: (P, 2)的折线顶点
+    :param weights: (P-1,)的每段权重，航线为1，航线之间的转场为0
+    :return: 每段折线的顶点数组列表
+    """
+    lengths = np.hypot(*np.diff(points, axis=0).T) * weights
+    cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+    cuts = cumulative[-1] * np.arange(count + 1) / count
+
+    index = np.clip(np.searchsorted(cumulative, cuts, side="right") - 1, 0, len(points) - 2)
+    span = cumulative[index + 1] - cumulative[index]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(span > 0, (cuts - cumulative[index]) / span, 0.0)
+    fraction[-1] = 1.0
+    cutPoints = points[index] + fraction[:, None] * (points[index + 1] - points[index])
+
+    parts = []
+    for k in range(count):
+        part = np.vstack((cutPoints[k], points[index[k] + 1:index[k + 1] + 1], cutPoints[k + 1]))
+        # 去掉切分点与顶点重合产生的重复点
+        keep = np.concatenate(([True], np.hypot(*np.diff(part, axis=0).T) > 1e-6))
+        parts.append(part[keep])
+    return parts
+
+
+def densify(points, spacing):
+    """按不超过spacing米的间隔在折线上插入航点"""
+    if len(points) < 2 or not spacing:
+        return points
+    deltas = np.diff(points, axis=0)
+    counts = np.maximum(1, np.ceil(np.hypot(*deltas.T) / spacing).astype(int))
+    segment = np.repeat(np.arange(len(deltas)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    t = offsets / np.repeat(counts, counts)
+    return np.vstack((points[segment] + t[:, None] * deltas[segment], points[-1:]))
+
+
+def collinear_mask(points, angle_tolerance=1e-6):
+    """
+    标记可以合并的共线点：前后两段方向完全相同（夹角小于angle_tolerance弧度）的中间点
+    :param points: (N, 3)的局部坐标
+    :return: 保留的点为True的布尔数组
+    """
+    keep = np.ones(len(points), dtype=bool)
+    if len(points) < 3:
+        return keep
+    deltas = np.diff(points, axis=0)
+    norms = np.linalg.norm(deltas, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        directions = deltas / norms[:, None]
+    before, after = directions[:-1], directions[1:]
+    sine = np.linalg.norm(np.cross(before, after), axis=1)
+    cosine = np.einsum("ij,ij->i", before, after)
+    # 重复点（长度为0的段）同样可以去掉；折返（cosine<0）必须保留
+    keep[1:-1] = ~(((sine < angle_tolerance) & (cosine > 0)) | (norms[:-1] == 0) | (norms[1:] == 0))
+    return keep
+
+
+def segment_distances(points, start, end):
+    """points中每个点到线段start-end的距离"""
+    direction = end - start
+    length2 = direction @ direction
+    if length2 == 0:
+        return np.linalg.norm(points - start, axis=1)
+    t = np.clip((points - start) @ direction / length2, 0, 1)
+    return np.linalg.norm(points - (start + t[:, None] * direction), axis=1)
+
+
+def douglas_peucker_mask(points, tolerance):
+    """
+    Douglas-Peucker简化，用显式栈代替递归，每段内的距离计算向量化
+    :return: 保留的点为True的布尔数组
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = segment_distances(points[first + 1:last], points[first], points[last])
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+def max_deviation(points, keep):
+    """原始折线上每个点到简化后折线对应线段的最大距离（米）"""
+    kept = np.flatnonzero(keep)
+    if len(kept) < 2:
+        return 0.0
+    # 原始点i位于简化后第segment段上，该段的端点是kept[segment]和kept[segment + 1]
+    segment = np.clip(np.searchsorted(kept, np.arange(len(points)), side="right") - 1, 0, len(kept) - 2)
+    start, end = points[kept[segment]], points[kept[segment + 1]]
+    direction = end - start
+    length2 = np.einsum("ij,ij->i", direction, direction)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(length2 > 0, np.einsum("ij,ij->i", points - start, direction) / length2, 0.0)
+    nearest = start + np.clip(t, 0, 1)[:, None] * direction
+    return float(np.linalg.norm(points - nearest, axis=1).max())
+
+
+def simplify_waypoints(waypoints, tolerance):
+    """
+    航点简化：先合并共线点，再在局部东北天坐标系中按米为单位的容差做Douglas-Peucker简化，
+    保留的航点原样返回（不重新投影），首尾航点总是保留
+    :param waypoints: 航点列表，形如[{"lat": ..., "lon": ..., "alt": ...}, ...]
+    :param tolerance: 允许的最大偏差（米）
+    :return: (简化后的航点列表, {"before": ..., "after": ..., "removed": ..., "maxDeviation": ..., "computeMs": ...})
+    """
+    start = time.perf_counter()
+    if len(waypoints) < 3:
+        return list(waypoints), {"before": len(waypoints), "after": len(waypoints), "removed": 0,
+                                 "maxDeviation": 0.0, "computeMs": 0.0}
+
+    lats = np.array([wp["lat"] for wp in waypoints], dtype=float)
+    lons = np.array([wp["lon"] for wp in waypoints], dtype=float)
+    alts = np.array([wp.get("alt", 0) for wp in waypoints], dtype=float)
+    x, y = to_local(lats, lons, lats[0], lons[0])
+    points = np.column_stack((x, y, alts))
 
-    # 步长（经度划分）
-    lat_step = (lat_max - lat_min) / 2 if lat_max != lat_min else 0.0001
-    lon_step = (lon_max - lon_min) / total_sections if lon_max != lon_min else 0.0001
+    keep = collinear_mask(points)
+    candidates = np.flatnonzero(keep)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[candidates[douglas_peucker_mask(points[candidates], tolerance)]] = True
 
-    # 计算该纬度下经度单位距离（米）
-    center_lat_rad = math.radians((lat_min + lat_max) / 2)
-    meters_per_lon = 111320 * math.cos(center_lat_rad)
+    result = [waypoints[i] for i in np.flatnonzero(keep)]
+    stats = {
+        "before": len(waypoints),
+        "after": len(result),
+        "removed": len(waypoints) - len(result),
+        "maxDeviation": max_deviation(points, keep),
+        "computeMs": (time.perf_counter() - start) * 1000,
+    }
+    return result, stats
 
-    # 实际间距（米）
-    actual_spacing_meters = lon_step * meters_per_lon
-    if actual_spacing_meters < 5:
-        raise ValueError(f"航线间距为 {actual_spacing_meters:.2f} 米，低于最小要求的 5 米。请减少无人机数量或扩大区域。")
 
-    for idx, clientName in enumerate(clientNameList):
-        start_center_idx = 2 * (idx + 1) - 1
-        end_center_idx = start_center_idx - 1
+def plan_coverage(area, clientNameList, footprint=DEFAULT_FOOTPRINT, sidelap=DEFAULT_SIDELAP, angle=None,
+                  waypoint_spacing=None, altitude=DEFAULT_ALTITUDE, altitude_step=DEFAULT_ALTITUDE_STEP):
+    """
+    多边形区域覆盖规划：按相机覆盖宽度和旁向重叠率生成裁剪到多边形内的往复航线，
+    再把整条航线按航线长度均分给各无人机
+    :param area: 多边形顶点列表，形如[{"lat": ..., "lon": ...}, ...]
+    :param clientNameList: 无人机名称列表
+    :param footprint: 相机地面覆盖宽度（米）
+    :param sidelap: 旁向重叠率，0~1
+    :param angle: 航线方向（度，正东为0，逆时针），None表示沿多边形最长边
+    :param waypoint_spacing: 航线上的航点间隔（米），None表示只保留转弯点
+    :param altitude: 第一架无人机的飞行高度
+    :param altitude_step: 相邻无人机的高度差
+    :return: (waypoint_dict, stats)，waypoint_dict形如{"uav01": [{"lat": ..., "lon": ..., "alt": ...}, ...], ...}
+    """
+    start = time.perf_counter()
+    if len(area) < 3:
+        raise ValueError("area 至少应包含三个点")
+    if not clientNameList:
+        raise ValueError("clientNameList 不能为空")
+    if not 0 <= sidelap < 1:
+        raise ValueError(f"旁向重叠率 {sidelap} 超出范围，应在0~1之间")
+
+    spacing = footprint * (1 - sidelap)
+    if spacing < MIN_TRACK_SPACING:
+        raise ValueError(f"航线间距为 {spacing:.2f} 米，低于最小要求的 {MIN_TRACK_SPACING} 米。请增大相机覆盖宽度或减小重叠率。")
+
+    lats = np.array([p["lat"] for p in area], dtype=float)
+    lons = np.array([p["lon"] for p in area], dtype=float)
+    lat0, lon0 = lats.mean(), lons.mean()
+    polygon = np.column_stack(to_local(lats, lons, lat0, lon0))
 
-        start_lon = lon_min + (start_center_idx + 0.5) * lon_step
-        end_lon = lon_min + (end_center_idx + 0.5) * lon_step
-        alt = 30 + idx * 5
+    sweepAngle = math.radians(angle) if angle is not None else longest_edge_angle(polygon)
+    segments = sweep_tracks(polygon, spacing, sweepAngle)
+    if len(segments) == 0:
+        raise ValueError("区域面积过小，无法生成航线")
 
-        waypoints = [
-            {"lat": lat_min, "lon": start_lon, "alt": alt},
-            {"lat": lat_max, "lon": start_lon, "alt": alt},
-            {"lat": lat_max, "lon": end_lon,   "alt": alt},
-            {"lat": lat_min, "lon": end_lon,   "alt": alt},
-        ]
+    # 首尾相连成一条折线，偶数段为航线、奇数段为转场，只按航线长度分配
+    points = segments.reshape(-1, 2)
+    weights = np.zeros(len(points) - 1)
+    weights[0::2] = 1.0
+    parts = split_by_length(points, weights, len(clientNameList))
 
-        waypoint_dict[clientName] = waypoints
+    waypoint_dict = {}
+    lengths = []
+    for idx, (clientName, part) in enumerate(zip(clientNameList, parts)):
+        lengths.append(float(np.hypot(*np.diff(part, axis=0).T).sum()))
+        part = densify(part, waypoint_spacing)
+        partLats, partLons = to_geo(part[:, 0], part[:, 1], lat0, lon0)
+        alt = altitude + idx * altitude_step
+        waypoint_dict[clientName] = [{"lat": lat, "lon": lon, "alt": alt}
+                                     for lat, lon in zip(partLats.tolist(), partLons.tolist())]
+
+    stats = {
+        "tracks": len(segments),
+        "spacing": spacing,
+        "angle": math.degrees(sweepAngle),
+        "trackLength": float(np.hypot(*(segments[:, 1] - segments[:, 0]).T).sum()),
+        "minLength": min(lengths),
+        "maxLength": max(lengths),
+        "waypoints": sum(len(w) for w in waypoint_dict.values()),
+        "computeMs": (time.perf_counter() - start) * 1000,
+    }
+    return waypoint_dict, stats
 
+
+def generate_mission_plan(area, clientNameList, **params):
+    """
+    :param params: 可选的规划参数，见plan_coverage
+    :return: 形如{"uav01": [{"lat": ..., "lon": ..., "alt": ...}, ...], ...}
+    """
+    waypoint_dict, _ = plan_coverage(area, clientNameList, **params)
     return waypoint_dict
 
 
+MAX_LEGEND_ENTRIES = 20  # 无人机数量超过该值时不绘制图例和起终点文字
+
+
+def render_track(waypoint_dict, area=None, fmt="png", dpi=100):
+    """
+    在后台（Agg）绘制各无人机的航线和规划区域，不依赖图形界面，可在服务线程中调用
+    :param waypoint_dict: 形如{"uav01": [{"lat": ..., "lon": ...}, ...], ...}
+    :param area: 规划区域的顶点列表，None表示不绘制边界
+    :param fmt: "png"或"svg"
+    :return: 图片的字节串
+    """
+    # 只在第一次绘图时加载matplotlib，且不使用pyplot，避免拖慢服务器启动和切换全局后端
+    from matplotlib import colormaps
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+
+    figure = Figure(figsize=(8, 6), dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+
+    lons_all, lats_all = [], []
+    if area:
+        border_lats = [p["lat"] for p in area] + [area[0]["lat"]]
+        border_lons = [p["lon"] for p in area] + [area[0]["lon"]]
+        axes.plot(border_lons, border_lats, 'k--', label="Defined Area")
+        lons_all += border_lons
+        lats_all += border_lats
+
+    tracks = [(uav, np.array([[p["lon"], p["lat"]] for p in points])) for uav, points in waypoint_dict.items()
+              if points]
+    few = len(tracks) <= MAX_LEGEND_ENTRIES
+    # 无人机较少时使用区分度高的离散颜色，较多时使用连续色带
+    colormap = colormaps["tab20" if few else "viridis"]
+    colors = [colormap(i) if few else colormap(i / max(1, len(tracks) - 1)) for i in range(len(tracks))]
+
+    # 用LineCollection一次绘制所有航线，上百架无人机时比逐条plot快得多
+    axes.add_collection(LineCollection([track for _, track in tracks], colors=colors, linewidths=1))
+    if tracks:
+        starts = np.array([track[0] for _, track in tracks])
+        ends = np.array([track[-1] for _, track in tracks])
+        axes.scatter(starts[:, 0], starts[:, 1], c='green', s=12, marker='o', zorder=3, label="Start")
+        axes.scatter(ends[:, 0], ends[:, 1], c='red', s=12, marker='s', zorder=3, label="End")
+        allPoints = np.vstack([track for _, track in tracks])
+        lons_all += allPoints[:, 0].tolist()
+        lats_all += allPoints[:, 1].tolist()
+
+    if few:
+        for (uav, track), color in zip(tracks, colors):
+            axes.plot([], [], color=color, label=uav)
+            axes.text(track[0][0], track[0][1], f"{uav} Start", fontsize=8, color='green')
+            axes.text(track[-1][0], track[-1][1], f"{uav} End", fontsize=8, color='red')
+        axes.legend(fontsize=8)
+
+    if lons_all:
+        margin = 0.0003
+        axes.set_xlim(min(lons_all) - margin, max(lons_all) + margin)
+        axes.set_ylim(min(lats_all) - margin, max(lats_all) + margin)
+
+    axes.set_xlabel("Longitude")
+    axes.set_ylabel("Latitude")
+    axes.set_title(f"UAV Flight Tracks in Specified Area ({len(tracks)} UAVs)")
+    axes.grid(True)
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=fmt)
+    return buffer.getvalue()
 
 
 def draw_track(waypoints: dict, flyCommand: dict):
     """
-    绘制 UAV 路径，并根据 flyCommand 中的 area 绘制边界框。
+    绘制 UAV 路径，并根据 flyCommand 中的 area 绘制边界框，在窗口中显示（仅用于本地调试）。
 
     参数:
         waypoints: dict, 每架 UAV 的飞行轨迹
@@ -62,36 +395,14 @@ def draw_track(waypoints: dict, flyCommand: dict):
         raise ValueError("flyCommand 中缺少 'area' 字段")
 
     area_corners = flyCommand["area"]
-    if len(area_corners) < 4:
-        raise ValueError("area 至少应包含四个点")
+    if len(area_corners) < 3:
+        raise ValueError("area 至少应包含三个点")
 
-    plt.figure(figsize=(8, 6))
+    import matplotlib.pyplot as plt
+    import matplotlib.image as mpimg
 
-    #绘制边界框
-    border_lats = [p["lat"] for p in area_corners] + [area_corners[0]["lat"]]
-    border_lons = [p["lon"] for p in area_corners] + [area_corners[0]["lon"]]
-    plt.plot(border_lons, border_lats, 'k--', label="Defined Area")
-
-    # 绘制 UAV 路径
-    for uav, points in waypoints.items():
-        lats = [p["lat"] for p in points]
-        lons = [p["lon"] for p in points]
-        plt.plot(lons, lats, marker='o', label=uav)
-        plt.text(lons[0], lats[0], f"{uav} Start", fontsize=9, color='green')
-        plt.text(lons[-1], lats[-1], f"{uav} End", fontsize=9, color='red')
-
-    # 自动设定边界视图
-    lats_all = [p["lat"] for p in area_corners]
-    lons_all = [p["lon"] for p in area_corners]
-    margin = 0.0003
-    plt.xlim(min(lons_all) - margin, max(lons_all) + margin)
-    plt.ylim(min(lats_all) - margin, max(lats_all) + margin)
-
-    plt.xlabel("Longitude")
-    plt.ylabel("Latitude")
-    plt.title("UAV Flight Tracks in Specified Area")
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
+    image = mpimg.imread(io.BytesIO(render_track(waypoints, area_corners, "png")), format="png")
+    plt.figure(figsize=(8, 6))
+    plt.imshow(image)
+    plt.axis("off")
     plt.show()
-
@@ -0,0 +1,68 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from modules import logger
+from modules import mission_cache
+
+CONTENT_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+g_capacity = 32
+executor = None
+_images = collections.OrderedDict()  # 格式：{ (planId, 格式): 图片字节串 }
+_rendering = {}  # 格式：{ (planId, 格式): Future }，同一张图同时只渲染一次
+_lock = threading.Lock()
+
+
+def init(capacity=32):
+    """
+    :param capacity: 内存中缓存的图片数
+    """
+    global g_capacity, executor
+    g_capacity = capacity
+    # matplotlib不是线程安全的，所有渲染在同一个后台线程中排队执行，不占用HTTP请求线程
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+    logger.info(f"航线渲染服务初始化成功，缓存{capacity}张图片")
+
+
+def _render(key):
+    from modules.mission_plan import render_track
+    planId, fmt = key
+    try:
+        plan = mission_cache.g_cache.get(planId, record=False)
+        if plan is None:
+            raise KeyError(f"任务规划{planId}不存在")
+        start = time.perf_counter()
+        image = render_track(plan["waypoints"], plan.get("area"), fmt)
+        logger.info(f"任务规划{planId[:12]}渲染完成（{fmt}，{len(image)}字节），"
+                    f"耗时{(time.perf_counter() - start) * 1000:.0f}ms")
+        with _lock:
+            _images[key] = image
+            while len(_images) > g_capacity:
+                _images.popitem(last=False)
+        return image
+    finally:
+        with _lock:
+            _rendering.pop(key, None)
+
+
+def submit(planId, fmt="png"):
+    """
+    提交渲染任务，已缓存或正在渲染的图片不会重复渲染
+    :return: Future，结果为图片字节串；规划不存在时抛出KeyError
+    """
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"不支持的图片格式: {fmt}")
+    key = (planId, fmt)
+    with _lock:
+        image = _images.get(key)
+        if image is not None:
+            _images.move_to_end(key)
+            future = Future()
+            future.set_result(image)
+            return future
+        future = _rendering.get(key)
+        if future is None:
+            future = executor.submit(_render, key)
+            _rendering[key] = future
+        return future
@@ -0,0 +1,108 @@
+import threading
+import time
+
+DROP_OLDEST = "oldest"  # 缓冲区满时覆盖最旧的数据
+DROP_NEWEST = "newest"  # 缓冲区中未读取的数据已满时丢弃新到的数据，consume读取后腾出空间
+
+
+class RingBuffer:
+    """
+    固定容量的环形缓冲区，内存占用不随运行时间增长。
+    每条数据分配一个递增的序号，支持O(1)读取最新数据和按序号读取区间。
+    latest和since只查看数据；consume按读取位置依次取出数据，取出的数据不再计入DROP_NEWEST的容量。
+    """
+
+    def __init__(self, capacity, dropPolicy=DROP_OLDEST):
+        if capacity <= 0:
+            raise ValueError("环形缓冲区容量必须大于0")
+        if dropPolicy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"未知的丢弃策略: {dropPolicy}")
+
+        self.capacity = capacity
+        self.dropPolicy = dropPolicy
+        self.dropped = 0
+
+        self._slots = [None] * capacity  # 格式：(序号, 接收时间, 数据)
+        self._nextSeq = 0
+        self._readSeq = 0  # consume的读取位置，小于该序号的数据已被取出
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._nextSeq, self.capacity)
+
+    @property
+    def nextSeq(self):
+        """下一条数据的序号，读取方可将其作为下次since的参数"""
+        return self._nextSeq
+
+    @property
+    def unread(self):
+        """未被consume取出的数据条数"""
+        return self._nextSeq - max(self._readSeq, self.firstSeq)
+
+    @property
+    def firstSeq(self):
+        """缓冲区中最旧数据的序号"""
+        return max(0, self._nextSeq - self.capacity)
+
+    def append(self, item, timestamp=None):
+        """
+        写入一条数据
+        :return: 数据的序号；未读取的数据已满且丢弃策略为DROP_NEWEST时返回None
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            if self.dropPolicy == DROP_NEWEST:
+                if self._nextSeq - self._readSeq >= self.capacity:
+                    self.dropped += 1
+                    return None
+            elif self._nextSeq >= self.capacity:
+                self.dropped += 1
+            seq = self._nextSeq
+            self._slots[seq % self.capacity] = (seq, timestamp, item)
+            self._nextSeq = seq + 1
+            return seq
+
+    def latest(self):
+        """
+        :return: (序号, 接收时间, 数据)，缓冲区为空时返回None
+        """
+        with self._lock:
+            if self._nextSeq == 0:
+                return None
+            return self._slots[(self._nextSeq - 1) % self.capacity]
+
+    def since(self, seq=0, limit=None):
+        """
+        读取序号大于等于seq的数据，已被覆盖的数据不再返回
+        :param seq: 起始序号
+        :param limit: 最多返回的条数，None表示不限制
+        :return: [(序号, 接收时间, 数据), ...]，按序号递增
+        """
+        with self._lock:
+            start = max(seq, self.firstSeq)
+            end = self._nextSeq
+            if limit is not None:
+                end = min(end, start + limit)
+            return [self._slots[s % self.capacity] for s in range(start, end)]
+
+    def consume(self, limit=None):
+        """
+        按读取位置取出尚未取出的数据，已被覆盖的数据跳过
+        :param limit: 最多取出的条数，None表示全部
+        :return: [(序号, 接收时间, 数据), ...]，按序号递增
+        """
+        with self._lock:
+            start = max(self._readSeq, self.firstSeq)
+            end = self._nextSeq
+            if limit is not None:
+                end = min(end, start + limit)
+            self._readSeq = end
+            return [self._slots[s % self.capacity] for s in range(start, end)]
+
+    def clear(self):
+        with self._lock:
+            self._slots = [None] * self.capacity
+            self._nextSeq = 0
+            self._readSeq = 0
@@ -0,0 +1,88 @@
+"""
+启动耗时统计：记录启动各阶段（导入模块、读取配置、连接Broker、绑定HTTP端口等）的开始时间和耗时，
+以及从进程启动到处理第一条指令的时间，启动完成后输出报告。
+本模块应在其他模块之前导入，导入时刻作为启动时刻。
+"""
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+g_bootTime = time.perf_counter()
+g_phases = []  # 格式：[(阶段名, 相对启动时刻的开始时间, 耗时), ...]，单位秒
+g_firstCommand = None  # 处理第一条指令时相对启动时刻的时间（秒）
+_lock = threading.Lock()
+
+
+def elapsed():
+    """
+    :return: 从启动到现在经过的时间（秒）
+    """
+    return time.perf_counter() - g_bootTime
+
+
+def record(name, start, end=None):
+    """
+    记录一个阶段
+    :param start: 阶段开始时的time.perf_counter()
+    :param end: 阶段结束时的time.perf_counter()，为空表示现在
+    """
+    end = time.perf_counter() if end is None else end
+    with _lock:
+        g_phases.append((name, start - g_bootTime, end - start))
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start)
+
+
+def firstCommand():
+    """
+    处理指令时调用，只记录第一次
+    :return: 是否为第一条指令
+    """
+    global g_firstCommand
+    if g_firstCommand is not None:
+        return False
+    with _lock:
+        if g_firstCommand is not None:
+            return False
+        g_firstCommand = elapsed()
+    return True
+
+
+def warmUp(moduleNames):
+    """
+    启动完成后在后台线程中预先导入较重的模块，不阻塞启动，也避免第一次使用时才导入
+    :param moduleNames: 模块名列表
+    """
+    def load():
+        for moduleName in moduleNames:
+            with phase(f"warm up {moduleName}"):
+                importlib.import_module(moduleName)
+
+    thread = threading.Thread(target=load, name="warm-up")
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def report():
+    """
+    :return: 启动报告文本，按开始时间排序
+    """
+    with _lock:
+        phases = sorted(g_phases, key=lambda p: p[1])
+        firstCommandTime = g_firstCommand
+    width = max([len(name) for name, _, _ in phases] + [10])
+    lines = [f"{'phase':<{width}} {'start(ms)':>10} {'time(ms)':>9}"]
+    for name, start, seconds in phases:
+        lines.append(f"{name:<{width}} {start * 1000:>10.1f} {seconds * 1000:>9.1f}")
+    if firstCommandTime is not None:
+        lines.append(f"{'first command':<{width}} {firstCommandTime * 1000:>10.1f}")
+    return "\n".join(lines)
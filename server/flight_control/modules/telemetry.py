@@ -0,0 +1,59 @@
+import threading
+from modules import logger
+from modules.ringbuffer import RingBuffer
+
+telemetryPool = {}  # 格式：{ "uav01": RingBuffer, ... }
+g_bufferSize = 600
+_poolLock = threading.Lock()
+
+
+def init(bufferSize=600):
+    """
+    :param bufferSize: 每架无人机保留的遥测帧数
+    """
+    global g_bufferSize
+    g_bufferSize = bufferSize
+    logger.info(f"遥测服务初始化成功，每架无人机缓存{bufferSize}帧")
+
+
+def put(clientName, dataPackage):
+    buffer = telemetryPool.get(clientName)
+    if buffer is None:
+        with _poolLock:
+            buffer = telemetryPool.setdefault(clientName, RingBuffer(g_bufferSize))
+    buffer.append(dataPackage)
+
+
+def _frame(entry):
+    seq, recvTime, data = entry
+    return {"seq": seq, "recvTime": recvTime, "data": data}
+
+
+def latest(clientName=None):
+    """
+    :param clientName: 无人机名称，None表示所有无人机
+    :return: 单架无人机的最新一帧，或形如{"uav01": 最新一帧, ...}的字典
+    """
+    if clientName is not None:
+        buffer = telemetryPool.get(clientName)
+        entry = buffer.latest() if buffer else None
+        return _frame(entry) if entry else None
+
+    result = {}
+    for name, buffer in list(telemetryPool.items()):
+        entry = buffer.latest()
+        if entry:
+            result[name] = _frame(entry)
+    return result
+
+
+def since(clientName, seq=0, limit=None):
+    """
+    :return: {"frames": [...], "nextSeq": 下次查询使用的序号}
+    """
+    buffer = telemetryPool.get(clientName)
+    if buffer is None:
+        return {"frames": [], "nextSeq": 0}
+    entries = buffer.since(seq, limit)
+    nextSeq = entries[-1][0] + 1 if entries else max(seq, buffer.firstSeq)
+    return {"frames": [_frame(entry) for entry in entries], "nextSeq": nextSeq}
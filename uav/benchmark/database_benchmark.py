@@ -0,0 +1,159 @@
+"""
+无人机端数据库测试：对比原来的DataBase（一个连接、所有线程共享一个游标、回滚日志）
+与线程安全的DataBase（每线程一个连接、WAL、身份密钥内存缓存），统计：
+1. 多线程并发查询各自无人机的密钥时，查到其他无人机密钥或查询出错的次数
+   （原来的实现可能直接使解释器崩溃，因此在子进程中运行）；
+2. 单线程查询密钥的耗时（checkAndDecryptPackage每条加密指令查询一次）；
+3. 更新密钥（信任启动写入）的耗时，以及更新后查询是否立即返回新密钥；
+4. 另一个进程写入数据库后，缓存是否失效。
+
+用法（在uav目录下执行）：
+    python benchmark/database_benchmark.py
+    python benchmark/database_benchmark.py --threads 8 --lookups 20000
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.DataBase import DataBase  # noqa: E402
+
+
+class LegacyDataBase:
+    """原来的DataBase：所有线程共享一个游标，execute和fetchone之间可能被其他线程打断"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._cursor = self._conn.cursor()
+
+    def queryIdentityKey(self, clientName):
+        self._cursor.execute("SELECT agreeKey FROM identityAuthTable WHERE clientName = ?", (clientName,))
+        result = self._cursor.fetchone()
+        if result:
+            return result[0]
+        else:
+            return None
+
+    def updateAgreeKeyAndAuthTime(self, clientName, agreeKey, authTime):
+        self._cursor.execute("UPDATE identityAuthTable SET agreeKey = ?, authTime = ? WHERE clientName = ?",
+                             (agreeKey, authTime, clientName))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def keyOf(clientName, version=0):
+    return f"{clientName}-{version}".ljust(32, "k")
+
+
+def populate(path, clients):
+    database = DataBase(path)
+    for clientName in clients:
+        database.insertIdentityAuthTable(clientName, keyOf(clientName), str(time.time()))
+    database.close()
+
+
+def concurrentLookups(database, clients, lookups):
+    """
+    每个线程反复查询自己无人机的密钥
+    :return: (查到其他无人机密钥的次数, 异常次数, 总耗时秒)
+    """
+    wrong, errors = [0], [0]
+
+    def worker(clientName):
+        for _ in range(lookups):
+            try:
+                if database.queryIdentityKey(clientName) != keyOf(clientName):
+                    wrong[0] += 1
+            except Exception:
+                errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(clientName,)) for clientName in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return wrong[0], errors[0], time.perf_counter() - start
+
+
+def legacyLookups(path, clients, lookups, results):
+    results.put(concurrentLookups(LegacyDataBase(path), clients, lookups))
+
+
+def timeIt(func, count):
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无人机端数据库测试")
+    parser.add_argument("--threads", type=int, default=4, help="并发查询的线程数")
+    parser.add_argument("--lookups", type=int, default=5000, help="每个线程的查询次数")
+    parser.add_argument("--updates", type=int, default=200, help="更新密钥的次数")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    clients = [f"uav{i:02d}" for i in range(args.threads)]
+    legacyPath = os.path.join(directory, "legacy.db")
+    newPath = os.path.join(directory, "uav.db")
+    populate(legacyPath, clients)
+    populate(newPath, clients)
+    # 原来的数据库使用默认的回滚日志
+    with sqlite3.connect(legacyPath) as conn:
+        conn.execute("PRAGMA journal_mode=DELETE")
+
+    legacy = LegacyDataBase(legacyPath)
+    database = DataBase(newPath)
+
+    print(f"1. {args.threads}个线程并发查询各自的密钥，每个线程{args.lookups}次")
+    print(f"{'mode':>10} {'wrong key':>10} {'errors':>8} {'lookups/s':>10}")
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=legacyLookups, args=(legacyPath, clients, args.lookups, results))
+    process.start()
+    process.join()
+    if process.exitcode == 0:
+        wrong, errors, seconds = results.get()
+        print(f"{'legacy':>10} {wrong:>10} {errors:>8} {args.threads * args.lookups / seconds:>10.0f}")
+    else:
+        print(f"{'legacy':>10} 进程异常退出，退出码{process.exitcode}")
+    wrong, errors, seconds = concurrentLookups(database, clients, args.lookups)
+    print(f"{'new':>10} {wrong:>10} {errors:>8} {args.threads * args.lookups / seconds:>10.0f}")
+
+    print("\n2. 单线程查询密钥的耗时（us）")
+    clientName = clients[0]
+    print(f"{'legacy':>10} {timeIt(lambda i: legacy.queryIdentityKey(clientName), args.lookups):>8.2f}")
+    print(f"{'new':>10} {timeIt(lambda i: database.queryIdentityKey(clientName), args.lookups):>8.2f}  "
+          f"{database.cacheStats()}")
+
+    print("\n3. 更新密钥的耗时（us），以及更新后立即查询的结果")
+    legacyUs = timeIt(lambda i: legacy.updateAgreeKeyAndAuthTime(clientName, keyOf(clientName, i), "0"),
+                      args.updates)
+    newUs = timeIt(lambda i: database.updateAgreeKeyAndAuthTime(clientName, keyOf(clientName, i), "0"),
+                   args.updates)
+    fresh = database.queryIdentityKey(clientName) == keyOf(clientName, args.updates - 1)
+    print(f"{'legacy':>10} {legacyUs:>8.1f}")
+    print(f"{'new':>10} {newUs:>8.1f}  更新后查询到新密钥: {fresh}")
+
+    print("\n4. 另一个连接（模拟信任启动进程）写入后查询")
+    with sqlite3.connect(newPath) as conn:
+        conn.execute("UPDATE identityAuthTable SET agreeKey = ? WHERE clientName = ?", (keyOf(clientName, -1),
+                                                                                       clientName))
+    fresh = database.queryIdentityKey(clientName) == keyOf(clientName, -1)
+    print(f"{'new':>10} 查询到新密钥: {fresh}")
+
+    legacy.close()
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+飞行流程测试：UAV通过配置的连接字符串连接模拟自驾仪（UDP或pty），走完整的UAV初始化流程，
+每轮依次执行起飞、上传航点任务、执行任务并等待任务完成（返航降落），统计：
+1. 起飞检测：arm_and_takeoff返回时刻与模拟自驾仪到达目标高度（误差0.5米内）时刻之差，以及起飞总耗时；
+2. 任务上传：upload_mission的耗时和重传次数；
+3. 任务完成检测：wait_mission_complete返回时刻与模拟自驾仪任务结束时刻之差。
+检测延迟主要取决于数据流频率（UAV按位置和MISSION_CURRENT消息判断），丢包时还可能因命令丢失而失败。
+
+用法（在uav目录下执行）：
+    python benchmark/flight_benchmark.py
+    python benchmark/flight_benchmark.py --rates 4,10 --loss 0,0.02 --delay 0.02 --trials 5
+    python benchmark/flight_benchmark.py --device pty
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.UAV import UAV  # noqa: E402
+from sim_autopilot import SimAutopilot  # noqa: E402
+from mission_upload_benchmark import makeWaypoints  # noqa: E402
+
+
+def trial(uav, autopilot, altitude, waypoints):
+    """
+    :return: {"takeoffDetect": 秒, "takeoff": 秒, "upload": 秒, "retransmits": 次数, "completeDetect": 秒}，
+             失败的步骤为None
+    """
+    result = dict.fromkeys(("takeoffDetect", "takeoff", "upload", "retransmits", "completeDetect"))
+    start = time.time()
+    if not uav.arm_and_takeoff(altitude):
+        return result
+    detected = time.time()
+    reached = autopilot.eventTime("takeoff altitude", start)
+    result["takeoff"] = detected - start
+    result["takeoffDetect"] = detected - reached if reached else None
+
+    if not uav.upload_mission(waypoints, return_to_launch=True, force=True):
+        return result
+    result["upload"] = uav.lastUploadStats["seconds"]
+    result["retransmits"] = uav.lastUploadStats["retransmits"]
+
+    start = time.time()
+    if not uav.execute_mission(takeoff_altitude=altitude, cancel=None) or not uav.wait_mission_complete():
+        return result
+    detected = time.time()
+    completed = autopilot.eventTime("mission complete", start)
+    result["completeDetect"] = detected - completed if completed else None
+    return result
+
+
+def runScenario(args, rate, loss, port):
+    device = "pty" if args.device == "pty" else f"udpin:127.0.0.1:{port}"
+    autopilot = SimAutopilot(device, loss=loss, delay=args.delay, seed=1, climbRate=args.climb_rate,
+                             descentRate=args.climb_rate, speed=args.speed, landDisarmDelay=0.2)
+    autopilot.start()
+    waypoints = makeWaypoints(args.items)
+    results = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.time()
+        uav = UAV(rate, jumpTrustStart=True, controlDevice=autopilot.clientDevice,
+                  dataDevice=autopilot.clientDevice)
+        connectSeconds = time.time() - start
+        for _ in range(args.trials):
+            results.append(trial(uav, autopilot, args.altitude, waypoints))
+    autopilot.stop()
+    uav.controlHub.stop()
+    if uav.dataHub is not uav.controlHub:
+        uav.dataHub.stop()
+    return connectSeconds, results
+
+
+def summary(values, scale=1000):
+    values = [v * scale for v in values if v is not None]
+    if not values:
+        return f"{'-':>8} {'-':>8}"
+    return f"{statistics.median(values):>8.0f} {max(values):>8.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="飞行流程测试")
+    parser.add_argument("--device", default="udp", choices=("udp", "pty"), help="连接模拟自驾仪的方式")
+    parser.add_argument("--rates", default="4,10", help="数据流频率列表（Hz），逗号分隔")
+    parser.add_argument("--loss", default="0,0.02", help="丢包率列表，逗号分隔")
+    parser.add_argument("--delay", type=float, default=0.01, help="模拟自驾仪每条消息的延迟（秒）")
+    parser.add_argument("--trials", type=int, default=3, help="每种场景的轮数")
+    parser.add_argument("--items", type=int, default=20, help="航点数")
+    parser.add_argument("--altitude", type=float, default=5, help="起飞高度（米）")
+    parser.add_argument("--climb-rate", type=float, default=5, help="模拟自驾仪的爬升和降落速率（米/秒）")
+    parser.add_argument("--speed", type=float, default=20, help="模拟自驾仪的水平速度（米/秒）")
+    parser.add_argument("--port", type=int, default=14570, help="第一个场景使用的UDP端口")
+    args = parser.parse_args()
+
+    rates = [int(r) for r in args.rates.split(",")]
+    losses = [float(x) for x in args.loss.split(",")]
+    print(f"连接方式{args.device}，延迟{args.delay * 1000:.0f}ms，每种场景{args.trials}轮，{args.items}个航点，单位毫秒")
+    print(f"{'rate':>5} {'loss':>5} {'connect':>8} | {'takeoff detect':>17} {'takeoff':>8} | "
+          f"{'upload':>17} {'retx':>5} | {'complete detect':>17} | failed")
+    print(f"{'':>5} {'':>5} {'':>8} | {'p50':>8} {'max':>8} {'p50':>8} | {'p50':>8} {'max':>8} {'sum':>5} | "
+          f"{'p50':>8} {'max':>8} |")
+    port = args.port
+    for rate in rates:
+        for loss in losses:
+            connectSeconds, results = runScenario(args, rate, loss, port)
+            port += 1
+            failed = sum(1 for r in results if r["completeDetect"] is None)
+            takeoff = [r["takeoff"] for r in results if r["takeoff"] is not None]
+            print(f"{rate:>5} {loss:>5.2f} {connectSeconds * 1000:>8.0f} | "
+                  f"{summary([r['takeoffDetect'] for r in results])} "
+                  f"{statistics.median(takeoff) * 1000 if takeoff else float('nan'):>8.0f} | "
+                  f"{summary([r['upload'] for r in results])} "
+                  f"{sum(r['retransmits'] or 0 for r in results):>5} | "
+                  f"{summary([r['completeDetect'] for r in results])} | {failed}")
+
+
+if __name__ == "__main__":
+    main()
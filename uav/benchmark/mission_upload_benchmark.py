@@ -0,0 +1,124 @@
+"""
+航点任务上传测试：在模拟自驾仪上统计不同任务规模、丢包率、延迟下的上传耗时和重传次数，
+并与原来的上传流程（先清除任务并固定等待1秒，再逐项无超时等待MISSION_REQUEST）对比
+
+用法（在uav目录下执行）：
+    python benchmark/mission_upload_benchmark.py
+    python benchmark/mission_upload_benchmark.py --items 500 --loss 0,0.05,0.1 --delay 0.02 --order random
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymavlink import mavutil  # noqa: E402
+from modules.MavlinkHub import MavlinkHub  # noqa: E402
+from modules.UAV import UAV  # noqa: E402
+from sim_autopilot import SimAutopilot  # noqa: E402
+
+LEGACY_TIMEOUT = 20  # 原流程没有超时，超过该时间视为卡死
+
+
+def connect(port):
+    """不经过UAV.__init__（需要串口），只建立控制连接和控制消息中心"""
+    uav = UAV.__new__(UAV)
+    uav.controlMavlink = mavutil.mavlink_connection(f"udpout:127.0.0.1:{port}")
+    uav.controlHub = MavlinkHub(uav.controlMavlink, name="control")
+    uav.controlHub.start()
+    uav.uploadedMissionHash = None
+    uav.lastUploadStats = None
+    # udpout需要先发送一条消息，模拟自驾仪才知道回复地址
+    uav.controlMavlink.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS, mavutil.mavlink.MAV_AUTOPILOT_INVALID,
+                                          0, 0, 0)
+    if uav.controlHub.wait('HEARTBEAT', timeout=5) is None:
+        raise RuntimeError("未收到模拟自驾仪的心跳")
+    return uav
+
+
+def legacyUpload(uav, waypoints):
+    """原来的上传流程，用于对比"""
+    items = uav.build_mission_items(waypoints, return_to_launch=True)
+    uav.controlMavlink.mav.mission_clear_all_send(uav.controlMavlink.target_system,
+                                                  uav.controlMavlink.target_component)
+    time.sleep(1)
+    deadline = time.time() + LEGACY_TIMEOUT
+    with uav.controlHub.subscribe(['MISSION_REQUEST', 'MISSION_REQUEST_INT', 'MISSION_ACK']) as sub:
+        uav.controlMavlink.mav.mission_count_send(uav.controlMavlink.target_system,
+                                                  uav.controlMavlink.target_component, len(items))
+        for i, item in enumerate(items):
+            while True:
+                msg = sub.get(timeout=max(0.0, deadline - time.time()))
+                if msg is None:
+                    return False
+                if msg.get_type() != 'MISSION_ACK':
+                    break
+            uav.send_mission_item(i, item)
+        while True:
+            msg = sub.get(timeout=max(0.0, deadline - time.time()))
+            if msg is None:
+                return False
+            if msg.get_type() == 'MISSION_ACK':
+                return True
+
+
+def makeWaypoints(count):
+    return [{"lat": 30.57 + i * 1e-5, "lon": 104.06 + (i % 2) * 1e-4, "alt": 30} for i in range(count)]
+
+
+def verify(autopilot, waypoints):
+    """检查模拟自驾仪上的任务与上传的航点一致（第一项为起飞点，最后一项为返航点）"""
+    mission = autopilot.mission
+    return len(mission) == len(waypoints) + 2 and all(
+        item.x == int(wp["lat"] * 1e7) and item.y == int(wp["lon"] * 1e7) for item, wp in zip(mission[1:], waypoints))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="航点任务上传测试")
+    parser.add_argument("--items", default="50,200,500", help="航点数，逗号分隔")
+    parser.add_argument("--loss", default="0,0.02,0.05", help="丢包率，逗号分隔")
+    parser.add_argument("--delay", type=float, default=0.005, help="模拟自驾仪每条回复的延迟（秒）")
+    parser.add_argument("--order", default="sequential", choices=["sequential", "random"], help="自驾仪请求航点的顺序")
+    parser.add_argument("--request-type", default="MISSION_REQUEST_INT",
+                        choices=["MISSION_REQUEST", "MISSION_REQUEST_INT"], help="自驾仪请求航点使用的消息")
+    parser.add_argument("--port", type=int, default=14560, help="模拟自驾仪监听的UDP端口")
+    parser.add_argument("--no-legacy", action="store_true", help="不测试原上传流程")
+    args = parser.parse_args()
+
+    autopilot = SimAutopilot(f"udpin:127.0.0.1:{args.port}", delay=args.delay, order=args.order,
+                             requestType=args.request_type, seed=1)
+    autopilot.start()
+    uav = connect(args.port)
+
+    print(f"模拟自驾仪：回复延迟{args.delay * 1000:.1f}ms，请求顺序{args.order}，请求消息{args.request_type}")
+    print(f"{'items':>6} {'loss':>6} {'upload(s)':>10} {'retrans':>8} {'ok':>4} {'re-upload(s)':>13} "
+          f"{'legacy(s)':>10}")
+    for count in [int(c) for c in args.items.split(",")]:
+        waypoints = makeWaypoints(count)
+        for loss in [float(l) for l in args.loss.split(",")]:
+            autopilot.loss = loss
+            ok = uav.upload_mission(waypoints, return_to_launch=True, force=True) and verify(autopilot, waypoints)
+            stats = uav.lastUploadStats or {}
+            seconds = stats.get("seconds", float("nan")) if ok else float("nan")
+            retransmits = stats.get("retransmits", 0) if ok else 0
+
+            # 相同任务再次上传，应直接跳过
+            start = time.perf_counter()
+            uav.upload_mission(waypoints, return_to_launch=True)
+            reupload = time.perf_counter() - start
+
+            legacy = "-"
+            if not args.no_legacy:
+                start = time.perf_counter()
+                legacy = f"{time.perf_counter() - start:.2f}" if legacyUpload(uav, waypoints) else "hang"
+                time.sleep(0.5)  # 等待模拟自驾仪结束未完成的上传
+            print(f"{count:>6} {loss:>6.2f} {seconds:>10.2f} {retransmits:>8} {str(ok):>4} {reupload:>13.4f} "
+                  f"{legacy:>10}")
+
+    autopilot.stop()
+    uav.controlHub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+指令抢占测试：在模拟自驾仪上执行长时间操作（上传航点任务、执行任务时等待GPS、等待任务完成），
+在操作进行中随机时刻提交降落指令，统计从降落指令提交到模拟自驾仪收到MAV_CMD_NAV_LAND的耗时。
+
+原来的接收线程依次执行指令，降落指令要等到当前操作结束（等待任务完成最长10分钟）才会执行；
+现在由executor抢占，耗时上限约为MavlinkHub.CANCEL_POLL_INTERVAL。
+为了不在每次测试中等待真实的降落过程，BenchUAV.land只发送降落命令，与UAV.land的第一步相同。
+
+用法（在uav目录下执行）：
+    python benchmark/preemption_benchmark.py
+    python benchmark/preemption_benchmark.py --trials 30 --port 14561
+"""
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymavlink import mavutil  # noqa: E402
+from modules.MavlinkHub import MavlinkHub, CANCEL_POLL_INTERVAL  # noqa: E402
+from modules.SetpointStreamer import SetpointStreamer  # noqa: E402
+from modules.UAV import UAV  # noqa: E402
+from flight_control import executor  # noqa: E402
+from flight_control import flightControl  # noqa: E402
+from flight_control import logger  # noqa: E402
+from sim_autopilot import SimAutopilot  # noqa: E402
+from mission_upload_benchmark import makeWaypoints  # noqa: E402
+
+
+class BenchUAV(UAV):
+    def land(self):
+        self.controlMavlink.mav.command_long_send(self.controlMavlink.target_system,
+                                                  self.controlMavlink.target_component,
+                                                  mavutil.mavlink.MAV_CMD_NAV_LAND, 0, 0, 0, 0, 0, 0, 0, 0)
+        return True
+
+
+def connect(port):
+    """不经过UAV.__init__（需要串口），控制和数据共用一个消息中心"""
+    uav = BenchUAV.__new__(BenchUAV)
+    uav.controlMavlink = mavutil.mavlink_connection(f"udpout:127.0.0.1:{port}")
+    uav.controlHub = MavlinkHub(uav.controlMavlink, name="control")
+    uav.controlHub.start()
+    uav.dataHub = uav.controlHub
+    uav.setpoints = SetpointStreamer(uav.controlMavlink)
+    uav.inAir = False
+    uav.uploadedMissionHash = None
+    uav.lastUploadStats = None
+    uav.controlMavlink.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS, mavutil.mavlink.MAV_AUTOPILOT_INVALID,
+                                          0, 0, 0)
+    if uav.controlHub.wait('HEARTBEAT', timeout=5) is None:
+        raise RuntimeError("未收到模拟自驾仪的心跳")
+    return uav
+
+
+class Ack:
+    """记录回执的阶段和结果，代替flightControl.CommandAck"""
+
+    def __init__(self):
+        self.commandId = None
+        self.name = "unknown"
+        self.status = None
+        self.done = threading.Event()
+
+    def dispatched(self):
+        pass
+
+    def completed(self, status="success", msg=""):
+        self.status = status
+        self.done.set()
+
+
+def landLatency(autopilot, scenario, minDelay, maxDelay):
+    """
+    提交长时间操作，随机等待后提交降落指令
+    :return: (降落命令到达自驾仪的耗时（秒）, 被抢占指令的结果)
+    """
+    operation = Ack()
+    executor.submit(scenario[0], executor.MISSION, scenario[1], operation)
+    time.sleep(random.uniform(minDelay, maxDelay))
+    if operation.done.is_set():
+        return None, operation.status
+
+    seen = len(autopilot.commands)
+    land = Ack()
+    start = time.time()
+    flightControl.submitFlightControl({"specialInstruction": "land"}, land)
+    land.done.wait(5)
+    operation.done.wait(5)
+    for received, command in autopilot.commands[seen:]:
+        if command == mavutil.mavlink.MAV_CMD_NAV_LAND:
+            return received - start, operation.status
+    return float("nan"), operation.status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指令抢占测试")
+    parser.add_argument("--trials", type=int, default=20, help="每种场景的测试次数")
+    parser.add_argument("--items", type=int, default=300, help="上传场景的航点数")
+    parser.add_argument("--delay", type=float, default=0.005, help="模拟自驾仪每条回复的延迟（秒）")
+    parser.add_argument("--port", type=int, default=14561, help="模拟自驾仪监听的UDP端口")
+    args = parser.parse_args()
+
+    autopilot = SimAutopilot(f"udpin:127.0.0.1:{args.port}", delay=args.delay, seed=1)
+    autopilot.start()
+    uav = connect(args.port)
+    flightControl.g_uav = uav
+
+    waypoints = makeWaypoints(args.items)
+    smallMission = makeWaypoints(5)
+    # 模拟自驾仪不发送GPS和MISSION_CURRENT，执行任务停在等待GPS处，等待任务完成一直等待
+    scenarios = [
+        ("upload", lambda cancel: uav.upload_mission(waypoints, force=True, cancel=cancel), 0.05, 0.5),
+        ("gps wait", lambda cancel: flightControl.runMission(smallMission, cancel), 0.2, 0.5),
+        ("mission wait", lambda cancel: uav.wait_mission_complete(cancel), 0.05, 0.5),
+    ]
+
+    logPath = os.path.join(tempfile.mkdtemp(), "preemption.log")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        logger.init(logPath, "info")
+        executor.init()
+        rows = []
+        for name, func, minDelay, maxDelay in scenarios:
+            latencies, statuses = [], {}
+            for _ in range(args.trials):
+                latency, status = landLatency(autopilot, (name, func), minDelay, maxDelay)
+                statuses[status] = statuses.get(status, 0) + 1
+                if latency is not None:
+                    latencies.append(latency * 1000)
+            rows.append((name, latencies, statuses))
+
+    print(f"模拟自驾仪回复延迟{args.delay * 1000:.1f}ms，CANCEL_POLL_INTERVAL={CANCEL_POLL_INTERVAL * 1000:.0f}ms，"
+          f"每种场景{args.trials}次，单位毫秒")
+    print(f"{'scenario':>14} {'p50':>8} {'max':>8}  被抢占操作的结果")
+    for name, latencies, statuses in rows:
+        p50 = statistics.median(latencies) if latencies else float("nan")
+        worst = max(latencies) if latencies else float("nan")
+        print(f"{name:>14} {p50:>8.1f} {worst:>8.1f}  {statuses}")
+    print(f"执行统计: {executor.stats()}")
+
+    autopilot.stop()
+    uav.controlHub.stop()
+
+
+if __name__ == "__main__":
+    main()
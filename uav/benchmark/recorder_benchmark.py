@@ -0,0 +1,170 @@
+"""
+飞行记录器测试：模拟一次飞行的MAVLink数据流（RAW_IMU和ATTITUDE各50Hz、GLOBAL_POSITION_INT 10Hz、HEARTBEAT 1Hz），统计：
+1. 每条记录在MAVLink读线程中的写入耗时，与原来的方式（getSensorsData组装字典、写一行文本日志）对比；
+2. 飞行结束后读取全部数据的耗时：readFlight + select，对比逐行解析文本日志；
+3. 分段切换：用很小的分段强制多次切换，检查是否丢失记录、seq是否连续
+   （后台线程来不及分配下一个分段时丢弃记录，16MB的分段按实际数据流约需40分钟写满，写到一半即开始分配）；
+4. 掉电：复制一个分段，模拟同步之后写了一半的记录和未落盘的页，检查读取结果。
+
+用法（在uav目录下执行）：
+    python benchmark/recorder_benchmark.py
+    python benchmark/recorder_benchmark.py --minutes 30
+"""
+import argparse
+import ast
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymavlink.dialects.v20 import ardupilotmega as mavlink  # noqa: E402
+from modules import FlightRecorder as fr  # noqa: E402
+
+# (消息类型, 频率Hz)
+STREAMS = [("RAW_IMU", 50), ("ATTITUDE", 50), ("GLOBAL_POSITION_INT", 10), ("HEARTBEAT", 1)]
+
+
+def makeMessage(msgType, i):
+    if msgType == "RAW_IMU":
+        return mavlink.MAVLink_raw_imu_message(i * 20000, i % 100, -i % 100, -1000, 1, 2, 3, 200, -50, 400)
+    if msgType == "ATTITUDE":
+        return mavlink.MAVLink_attitude_message(i * 20, 0.01, -0.02, i * 1e-4, 0.001, 0.002, 0.003)
+    if msgType == "GLOBAL_POSITION_INT":
+        return mavlink.MAVLink_global_position_int_message(i * 100, 300000000 + i, 1200000000 - i, 50000, 3000 + i,
+                                                          100, -20, 5, 9000)
+    return mavlink.MAVLink_heartbeat_message(2, 3, 89, 4, 4, 3)
+
+
+def flightMessages(seconds):
+    """
+    :return: 按时间排列的[(消息类型, 消息, 时间戳), ...]
+    """
+    start = time.time()
+    messages = []
+    for msgType, rate in STREAMS:
+        for i in range(int(seconds * rate)):
+            messages.append((msgType, makeMessage(msgType, i), start + i / rate))
+    messages.sort(key=lambda item: item[2])
+    return messages
+
+
+def legacyLine(msgType, msg, timestamp):
+    """原来唯一的机上记录：getSensorsData的字典写成一行文本日志"""
+    if msgType == "RAW_IMU":
+        data = {"accel": {"x": msg.xacc / 1000.0, "y": msg.yacc / 1000.0, "z": msg.zacc / 1000.0},
+                "gyro": {"x": msg.xgyro / 1000.0, "y": msg.ygyro / 1000.0, "z": msg.zgyro / 1000.0},
+                "mag": {"x": msg.xmag, "y": msg.ymag, "z": msg.zmag}}
+    else:
+        data = {name: getattr(msg, name) for name in msg.get_fieldnames()}
+    data["curTime"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+    return f"{data['curTime']} - INFO - {msgType} {data}\n"
+
+
+def parseLegacy(path):
+    counts = {}
+    with open(path) as fp:
+        for line in fp:
+            _, _, rest = line.partition(" - INFO - ")
+            msgType, _, data = rest.partition(" ")
+            ast.literal_eval(data)
+            counts[msgType] = counts.get(msgType, 0) + 1
+    return counts
+
+
+def writeFlight(directory, messages, segmentSize, batch=None):
+    """
+    :param batch: 每写入batch条消息休眠1ms，模拟按数据流速率到达的消息；None表示不休眠
+    """
+    recorder = fr.FlightRecorder(directory, segmentSize=segmentSize, syncInterval=0.2)
+    listener = recorder.listener(fr.SOURCE_DATA)
+    recorder.recordCommand("takeOff", "bench-1")
+    start = time.perf_counter()
+    for i, (msgType, msg, timestamp) in enumerate(messages):
+        listener(msgType, msg, timestamp)
+        if batch and i % batch == 0:
+            time.sleep(0.001)
+    seconds = time.perf_counter() - start
+    recorder.recordCommand("takeOff", "bench-1", "success")
+    stats = recorder.stats()
+    recorder.close()
+    return seconds, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="飞行记录器测试")
+    parser.add_argument("--minutes", type=float, default=30, help="模拟飞行的时长（分钟）")
+    parser.add_argument("--legacy-minutes", type=float, default=3, help="文本日志对比使用的飞行时长（分钟）")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    messages = flightMessages(args.minutes * 60)
+    print(f"模拟{args.minutes:.0f}分钟飞行，{len(messages)}条MAVLink消息")
+
+    # 1. 写入
+    seconds, stats = writeFlight(os.path.join(directory, "flight"), messages, 16 * 1024 * 1024)
+    legacyMessages = messages[:int(len(messages) * args.legacy_minutes / args.minutes)]
+    legacyPath = os.path.join(directory, "legacy.log")
+    start = time.perf_counter()
+    with open(legacyPath, "w") as fp:
+        for item in legacyMessages:
+            fp.write(legacyLine(*item))
+    legacySeconds = time.perf_counter() - start
+    print("\n1. 写入耗时（us/条）")
+    print(f"{'legacy':>10} {legacySeconds / len(legacyMessages) * 1e6:>8.2f}")
+    print(f"{'recorder':>10} {seconds / len(messages) * 1e6:>8.2f}  {stats['segments']}个分段，"
+          f"丢弃{stats['dropped']}条")
+
+    # 2. 读取
+    start = time.perf_counter()
+    records = fr.readFlight(os.path.join(directory, "flight"))
+    imu = fr.select(records, fr.IMU)
+    position = fr.select(records, fr.POSITION)
+    commands = fr.select(records, fr.COMMAND)
+    readSeconds = time.perf_counter() - start
+    start = time.perf_counter()
+    parseLegacy(legacyPath)
+    legacyRead = (time.perf_counter() - start) * args.minutes / args.legacy_minutes
+    print(f"\n2. 读取{args.minutes:.0f}分钟飞行的耗时（秒，legacy按{args.legacy_minutes:.0f}分钟的解析耗时折算）")
+    print(f"{'legacy':>10} {legacyRead:>8.2f}")
+    print(f"{'recorder':>10} {readSeconds:>8.3f}  {len(records)}条记录，IMU {len(imu)}条，"
+          f"平均zacc {imu['zacc'].mean():.0f}，最大相对高度{position['relative_alt'].max() / 1000:.1f}m，"
+          f"指令{[(c['name'].decode(), int(c['flags'])) for c in commands]}")
+
+    # 3. 分段切换
+    rotateDir = os.path.join(directory, "rotate")
+    segmentSize = 64 * 1024
+    _, stats = writeFlight(rotateDir, messages[:20000], segmentSize, batch=20)
+    records = fr.readFlight(rotateDir)
+    seq = records["seq"]
+    continuous = bool((seq[1:] - seq[:-1] == 1).all())
+    print(f"\n3. {segmentSize // 1024}KB分段以约2万条/秒写入20000条消息：{stats['segments']}个分段，"
+          f"丢弃{stats['dropped']}条，读回{len(records)}条，seq连续: {continuous}")
+
+    # 4. 掉电
+    path = sorted(os.listdir(os.path.join(directory, "flight")))[0]
+    crashed = os.path.join(directory, "crashed.rec")
+    shutil.copy(os.path.join(directory, "flight", path), crashed)
+    total = len(fr.readSegment(crashed)[1])
+    synced = total - 3000  # 假设最后3000条是上次同步之后写入的
+    with open(crashed, "r+b") as fp:
+        fp.seek(fr._SYNCED_OFFSET)
+        fp.write(synced.to_bytes(4, "little"))
+        tornOffset = fr.HEADER_SIZE + (synced + 100) * fr.RECORD_SIZE
+        fp.seek(tornOffset + 24)
+        fp.write(b"\0" * 16)  # 写了一半的记录
+        pageStart = (tornOffset // 4096 + 4) * 4096
+        fp.seek(pageStart)
+        fp.write(b"\0" * 4096)  # 未落盘的页
+    _, recovered = fr.readSegment(crashed)
+    lost = total - len(recovered)
+    print(f"\n4. 掉电：分段共{total}条，最后同步{synced}条，之后有1条写了一半、1页未落盘，"
+          f"读回{len(recovered)}条（丢失{lost}条 = 1 + {4096 // fr.RECORD_SIZE}）")
+
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+持续飞行测试：对比原来的move_continuous（每条"continue start"一个线程，发送后固定休眠0.1秒）
+与常驻的SetpointStreamer，在模拟自驾仪上统计：
+1. 发送周期：平均周期和第k次发送相对计划时刻（开始时刻 + k*周期）的偏差，即调度漂移；
+2. 摇杆式连续更新：每次更新到模拟自驾仪收到新速度的耗时，以及更新期间的发送频率；
+3. 连续两条"continue start"：原方式下两个线程交替发送新旧速度；
+4. 超过deadman未更新时自动悬停的时刻。
+
+用法（在uav目录下执行）：
+    python benchmark/setpoint_benchmark.py
+    python benchmark/setpoint_benchmark.py --rate 20 --seconds 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymavlink import mavutil  # noqa: E402
+from modules.MavlinkHub import MavlinkHub  # noqa: E402
+from modules.SetpointStreamer import SetpointStreamer, VELOCITY_TYPE_MASK  # noqa: E402
+from sim_autopilot import SimAutopilot  # noqa: E402
+
+
+def connect(port):
+    connection = mavutil.mavlink_connection(f"udpout:127.0.0.1:{port}")
+    hub = MavlinkHub(connection, name="control")
+    hub.start()
+    connection.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS, mavutil.mavlink.MAV_AUTOPILOT_INVALID, 0, 0, 0)
+    if hub.wait('HEARTBEAT', timeout=5) is None:
+        raise RuntimeError("未收到模拟自驾仪的心跳")
+    return connection, hub
+
+
+def legacyMoveContinuous(connection, event, forward=0, right=0, down=0):
+    """原来的UAV.move_continuous"""
+    connection.set_mode_apm("GUIDED")
+    while event.is_set():
+        connection.mav.set_position_target_local_ned_send(0, connection.target_system, connection.target_component,
+                                                         mavutil.mavlink.MAV_FRAME_BODY_OFFSET_NED,
+                                                         VELOCITY_TYPE_MASK, 0, 0, 0, forward, right, down,
+                                                         0, 0, 0, 0, 0)
+        time.sleep(0.1)
+    connection.mav.set_position_target_local_ned_send(0, connection.target_system, connection.target_component,
+                                                     mavutil.mavlink.MAV_FRAME_BODY_OFFSET_NED, VELOCITY_TYPE_MASK,
+                                                     0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+
+
+def received(autopilot, start, end=None):
+    return [s for s in autopilot.setpoints if s[0] >= start and (end is None or s[0] <= end)]
+
+
+def drift(samples, period):
+    """
+    :return: (平均周期ms, 第k次发送相对计划时刻的最大偏差ms, 最后一次的偏差ms)
+    """
+    times = [s[0] for s in samples]
+    intervals = [b - a for a, b in zip(times, times[1:])]
+    offsets = [t - (times[0] + k * period) for k, t in enumerate(times)]
+    return statistics.mean(intervals) * 1000, max(abs(o) for o in offsets) * 1000, offsets[-1] * 1000
+
+
+def joystick(autopilot, setVelocity, updates, interval):
+    """
+    以平均interval秒的随机间隔连续更新前进速度（随机间隔避免更新时刻与发送周期同步），
+    统计每次更新到模拟自驾仪收到该速度的耗时
+    :return: 耗时列表（毫秒）
+    """
+    latencies = []
+    for i in range(updates):
+        value = float(i % 7 + 1)
+        start = time.time()
+        setVelocity(value)
+        deadline = start + 1
+        while time.time() < deadline:
+            match = [s for s in received(autopilot, start) if s[1] == value]
+            if match:
+                latencies.append((match[0][0] - start) * 1000)
+                break
+            time.sleep(0.001)
+        time.sleep(random.uniform(0, 2 * interval))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="持续飞行速度设定点测试")
+    parser.add_argument("--rate", type=float, default=10, help="SetpointStreamer的发送频率（Hz）")
+    parser.add_argument("--seconds", type=float, default=3, help="周期测试的时长（秒）")
+    parser.add_argument("--updates", type=int, default=30, help="摇杆测试的更新次数")
+    parser.add_argument("--update-interval", type=float, default=0.03, help="摇杆测试的更新间隔（秒）")
+    parser.add_argument("--deadman", type=float, default=0.5, help="deadman测试的保持时间（秒）")
+    parser.add_argument("--port", type=int, default=14562, help="模拟自驾仪监听的UDP端口")
+    args = parser.parse_args()
+
+    random.seed(1)
+    autopilot = SimAutopilot(f"udpin:127.0.0.1:{args.port}", seed=1)
+    autopilot.start()
+    connection, hub = connect(args.port)
+    period = 1 / args.rate
+
+    # 1. 发送周期
+    event = threading.Event()
+    event.set()
+    start = time.time()
+    threading.Thread(target=legacyMoveContinuous, args=(connection, event, 1, 0, 0)).start()
+    time.sleep(args.seconds)
+    event.clear()
+    time.sleep(0.2)
+    legacy = drift(received(autopilot, start, start + args.seconds), 0.1)
+
+    streamer = SetpointStreamer(connection, rate=args.rate, deadman=0)
+    start = time.time()
+    streamer.set(1, 0, 0)
+    time.sleep(args.seconds)
+    streamer.stop()
+    time.sleep(0.2)
+    streamed = drift(received(autopilot, start, start + args.seconds), period)
+
+    print(f"1. 持续{args.seconds}秒的发送周期（ms）")
+    print(f"{'mode':>10} {'avg period':>11} {'max offset':>11} {'final drift':>12}")
+    print(f"{'legacy':>10} {legacy[0]:>11.2f} {legacy[1]:>11.2f} {legacy[2]:>12.2f}")
+    print(f"{'streamer':>10} {streamed[0]:>11.2f} {streamed[1]:>11.2f} {streamed[2]:>12.2f}")
+
+    # 2. 摇杆式更新：原方式每次更新都要停止旧线程再启动新线程
+    legacyEvent = [threading.Event()]
+
+    def legacySet(value):
+        legacyEvent[0].clear()
+        legacyEvent[0] = threading.Event()
+        legacyEvent[0].set()
+        threading.Thread(target=legacyMoveContinuous, args=(connection, legacyEvent[0], value, 0, 0)).start()
+
+    start = time.time()
+    legacyLatencies = joystick(autopilot, legacySet, args.updates, args.update_interval)
+    legacyEvent[0].clear()
+    legacyRate = len(received(autopilot, start, time.time())) / (time.time() - start)
+    time.sleep(0.3)
+
+    streamer.configure(deadman=0)
+    start = time.time()
+    streamLatencies = joystick(autopilot, lambda value: streamer.set(value, 0, 0), args.updates,
+                               args.update_interval)
+    streamRate = len(received(autopilot, start, time.time())) / (time.time() - start)
+    streamer.stop()
+    time.sleep(0.3)
+
+    print(f"\n2. 平均每{args.update_interval * 1000:.0f}ms更新一次速度，共{args.updates}次（ms）")
+    print(f"{'mode':>10} {'p50':>8} {'max':>8} {'msgs/s':>8}")
+    for name, latencies, rate in (("legacy", legacyLatencies, legacyRate),
+                                  ("streamer", streamLatencies, streamRate)):
+        print(f"{name:>10} {statistics.median(latencies):>8.1f} {max(latencies):>8.1f} {rate:>8.1f}")
+
+    # 3. 连续两条"continue start"（原方式不停止旧线程，共用一个continueEvent）
+    event = threading.Event()
+    event.set()
+    start = time.time()
+    for value in (1.0, 2.0):
+        threading.Thread(target=legacyMoveContinuous, args=(connection, event, value, 0, 0)).start()
+    time.sleep(1)
+    event.clear()
+    legacyValues = [s[1] for s in received(autopilot, start, start + 1)]
+    time.sleep(0.3)
+
+    start = time.time()
+    streamer.set(1.0, 0, 0)
+    streamer.set(2.0, 0, 0)
+    time.sleep(1)
+    streamer.stop()
+    streamValues = [s[1] for s in received(autopilot, start, start + 1)]
+    time.sleep(0.3)
+
+    def switches(values):
+        return sum(1 for a, b in zip(values, values[1:]) if a != b)
+
+    print("\n3. 连续两条continue start（速度1和2）之后1秒内收到的设定点")
+    print(f"{'legacy':>10} {len(legacyValues)}条，速度在1和2之间切换{switches(legacyValues)}次")
+    print(f"{'streamer':>10} {len(streamValues)}条，速度在1和2之间切换{switches(streamValues)}次")
+
+    # 4. deadman
+    streamer.configure(deadman=args.deadman)
+    start = time.time()
+    streamer.set(1.0, 0, 0)
+    time.sleep(args.deadman + 0.5)
+    samples = received(autopilot, start)
+    stopped = next((s[0] for s in samples if s[1] == 0), None)
+    print(f"\n4. deadman={args.deadman}s，最后一次更新后"
+          + (f"{(stopped - start) * 1000:.0f}ms发送零速度悬停" if stopped else "未悬停")
+          + f"，之后发送{len([s for s in samples if stopped and s[0] > stopped])}条")
+
+    autopilot.stop()
+    hub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+"""
+用pymavlink模拟的自驾仪，用于在没有飞控硬件的情况下运行UAV的起飞、降落、任务上传和执行：
+- 心跳（携带解锁状态和ArduCopter飞行模式）、解锁/上锁、DO_SET_MODE、起飞、降落、MISSION_START；
+- MAVLink任务协议（上传、读取、清除），可配置请求顺序和请求消息；
+- 收到REQUEST_DATA_STREAM后按请求的频率发送RAW_IMU、GLOBAL_POSITION_INT、GPS_RAW_INT、ATTITUDE和MISSION_CURRENT；
+- 简单的运动学：按固定速率爬升、下降和水平飞行，GUIDED模式下响应速度和位置目标，AUTO模式下依次飞过航点，
+  返航点飞回起飞位置降落并上锁，任务结束后MISSION_CURRENT回到0；
+- 收发两个方向可配置丢包率，发出的消息可配置延迟。
+
+通过UDP或pty连接：
+
+    autopilot = SimAutopilot("udpin:127.0.0.1:14560", loss=0.05, delay=0.01)
+    autopilot.start()
+    uav = UAV(jumpTrustStart=True, controlDevice=autopilot.clientDevice, dataDevice=autopilot.clientDevice)
+
+    autopilot = SimAutopilot("pty")  # UAV以串口方式打开autopilot.clientDevice（pty从端的路径）
+"""
+import heapq
+import itertools
+import math
+import os
+import random
+import threading
+import time
+import tty
+from pymavlink import mavutil
+
+mavlink = mavutil.mavlink
+
+# ArduCopter的飞行模式编号
+STABILIZE = 0
+AUTO = 3
+GUIDED = 4
+LOITER = 5
+RTL = 6
+LAND = 9
+
+METERS_PER_DEGREE = 111320.0
+TAKEOFF_TOLERANCE = 0.5  # 与UAV.arm_and_takeoff判断到达目标高度的误差相同（米）
+GUIDED_VELOCITY_TIMEOUT = 3.0  # 与ArduCopter相同，超过该时间没有新的速度目标时悬停（秒）
+IDLE_DISARM_DELAY = 10.0  # 与ArduCopter的DISARM_DELAY相同，解锁后停在地面超过该时间自动上锁（秒）
+
+
+class PtyConnection(mavutil.mavfile):
+    """pty主端上的MAVLink连接，对端以串口方式打开从端的路径self.path"""
+
+    def __init__(self, source_system=1, source_component=1):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        self.path = os.ttyname(slave)
+        self._slave = slave  # 保持从端打开，对端打开之前写入的数据不会丢失
+        mavutil.mavfile.__init__(self, master, self.path, source_system=source_system,
+                                 source_component=source_component)
+
+    def recv(self, n=None):
+        try:
+            return os.read(self.fd, n or 4096)
+        except (BlockingIOError, OSError):
+            return b""
+
+    def write(self, buf):
+        try:
+            os.write(self.fd, buf)
+        except (BlockingIOError, OSError):
+            pass
+
+    def close(self):
+        os.close(self.fd)
+        os.close(self._slave)
+
+
+class SimAutopilot:
+    def __init__(self, device, loss=0.0, delay=0.0, order="sequential", requestType="MISSION_REQUEST_INT",
+                 requestTimeout=0.5, seed=None, system=1, component=1, home=(30.57, 104.06), climbRate=2.5,
+                 descentRate=1.5, speed=5.0, gpsLockTime=0.0, landDisarmDelay=1.0, heartbeatRate=1.0,
+                 physicsRate=50):
+        """
+        :param device: pymavlink连接字符串，如"udpin:127.0.0.1:14560"；"pty"表示创建pty，对端打开self.clientDevice
+        :param loss: 收发两个方向的丢包率
+        :param delay: 每条发出消息的附加延迟（秒）
+        :param order: "sequential"按顺序请求航点，"random"乱序请求
+        :param requestType: 请求航点使用的消息，"MISSION_REQUEST"或"MISSION_REQUEST_INT"
+        :param requestTimeout: 上传过程中等待航点的超时时间，超时后重新请求
+        :param home: 起飞位置(纬度, 经度)
+        :param climbRate: 爬升速率（米/秒）
+        :param descentRate: 降落速率（米/秒）
+        :param speed: 飞向航点和位置目标的速度（米/秒）
+        :param gpsLockTime: 启动后GPS定位（fix_type=3）所需的时间（秒）
+        :param landDisarmDelay: 降落（LAND、返航）着地后自动上锁的延迟（秒）
+        :param heartbeatRate: 心跳频率（Hz）
+        :param physicsRate: 运动学更新频率（Hz）
+        """
+        if device == "pty":
+            self.connection = PtyConnection(source_system=system, source_component=component)
+            self.clientDevice = self.connection.path
+        else:
+            self.connection = mavutil.mavlink_connection(device, source_system=system, source_component=component)
+            self.clientDevice = device.replace("udpin:", "udpout:", 1)
+        self.loss = loss
+        self.delay = delay
+        self.order = order
+        self.requestType = requestType
+        self.requestTimeout = requestTimeout
+        self.random = random.Random(seed)
+
+        self.mission = []  # 已确认的任务项（MISSION_ITEM_INT消息）
+        self.uploads = 0
+        self.itemsReceived = 0
+        self.requestsSent = 0
+        self.dropped = 0
+        self.commands = []  # 收到的COMMAND_LONG，格式：[(接收时间, 命令ID), ...]
+        self.setpoints = []  # 收到的速度设定点，格式：[(接收时间, vx, vy, vz, 偏航角速率), ...]
+        self.events = []  # 飞行状态变化，格式：[(时间, 事件名), ...]，事件名见_event的调用处
+
+        self.home = home
+        self.climbRate = climbRate
+        self.descentRate = descentRate
+        self.speed = speed
+        self.gpsLockTime = gpsLockTime
+        self.landDisarmDelay = landDisarmDelay
+        self.heartbeatRate = heartbeatRate
+        self.physicsRate = physicsRate
+        self.streamRate = 0  # 数据流频率（Hz），收到REQUEST_DATA_STREAM之前不发送，与通过USB连接的飞控相同
+
+        # 飞行状态，由_state保护
+        self._state = threading.RLock()
+        self.armed = False
+        self.mode = STABILIZE
+        self.lat, self.lon = home
+        self.alt = 0.0  # 相对起飞点的高度（米）
+        self.velocity = (0.0, 0.0, 0.0)  # 北、东、下方向的速度（米/秒）
+        self.missionSeq = 0  # 当前任务项，0表示没有执行任务
+        self._flightTarget = None  # GUIDED/AUTO模式下的飞行目标(纬度, 经度, 高度)，None表示悬停
+        self._velocityTarget = None  # GUIDED模式下的速度目标(北, 东, 下, 失效时间)
+        self._landedAt = None  # 解锁后停在地面或着地的时刻，超过上锁延迟后自动上锁
+        self._startTime = time.time()
+
+        self._upload = None  # 上传中的状态：{"items": [...], "pending": [序号, ...], "lastTime": 时间}
+        self._outbox = []  # 格式：[(发送时间, 序号, 函数, 参数), ...]
+        self._outboxIds = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+
+    def start(self):
+        self._running = True
+        for target, name in ((self._receiveLoop, "sim-receive"), (self._sendLoop, "sim-send"),
+                             (self._heartbeatLoop, "sim-heartbeat"), (self._physicsLoop, "sim-physics"),
+                             (self._streamLoop, "sim-stream")):
+            thread = threading.Thread(target=target, name=name)
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------ 收发 --
+
+    def send(self, method, *args):
+        """经过丢包和延迟模拟后发送，method为self.connection.mav上的*_send方法名"""
+        if self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        with self._cond:
+            heapq.heappush(self._outbox, (time.time() + self.delay, next(self._outboxIds), method, args))
+            self._cond.notify()
+
+    def _sendLoop(self):
+        while self._running:
+            with self._cond:
+                while self._running and (not self._outbox or self._outbox[0][0] > time.time()):
+                    self._cond.wait(self._outbox[0][0] - time.time() if self._outbox else None)
+                if not self._running:
+                    return
+                _, _, method, args = heapq.heappop(self._outbox)
+            getattr(self.connection.mav, method)(*args)
+
+    def _heartbeatLoop(self):
+        while self._running:
+            with self._state:
+                baseMode = mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
+                if self.armed:
+                    baseMode |= mavlink.MAV_MODE_FLAG_SAFETY_ARMED
+                status = mavlink.MAV_STATE_ACTIVE if self.armed else mavlink.MAV_STATE_STANDBY
+                mode = self.mode
+            self.send("heartbeat_send", mavlink.MAV_TYPE_QUADROTOR, mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA, baseMode, mode,
+                      status)
+            time.sleep(1 / self.heartbeatRate)
+
+    def _streamLoop(self):
+        nextTime = time.time()
+        while self._running:
+            rate = self.streamRate
+            if rate <= 0:
+                time.sleep(0.05)
+                nextTime = time.time()
+                continue
+            self._sendStreams()
+            nextTime += 1 / rate
+            delay = nextTime - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                nextTime = time.time()
+
+    def _sendStreams(self):
+        now = time.time()
+        with self._state:
+            lat, lon, alt = int(self.lat * 1e7), int(self.lon * 1e7), self.alt
+            vn, ve, vd = self.velocity
+            seq = self.missionSeq
+        bootMs = int((now - self._startTime) * 1000) & 0xFFFFFFFF
+        fixType = 3 if now - self._startTime >= self.gpsLockTime else 1
+        groundSpeed = math.hypot(vn, ve)
+        heading = int(math.degrees(math.atan2(ve, vn)) % 360 * 100) if groundSpeed > 0.1 else 0
+        # 悬停时加速度计z轴约为-1g
+        self.send("raw_imu_send", bootMs * 1000, int(vn * 10), int(ve * 10), -1000, 0, 0, 0, 200, 0, 400)
+        self.send("global_position_int_send", bootMs, lat, lon, int(alt * 1000) + 500000, int(alt * 1000),
+                  int(vn * 100), int(ve * 100), int(vd * 100), heading)
+        self.send("gps_raw_int_send", bootMs * 1000, fixType, lat, lon, int(alt * 1000) + 500000, 80, 120,
+                  int(groundSpeed * 100), heading, 12 if fixType >= 3 else 3)
+        self.send("attitude_send", bootMs, 0.0, 0.0, math.radians(heading / 100), 0.0, 0.0, 0.0)
+        self.send("mission_current_send", seq)
+
+    def _receiveLoop(self):
+        while self._running:
+            msg = self.connection.recv_match(blocking=True, timeout=0.05)
+            self._checkUploadTimeout()
+            if msg is None:
+                continue
+            if self.random.random() < self.loss:
+                self.dropped += 1
+                continue
+            handler = getattr(self, f"_on{msg.get_type()}", None)
+            if handler is not None:
+                handler(msg)
+
+    # -------------------------------------------------------- 任务协议 --
+
+    def _target(self, msg):
+        return msg.get_srcSystem(), msg.get_srcComponent()
+
+    def _requestNext(self, target):
+        seq = self._upload["pending"][0]
+        self._upload["lastTime"] = time.time()
+        self._upload["target"] = target
+        self.requestsSent += 1
+        method = "mission_request_int_send" if self.requestType == "MISSION_REQUEST_INT" else "mission_request_send"
+        self.send(method, target[0], target[1], seq)
+
+    def _checkUploadTimeout(self):
+        upload = self._upload
+        if upload is not None and time.time() - upload["lastTime"] > self.requestTimeout:
+            self._requestNext(upload["target"])
+
+    def _onMISSION_COUNT(self, msg):
+        pending = list(range(msg.count))
+        if self.order == "random":
+            self.random.shuffle(pending)
+        self._upload = {"items": [None] * msg.count, "pending": pending}
+        if msg.count == 0:
+            self._finishUpload(self._target(msg))
+        else:
+            self._requestNext(self._target(msg))
+
+    def _onMISSION_ITEM_INT(self, msg):
+        upload = self._upload
+        if upload is None:
+            # 上传已完成，说明对方没有收到最后的确认，重新确认
+            target = self._target(msg)
+            self.send("mission_ack_send", target[0], target[1], mavlink.MAV_MISSION_ACCEPTED)
+            return
+        if msg.seq != upload["pending"][0]:
+            # 不是正在请求的航点（重传造成的重复），与ArduPilot相同直接忽略，由超时重新请求
+            return
+        self.itemsReceived += 1
+        upload["items"][msg.seq] = msg
+        upload["pending"].pop(0)
+        if upload["pending"]:
+            self._requestNext(self._target(msg))
+        else:
+            self._finishUpload(self._target(msg))
+
+    _onMISSION_ITEM = _onMISSION_ITEM_INT
+
+    def _finishUpload(self, target):
+        self.mission = self._upload["items"]
+        self._upload = None
+        self.uploads += 1
+        self.send("mission_ack_send", target[0], target[1], mavlink.MAV_MISSION_ACCEPTED)
+
+    def _onMISSION_CLEAR_ALL(self, msg):
+        self.mission = []
+        self._upload = None
+        target = self._target(msg)
+        self.send("mission_ack_send", target[0], target[1], mavlink.MAV_MISSION_ACCEPTED)
+
+    def _onMISSION_REQUEST_LIST(self, msg):
+        target = self._target(msg)
+        self.send("mission_count_send", target[0], target[1], len(self.mission))
+
+    def _onMISSION_REQUEST_INT(self, msg):
+        if msg.seq >= len(self.mission):
+            return
+        item = self.mission[msg.seq]
+        target = self._target(msg)
+        self.send("mission_item_int_send", target[0], target[1], item.seq, item.frame, item.command, item.current,
+                  item.autocontinue, item.param1, item.param2, item.param3, item.param4, item.x, item.y, item.z)
+
+    _onMISSION_REQUEST = _onMISSION_REQUEST_INT
+
+    # ------------------------------------------------------------ 命令 --
+
+    def _onCOMMAND_LONG(self, msg):
+        self.commands.append((time.time(), msg.command))
+        with self._state:
+            accepted = self._command(msg)
+        self.send("command_ack_send", msg.command,
+                  mavlink.MAV_RESULT_ACCEPTED if accepted else mavlink.MAV_RESULT_DENIED)
+
+    def _command(self, msg):
+        """
+        :return: 是否接受该命令
+        """
+        if msg.command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+            if msg.param1 == 1:
+                if not self.armed:
+                    self.armed = True
+                    self._landedAt = time.time()
+                    self._event("armed")
+            elif self.alt <= 0:
+                self._disarm()
+            else:
+                return False
+        elif msg.command == mavlink.MAV_CMD_DO_SET_MODE:
+            self._setMode(int(msg.param2))
+        elif msg.command == mavlink.MAV_CMD_NAV_TAKEOFF:
+            if not self.armed or self.mode != GUIDED:
+                return False
+            self._landedAt = None
+            self._flightTarget = (self.lat, self.lon, msg.param7)
+            self._event("takeoff")
+        elif msg.command == mavlink.MAV_CMD_NAV_LAND:
+            self._setMode(LAND)
+        elif msg.command == mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH:
+            self._setMode(RTL)
+        elif msg.command == mavlink.MAV_CMD_MISSION_START:
+            if not self.armed or len(self.mission) < 2:
+                return False
+            self._setMode(AUTO)
+        return True
+
+    def _onSET_POSITION_TARGET_LOCAL_NED(self, msg):
+        self.setpoints.append((time.time(), msg.vx, msg.vy, msg.vz, msg.yaw_rate))
+        with self._state:
+            if self.mode != GUIDED or not self.armed:
+                return
+            if msg.type_mask & 0b111 == 0:
+                # 位置目标，按机头朝北处理机体坐标系
+                self._velocityTarget = None
+                self._flightTarget = self._offset(msg.x, msg.y, self.alt - msg.z)
+            else:
+                self._flightTarget = None
+                self._velocityTarget = (msg.vx, msg.vy, msg.vz, time.time() + GUIDED_VELOCITY_TIMEOUT)
+            self._landedAt = None
+
+    def _onREQUEST_DATA_STREAM(self, msg):
+        self.streamRate = msg.req_message_rate if msg.start_stop else 0
+
+    # ---------------------------------------------------------- 运动学 --
+
+    def _event(self, name):
+        self.events.append((time.time(), name))
+
+    def eventTime(self, name, after=0.0):
+        """
+        :return: after之后第一次发生该事件的时间，没有发生时返回None
+        """
+        return next((t for t, event in self.events if event == name and t >= after), None)
+
+    def _setMode(self, mode):
+        if mode == self.mode:
+            return
+        self.mode = mode
+        self._velocityTarget = None
+        self._flightTarget = None
+        if mode == AUTO:
+            # 与ArduPilot相同，第0项为起飞位置，从第1项开始执行
+            self.missionSeq = 1 if len(self.mission) > 1 else 0
+            self._event("mission start")
+        self._event(f"mode {mode}")
+
+    def _disarm(self):
+        self.armed = False
+        self._landedAt = None
+        self._flightTarget = None
+        self._velocityTarget = None
+        self.velocity = (0.0, 0.0, 0.0)
+        self._event("disarmed")
+
+    def _offset(self, north, east, alt):
+        """
+        :return: 当前位置向北north米、向东east米、高度为alt的位置(纬度, 经度, 高度)
+        """
+        lat = self.lat + north / METERS_PER_DEGREE
+        lon = self.lon + east / (METERS_PER_DEGREE * math.cos(math.radians(self.lat)))
+        return lat, lon, alt
+
+    def _physicsLoop(self):
+        dt = 1 / self.physicsRate
+        nextTime = time.time()
+        while self._running:
+            with self._state:
+                self._step(dt)
+            nextTime += dt
+            delay = nextTime - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                nextTime = time.time()
+
+    def _step(self, dt):
+        if not self.armed:
+            return
+        if self.mode == LAND:
+            self._descend(dt)
+        elif self.mode == RTL:
+            if self._flyTo((self.home[0], self.home[1], self.alt), dt):
+                self._descend(dt)
+        elif self.mode == AUTO:
+            self._stepMission(dt)
+        elif self._velocityTarget is not None:
+            vn, ve, vd, expiresAt = self._velocityTarget
+            if time.time() > expiresAt:
+                self._velocityTarget = None
+                vn = ve = vd = 0.0
+            if self.alt <= 0 and vd > 0:
+                vd = 0.0
+            self._move(vn * dt, ve * dt, vd * dt, dt)
+        elif self._flightTarget is not None:
+            if self._flyTo(self._flightTarget, dt):
+                self._event("target reached")
+                self._flightTarget = None
+        else:
+            self.velocity = (0.0, 0.0, 0.0)
+            self._checkLanded(IDLE_DISARM_DELAY)
+
+    def _stepMission(self, dt):
+        if self.missionSeq == 0 or self.missionSeq >= len(self.mission):
+            self.velocity = (0.0, 0.0, 0.0)
+            return
+        item = self.mission[self.missionSeq]
+        if item.command == mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH:
+            if self._flyTo((self.home[0], self.home[1], self.alt), dt):
+                self._descend(dt)
+            return
+        if item.command == mavlink.MAV_CMD_NAV_TAKEOFF:
+            target = (self.lat, self.lon, item.z)
+        else:
+            scale = 1e7 if item.get_type() == "MISSION_ITEM_INT" else 1
+            target = (item.x / scale, item.y / scale, item.z)
+        if self._flyTo(target, dt):
+            self._nextMissionItem()
+
+    def _nextMissionItem(self):
+        self.missionSeq += 1
+        if self.missionSeq >= len(self.mission):
+            # 最后一项之后任务结束，MISSION_CURRENT回到0
+            self.missionSeq = 0
+            self._event("mission complete")
+
+    def _flyTo(self, target, dt):
+        """
+        以speed（竖直方向为爬升/降落速率）向目标飞行一步
+        :return: 是否已到达目标
+        """
+        north = (target[0] - self.lat) * METERS_PER_DEGREE
+        east = (target[1] - self.lon) * METERS_PER_DEGREE * math.cos(math.radians(self.lat))
+        up = target[2] - self.alt
+        horizontal = math.hypot(north, east)
+        step = self.speed * dt
+        if horizontal > step:
+            north, east = north / horizontal * step, east / horizontal * step
+        verticalStep = (self.climbRate if up > 0 else self.descentRate) * dt
+        up = max(-verticalStep, min(verticalStep, up))
+        previous = self.alt
+        self._move(north, east, -up, dt)
+        if previous < target[2] - TAKEOFF_TOLERANCE <= self.alt:
+            self._event("takeoff altitude")
+        return horizontal <= step and abs(target[2] - self.alt) < 1e-6
+
+    def _descend(self, dt):
+        if self.alt > 0:
+            self._move(0.0, 0.0, min(self.descentRate * dt, self.alt), dt)
+        else:
+            self.velocity = (0.0, 0.0, 0.0)
+        self._checkLanded(self.landDisarmDelay)
+
+    def _checkLanded(self, disarmDelay):
+        if self.alt > 0:
+            return
+        now = time.time()
+        if self._landedAt is None:
+            self._landedAt = now
+            self._event("landed")
+        elif now - self._landedAt >= disarmDelay:
+            self._disarm()
+            if self.mode == AUTO and self.missionSeq != 0:
+                # 返航降落后任务结束
+                self.missionSeq = 0
+                self._event("mission complete")
+
+    def _move(self, north, east, down, dt):
+        self.lat, self.lon, self.alt = self._offset(north, east, max(0.0, self.alt - down))
+        self.velocity = (north / dt, east / dt, down / dt)
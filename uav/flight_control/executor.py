@@ -0,0 +1,135 @@
+import heapq
+import itertools
+import threading
+import time
+from flight_control import logger
+
+# 指令优先级，数值越小优先级越高
+SAFETY = 0  # 降落、停止持续飞行等安全指令
+MANUAL = 1  # 起飞、移动等手动控制指令
+MISSION = 2  # 航点任务
+PRIORITY_NAMES = {SAFETY: "safety", MANUAL: "manual", MISSION: "mission"}
+
+_queue = []  # 等待执行的指令，堆，格式：[(优先级, 序号, Command), ...]
+_cond = threading.Condition()
+_seq = itertools.count()
+g_current = None  # 正在执行的指令
+g_stats = {name: {"count": 0, "preempted": 0, "waitTotal": 0.0, "waitMax": 0.0, "executionTotal": 0.0,
+                  "executionMax": 0.0} for name in PRIORITY_NAMES.values()}
+
+
+class Command:
+    def __init__(self, name, priority, func, commandAck):
+        """
+        :param name: 指令名称，用于日志
+        :param priority: SAFETY/MANUAL/MISSION
+        :param func: 执行函数，形如func(cancel)，cancel为threading.Event，被抢占时置位；返回值为假（False、None等）表示执行失败
+        :param commandAck: 指令回执，开始执行和执行结束时回复
+        """
+        self.name = name
+        self.priority = priority
+        self.func = func
+        self.commandAck = commandAck
+        self.cancel = threading.Event()
+        self.enqueuedAt = time.monotonic()
+        self.preemptedBy = None
+
+
+def init():
+    # 指令只在该线程中依次执行，接收线程只负责解密和入队，不会被长时间操作阻塞
+    thread = threading.Thread(target=executorService, name="executor")
+    thread.daemon = True
+    thread.start()
+    logger.info("指令执行服务初始化成功")
+
+
+def submit(name, priority, func, commandAck):
+    """
+    提交指令。优先级更高的指令会抢占正在执行的、以及丢弃排队中的低优先级指令：
+    正在执行的指令的cancel被置位，在MavlinkHub.CANCEL_POLL_INTERVAL内停止等待，随后立即执行新指令
+    :return: Command
+    """
+    command = Command(name, priority, func, commandAck)
+    with _cond:
+        dropped = [entry[2] for entry in _queue if entry[0] > priority]
+        if dropped:
+            _queue[:] = [entry for entry in _queue if entry[0] <= priority]
+            heapq.heapify(_queue)
+        running = g_current
+        preempting = running is not None and running.priority > priority
+        if preempting:
+            running.preemptedBy = name
+            running.cancel.set()
+        heapq.heappush(_queue, (priority, next(_seq), command))
+        _cond.notify()
+
+    if preempting:
+        logger.warning(f"指令{name}抢占正在执行的{running.name}")
+    for item in dropped:
+        logger.warning(f"排队中的指令{item.name}被{name}抢占，不再执行")
+        with _cond:
+            g_stats[PRIORITY_NAMES[item.priority]]["preempted"] += 1
+        item.commandAck.completed("preempted", f"被{name}指令抢占")
+    return command
+
+
+def executorService():
+    global g_current
+    while True:
+        with _cond:
+            while not _queue:
+                _cond.wait()
+            _, _, command = heapq.heappop(_queue)
+            g_current = command
+
+        start = time.monotonic()
+        command.commandAck.dispatched()
+        status, msg = "success", ""
+        try:
+            if not command.func(command.cancel):
+                status, msg = "error", "指令执行失败！"
+        except Exception as e:
+            if command.cancel.is_set():
+                status, msg = "preempted", f"被{command.preemptedBy}指令抢占"
+            else:
+                logger.error(f"执行指令{command.name}时发生异常: {e}")
+                status, msg = "error", f"执行指令时发生异常：{e}"
+        finally:
+            with _cond:
+                g_current = None
+        end = time.monotonic()
+
+        command.commandAck.completed(status, msg)
+        _record(command, start - command.enqueuedAt, end - start, status)
+
+
+def _record(command, waitTime, executionTime, status):
+    # 提交线程也会更新被抢占数，统计与队列共用一个锁
+    with _cond:
+        stats = g_stats[PRIORITY_NAMES[command.priority]]
+        stats["count"] += 1
+        stats["waitTotal"] += waitTime
+        stats["waitMax"] = max(stats["waitMax"], waitTime)
+        stats["executionTotal"] += executionTime
+        stats["executionMax"] = max(stats["executionMax"], executionTime)
+        if status == "preempted":
+            stats["preempted"] += 1
+    logger.info("指令%s（%s）排队%.1fms，执行%.1fms，结果：%s", command.name, PRIORITY_NAMES[command.priority],
+                waitTime * 1000, executionTime * 1000, status)
+
+
+def stats():
+    """
+    :return: 各优先级的指令数、被抢占数、排队和执行耗时的平均值与最大值（毫秒），以及排队中的指令数
+    """
+    result = {}
+    with _cond:
+        snapshot = {name: dict(item) for name, item in g_stats.items()}
+        result["queued"] = len(_queue)
+    for name, item in snapshot.items():
+        count = item["count"] or 1
+        result[name] = {"count": item["count"], "preempted": item["preempted"],
+                        "waitAvgMs": item["waitTotal"] / count * 1000, "waitMaxMs": item["waitMax"] * 1000,
+                        "executionAvgMs": item["executionTotal"] / count * 1000,
+                        "executionMaxMs": item["executionMax"] * 1000}
+    return result
@@ -1,94 +1,195 @@
 import base64
 import json
 import threading
+import time
 from modules import message
 from modules.DataBase import DataBase
+from modules import startup
+from flight_control import executor
 from flight_control import logger
+from flight_control import recorder
 from flight_control import sm4
 
-with open("config.json", "r") as fp:
-    config = json.loads(fp.read())
-    serviceName = config.get("service").get("flightControl").get("rabbitMQName")
-
-    clientName = config.get("clientName")
-    defaultTakeOffAltitude = config.get("service").get("flightControl").get("defaultTakeOffAltitude")
-
-database = DataBase()
+serviceName = ""
+clientName = ""
+defaultTakeOffAltitude = 3
+database = None  # 第一次收到加密指令时才打开数据库，见getDatabase
+_databaseLock = threading.Lock()
 g_uav = None
-continueEvent = threading.Event()
-continueEvent.set()
 
 
 def init(uav):
-    global g_uav
+    global g_uav, serviceName, clientName, defaultTakeOffAltitude
     g_uav = uav
 
     with open("config.json", "r") as fp:
         config = json.loads(fp.read())
 
+        serviceName = config.get("service").get("flightControl").get("rabbitMQName")
+        clientName = config.get("clientName")
+        defaultTakeOffAltitude = config.get("service").get("flightControl").get("defaultTakeOffAltitude")
+        setpointConfig = config.get("service").get("flightControl").get("setpoint", {})
+
         path = config.get("service").get("flightControl").get("logger").get("path")
         logLevel = config.get("service").get("flightControl").get("logger").get("level")
+        logQueueSize = config.get("service").get("flightControl").get("logger").get("queueSize", 10000)
 
     # 初始化log模块
-    logger.init(path, logLevel)
+    logger.init(path, logLevel, logQueueSize)
+
+    # 持续飞行的速度设定点发送频率和目标保持时间
+    uav.setpoints.configure(setpointConfig.get("rate"), setpointConfig.get("deadman"))
+
+    # 启动指令执行线程，必须在接收消息之前
+    executor.init()
 
     # 启动消息接收线程
     threading.Thread(target=messageRecvService).start()
 
+    # 上线通知，服务器据此登记本机并协商消息编码
+    messageSend("online", {})
+
     logger.info("无人机端口 飞行控制服务初始化成功！")
 
 
+def getDatabase():
+    global database
+    if database is None:
+        with _databaseLock:
+            if database is None:
+                database = DataBase()
+    return database
+
+
+# 回执中的错误码，服务器据此处理（如密钥错误时清除密钥缓存），不依赖msg文字
+ERROR_DECRYPT = "decrypt"  # 解密失败，服务器与本机的密钥不一致
+ERROR_NO_KEY = "noKey"  # 本机未查询到密钥
+
+
+class CommandAck:
+    """
+    指令回执：开始执行时回复dispatched，执行结束或无法执行时回复completed，
+    回执中的receivedAt、dispatchedAt、completedAt为本机time.time()
+    服务器旧版本的指令没有commandId，不回复
+    """
+
+    def __init__(self, dataPackage, receivedAt):
+        self.commandId = dataPackage.get("commandId") if isinstance(dataPackage, dict) else None
+        self.receivedAt = receivedAt
+        self.dispatchedAt = None
+        self.name = "unknown"  # 指令名称，解密后提交给executor时设置，用于飞行记录
+
+    def dispatched(self):
+        self.dispatchedAt = time.time()
+        self._send("dispatched")
+
+    def completed(self, status="success", msg="", code=None):
+        """
+        :param code: 可选的错误码，如ERROR_DECRYPT
+        """
+        recorder.recordCommand(self.name, self.commandId, status)
+        fields = {"completedAt": time.time(), "status": status, "msg": msg}
+        if code is not None:
+            fields["code"] = code
+        self._send("completed", **fields)
+
+    def _send(self, stage, **fields):
+        if self.commandId is None:
+            return
+        messageSend("ack", dict(fields, commandId=self.commandId, stage=stage, receivedAt=self.receivedAt,
+                                dispatchedAt=self.dispatchedAt))
+
+
 def messageRecvService():
     while True:
         messagePackage = message.recv(serviceName)
+        receivedAt = time.time()
 
         dataType = messagePackage.get("dataType")
         dataPackage = messagePackage.get("dataPackage")
 
-        if dataType == "service":
-            logger.info(f"接收到服务器发送的控制指令：{dataPackage}")
-            checkAndDecryptPackage(dataPackage)
-        if dataType == "plan":  # 如果为任务规划，直接执行missionPlan
-            logger.info(f"接收到服务器发送的任务规划指令：{dataPackage}")
-            missionPlan(dataPackage)
+        if dataType in ("service", "plan") and startup.firstCommand():
+            logger.info(f"启动后接收到第一条指令，距启动{startup.g_firstCommand * 1000:.0f}ms")
+
+        if dataType not in ("service", "plan"):
+            continue
+        # 接收线程只解密并提交给executor，不执行指令，长时间操作期间仍能及时收到降落等安全指令
+        commandAck = CommandAck(dataPackage, receivedAt)
+        try:
+            if dataType == "service":
+                logger.info("接收到服务器发送的控制指令：%s", dataPackage)
+                flyCommand = checkAndDecryptPackage(dataPackage, commandAck)
+                if flyCommand is not None:
+                    submitFlightControl(flyCommand, commandAck)
+            if dataType == "plan":  # 如果为任务规划，提交missionPlan
+                logger.info("接收到服务器发送的任务规划指令：%s", dataPackage)
+                missionPlan(dataPackage, commandAck)
+        except Exception as e:
+            # 单条指令出错不影响之后的指令
+            logger.error(f"处理指令时发生异常: {e}")
+            commandAck.completed("error", f"处理指令时发生异常：{e}")
 
 
 def messageSend(dataType, data):
-    sendData = json.dumps({"clientName": clientName, "dataType": dataType, "dataPackage": data}).encode()
+    sendData = {"clientName": clientName, "dataType": dataType, "dataPackage": data}
     message.send(serviceName, sendData)
 
 
-def checkAndDecryptPackage(dataPackage):
+def checkAndDecryptPackage(dataPackage, commandAck):
     """
-    检查控制数据包是否加密。如果为加密数据包，则进行解密；如果为不加密数据包，则直接执行。
+    检查控制数据包是否加密。如果为加密数据包，则进行解密；如果为不加密数据包，则直接返回。
     :param dataPackage: 数据包
-    :return: 无
+    :param commandAck: 该指令的CommandAck，解密失败时回复错误
+    :return: 飞行控制指令，解密失败返回None
     """
     data = dataPackage.get("data")
     isEncrypt = dataPackage.get("encrypt")
     if isEncrypt:
-        key = database.queryIdentityKey(clientName)
+        key = getDatabase().queryIdentityKey(clientName)
         if key:
             key = key.encode()
 
-            encryptedDataBytes = base64.b64decode(data.encode())
+            # 二进制编码下密文为原始字节，JSON编码下为base64字符串
+            encryptedDataBytes = data if isinstance(data, bytes) else base64.b64decode(data.encode())
             decryptedDataBytes = sm4.decrypt(key, encryptedDataBytes)
-            if decryptedDataBytes:
-                decryptedData = json.loads(decryptedDataBytes.decode())
-                flightControl(decryptedData)
-            else:
-                logger.error("解密控制指令失败，请检查密钥是否相同！")
+            try:
+                # 密钥不同时解密结果通常是非空的乱码，无法按UTF-8和JSON解析
+                if decryptedDataBytes:
+                    return json.loads(decryptedDataBytes.decode())
+            except (UnicodeDecodeError, ValueError):
+                pass
+            logger.error("解密控制指令失败，请检查密钥是否相同！")
+            commandAck.completed("error", "解密控制指令失败！", ERROR_DECRYPT)
         else:
             logger.error("未查询到加密密钥，解密控制指令失败！")
-    else:
-        flightControl(data)
+            commandAck.completed("error", "未查询到加密密钥！", ERROR_NO_KEY)
+        return None
+    return data
+
+
+# 各特殊指令的优先级，未列出的（普通移动）为手动控制
+PRIORITIES = {
+    "land": executor.SAFETY,
+    "continue stop": executor.SAFETY,
+    "takeOff": executor.MANUAL,
+    "continue start": executor.MANUAL,
+}
+
+
+def submitFlightControl(flyCommand, commandAck):
+    specialInstruction = flyCommand.get("specialInstruction")
+    commandAck.name = specialInstruction or "move"
+    recorder.recordCommand(commandAck.name, commandAck.commandId)
+    executor.submit(commandAck.name, PRIORITIES.get(specialInstruction, executor.MANUAL),
+                    lambda cancel: flightControl(flyCommand, cancel), commandAck)
 
 
-def flightControl(flyCommand):
+def flightControl(flyCommand, cancel=None):
     """
-    无人机飞行控制
+    无人机飞行控制，在executor线程中执行
     :param flyCommand:
-    :return:
+    :param cancel: 被更高优先级指令抢占时置位的threading.Event
+    :return: 是否执行成功
     """
     x = flyCommand.get("x")
     y = flyCommand.get("y")
@@ -98,26 +199,44 @@ def flightControl(flyCommand):
     if specialInstruction == "takeOff":
         if g_uav.inAir:
             logger.error("无人机已经起飞，请不要再下达起飞指令！")
-        else:
-            g_uav.arm_and_takeoff(defaultTakeOffAltitude)
+            return False
+        elif g_uav.arm_and_takeoff(defaultTakeOffAltitude, cancel):
             logger.info("无人机成功起飞！")
+        else:
+            logger.error("无人机起飞失败！")
+            return False
 
     elif specialInstruction == "land":
-        g_uav.land()
+        g_uav.stop_continuous()  # 降落前停止持续飞行，避免速度指令与降落冲突
+        return g_uav.land()
     elif specialInstruction == "continue start":
-        logger.info(f"无人机将持续飞行，X方向：{x}，Y方向：{z}，Z方向：{z}")
-        continueEvent.set()
-        threading.Thread(target=g_uav.move_continuous, args=(continueEvent, x, y, z)).start()  # 向前飞1米
+        # 前端可以像摇杆一样反复发送，只更新速度目标，在下一个发送周期生效
+        yawRate = flyCommand.get("yawRate", 0)
+        logger.info("无人机将持续飞行，X方向：%s，Y方向：%s，Z方向：%s，偏航角速率：%s", x, y, z, yawRate)
+        g_uav.move_continuous(x, y, z, yawRate, flyCommand.get("hold"))
     elif specialInstruction == "continue stop":
         logger.info(f"无人机将停止持续飞行")
-        continueEvent.clear()
+        g_uav.stop_continuous()
     else:
         logger.info(f"无人机将飞行，X方向：{x}，Y方向：{z}，Z方向：{z}")
+        g_uav.stop_continuous()  # 位置目标会被持续发送的速度目标覆盖
         g_uav.move_relative(x, y, z)
+    return True
+
 
+def missionPlan(dataPackage, commandAck):  # 任务规划方法
+    waypoints = dataPackage.get("data").get("waypoints")
+    commandAck.name = "mission"
+    recorder.recordCommand(commandAck.name, commandAck.commandId)
+    executor.submit("mission", executor.MISSION, lambda cancel: runMission(waypoints, cancel), commandAck)
 
-def missionPlan(dataPackage):  # 任务规划方法
-    data = dataPackage.get("data").get("waypoints")
-    if g_uav.upload_mission(data, return_to_launch=True):
-        g_uav.execute_mission()
-        g_uav.wait_mission_complete()
+
+def runMission(waypoints, cancel=None):
+    """
+    :param cancel: 被更高优先级指令抢占时置位的threading.Event，上传、起飞和等待任务完成都会及时停止
+    :return: 任务上传、执行都成功且任务完成时返回True
+    """
+    g_uav.stop_continuous()
+    if g_uav.upload_mission(waypoints, return_to_launch=True, cancel=cancel):
+        return bool(g_uav.execute_mission(cancel=cancel) and g_uav.wait_mission_complete(cancel))
+    return False
@@ -1,31 +1,34 @@
 from modules.Logger import Logger
 
+logger = None
 
-def init(path, logLevel):
+
+def init(path, logLevel, queueSize=10000):
     global logger
-    logger = Logger(path, logLevel)
+    logger = Logger(path, logLevel, queueSize)
+
+
+def stats():
+    return logger.stats()
 
 
-# 提供一些方便的函数
-def debug(message):
-    logger.debug(message)
+# 提供一些方便的函数，参数见Logger.info：支持%格式的延迟格式化以及every限流、sample抽样
+# 控制台输出由Logger的后台线程完成，调用线程不再print
+def debug(message, *args, every=None, sample=None):
+    logger.debug(message, *args, every=every, sample=sample, stacklevel=2)
 
 
-def info(message):
-    print(message)
-    logger.info(message)
+def info(message, *args, every=None, sample=None):
+    logger.info(message, *args, every=every, sample=sample, stacklevel=2)
 
 
-def warning(message):
-    print(message)
-    logger.warning(message)
+def warning(message, *args, every=None, sample=None):
+    logger.warning(message, *args, every=every, sample=sample, stacklevel=2)
 
 
-def error(message):
-    print(message)
-    logger.error(message)
+def error(message, *args, every=None, sample=None):
+    logger.error(message, *args, every=every, sample=sample, stacklevel=2)
 
 
-def critical(message):
-    print(message)
-    logger.critical(message)
+def critical(message, *args, every=None, sample=None):
+    logger.critical(message, *args, every=every, sample=sample, stacklevel=2)
@@ -0,0 +1,47 @@
+import json
+from flight_control import logger
+
+g_recorder = None
+
+
+def init(uav):
+    """
+    创建飞行记录器并挂到数据连接和控制连接的消息中心上，以MAVLink数据流的原始速率记录
+    """
+    global g_recorder
+
+    with open("config.json", "r") as fp:
+        config = json.loads(fp.read())
+        recorderConfig = config.get("service").get("flightControl").get("recorder", {})
+
+    if not recorderConfig.get("enable", True):
+        logger.info("飞行记录器未启用")
+        return
+
+    # 导入放在这里，未启用时不加载
+    from modules.FlightRecorder import FlightRecorder, SOURCE_CONTROL, SOURCE_DATA
+
+    try:
+        recorder = FlightRecorder(recorderConfig.get("path", "flight_record"),
+                                  int(recorderConfig.get("segmentSize", 16) * 1024 * 1024),
+                                  recorderConfig.get("maxSegments", 32), recorderConfig.get("syncInterval", 1))
+    except OSError as e:
+        logger.error(f"飞行记录器初始化失败: {e}")
+        return
+
+    uav.dataHub.addListener(recorder.listener(SOURCE_DATA))
+    if uav.controlHub is not uav.dataHub:
+        uav.controlHub.addListener(recorder.listener(SOURCE_CONTROL))
+    g_recorder = recorder
+
+    logger.info(f"飞行记录器初始化成功，记录文件{recorder.stats()['path']}")
+
+
+def recordCommand(name, commandId=None, status="received"):
+    """记录收到的指令及其执行结果，记录器未启用时忽略"""
+    if g_recorder is not None:
+        g_recorder.recordCommand(name, commandId, status)
+
+
+def stats():
+    return g_recorder.stats() if g_recorder is not None else None
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from modules import message
+from flight_control import logger
+
+g_uav = None
+g_serviceName = ""
+g_clientName = ""
+
+# 发送速率（Hz），拥塞时降低，恢复后逐步回升，范围为[minRate, maxRate]，maxRate默认等于配置的速率
+g_rate = 2.0
+g_minRate = 0.2
+g_maxRate = 2.0
+g_maxQueue = 20  # 发送队列超过该长度时跳过本帧
+g_sent = 0
+g_skipped = 0
+
+
+def init(uav):
+    global g_uav, g_serviceName, g_clientName, g_rate, g_minRate, g_maxRate, g_maxQueue
+    g_uav = uav
+
+    with open("config.json", "r") as fp:
+        config = json.loads(fp.read())
+
+        g_clientName = config.get("clientName")
+        flightControlConfig = config.get("service").get("flightControl")
+        g_serviceName = flightControlConfig.get("rabbitMQName")
+        telemetryConfig = flightControlConfig.get("telemetry", {})
+
+    if not telemetryConfig.get("enable", True):
+        logger.info("遥测上报未启用")
+        return
+
+    g_rate = telemetryConfig.get("rate", g_rate)
+    g_minRate = telemetryConfig.get("minRate", g_minRate)
+    g_maxRate = telemetryConfig.get("maxRate", g_rate)
+    g_maxQueue = telemetryConfig.get("maxQueue", g_maxQueue)
+
+    thread = threading.Thread(target=telemetryService, name="telemetry")
+    thread.daemon = True
+    thread.start()
+
+    logger.info(f"遥测上报服务初始化成功，初始速率{g_rate}Hz")
+
+
+def adaptRate(rate):
+    """
+    根据发送队列长度和发送耗时调整速率：拥塞时减半，空闲时逐步增加
+    :param rate: 当前速率（Hz）
+    :return: 新的速率（Hz）
+    """
+    queueSize = message.sendQueueSize()
+    latency = message.sendLatency()
+
+    if queueSize > g_maxQueue // 2 or latency > 0.5 / rate:
+        return max(g_minRate, rate / 2)
+    if queueSize == 0 and latency < 0.1 / rate:
+        return min(g_maxRate, rate + 0.25)
+    return rate
+
+
+def telemetryService():
+    global g_rate, g_sent, g_skipped
+
+    seq = 0
+    dropped = 0
+    nextTime = time.monotonic()
+    while True:
+        try:
+            data = g_uav.getTelemetry()
+            if data is not None:
+                if message.sendQueueSize() >= g_maxQueue:
+                    # 链路跟不上时直接丢弃本帧，只发送最新的状态
+                    g_skipped += 1
+                else:
+                    seq += 1
+                    data["seq"] = seq
+                    message.send(g_serviceName, {"clientName": g_clientName, "dataType": "telemetry",
+                                                 "dataPackage": data})
+                    g_sent += 1
+
+            if message.sendDropped() > dropped:
+                # Broker长时间不可用时发送队列已满，最旧的消息被丢弃
+                dropped = message.sendDropped()
+                logger.warning("发送队列已满，累计丢弃%d条消息", dropped, every=5)
+
+            rate = adaptRate(g_rate)
+            if rate != g_rate:
+                # 链路波动时速率可能频繁调整，限制为每5秒最多记录一次
+                logger.info("遥测上报速率调整：%.2fHz -> %.2fHz", g_rate, rate, every=5)
+                g_rate = rate
+        except Exception as e:
+            # 单帧出错不影响之后的上报，持续出错时每5秒最多记录一次
+            logger.error("遥测上报时发生异常: %s", e, every=5)
+
+        # 按绝对时间调度，避免累计误差；落后太多时从当前时间重新开始
+        nextTime += 1 / g_rate
+        delay = nextTime - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            nextTime = time.monotonic()
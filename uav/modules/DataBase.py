@@ -1,88 +1,178 @@
 import json
 import sqlite3
+import threading
 
+# 每个连接缓存的预编译语句数
+STATEMENT_CACHE_SIZE = 64
 
-class DataBase:
-    def __init__(self):
-        with open("config.json", "r") as fp:
-            config = json.loads(fp.read())
-
-        databasePath = config.get("service").get("database").get("path")
-        self._conn = sqlite3.connect(databasePath, check_same_thread=False)
-
-        self._cursor = self._conn.cursor()
 
+class DataBase:
+    """
+    线程安全的SQLite访问层：
+    每个线程使用自己的连接（不再共享一个游标，查询和取结果之间不会被其他线程打断），
+    写操作由一把锁串行化，数据库使用WAL日志模式，读不阻塞写、写不阻塞读；
+    身份认证表的查询结果缓存在内存中，由本对象的insert/update方法更新，
+    其他进程写入数据库时通过PRAGMA data_version发现并清空缓存，
+    命中缓存的查询不读取存储卡
+    """
+
+    def __init__(self, databasePath=None):
+        """
+        :param databasePath: 数据库文件路径，None表示使用config.json中的service.database.path
+        """
+        if databasePath is None:
+            with open("config.json", "r") as fp:
+                config = json.loads(fp.read())
+            databasePath = config.get("service").get("database").get("path")
+        self._path = databasePath
+
+        self._local = threading.local()
+        self._connections = []  # 所有线程的连接，close时关闭
+        self._connectionsLock = threading.Lock()
+        self._writeLock = threading.Lock()
+
+        self._authCache = {}  # 格式：{ clientName: (agreeKey, authTime) 或 None }
+        self._cacheLock = threading.Lock()
+        self._cacheGeneration = 0  # 每次清除缓存加一，查询期间缓存被清除时不写入查到的旧结果
+        self.cacheHits = 0
+        self.cacheMisses = 0
+
+        conn = self._connection()
+        # WAL模式写入数据库文件，之后打开的连接都生效
+        conn.execute("PRAGMA journal_mode=WAL")
         self.createTable()
 
+    def _connection(self):
+        """
+        :return: 当前线程的连接，不存在时创建
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+            # WAL模式下NORMAL只在检查点时同步，每次提交不再等待写卡
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            self._local.dataVersion = conn.execute("PRAGMA data_version").fetchone()[0]
+            with self._connectionsLock:
+                self._connections.append(conn)
+        return conn
+
     def createTable(self):
         self.executeSql(
-            """CREATE TABLE IF NOT EXISTS `startValueTable` (`clientName` char(5) PRIMARY KEY, `startValue` char(64) 
+            """CREATE TABLE IF NOT EXISTS `startValueTable` (`clientName` char(5) PRIMARY KEY, `startValue` char(64)
             UNIQUE NOT NULL)""",
             ())
 
         self.executeSql(
-            """CREATE TABLE IF NOT EXISTS `identityAuthTable` (`clientName` char(7) PRIMARY KEY, `agreeKey` char(32) 
+            """CREATE TABLE IF NOT EXISTS `identityAuthTable` (`clientName` char(7) PRIMARY KEY, `agreeKey` char(32)
             UNIQUE NOT NULL, `authTime` char(18) NOT NULL)""",
             ())
 
-        self._conn.commit()
-
     def executeSql(self, sqlCommand, arg):
-        self._cursor.execute(sqlCommand, arg)
+        """
+        在一个事务中执行写操作，成功后提交，失败时回滚并抛出异常
+        """
+        with self._writeLock:
+            conn = self._connection()
+            with conn:
+                conn.execute(sqlCommand, arg)
+
+    def querySql(self, sqlCommand, arg):
+        """
+        :return: 查询结果的第一行，没有结果时返回None
+        """
+        return self._connection().execute(sqlCommand, arg).fetchone()
+
+    def _checkExternalWrite(self):
+        """其他连接（包括其他进程）提交写操作后data_version改变，此时清空缓存"""
+        conn = self._connection()
+        dataVersion = conn.execute("PRAGMA data_version").fetchone()[0]
+        if dataVersion != self._local.dataVersion:
+            self._local.dataVersion = dataVersion
+            self.invalidateCache()
+
+    def _queryAuthRow(self, clientName):
+        """
+        :return: (agreeKey, authTime)，不存在时返回None
+        """
+        self._checkExternalWrite()
+        with self._cacheLock:
+            if clientName in self._authCache:
+                self.cacheHits += 1
+                return self._authCache[clientName]
+            self.cacheMisses += 1
+            generation = self._cacheGeneration
+        row = self.querySql("SELECT agreeKey, authTime FROM identityAuthTable WHERE clientName = ?", (clientName,))
+        with self._cacheLock:
+            if generation == self._cacheGeneration:
+                self._authCache[clientName] = row
+        return row
+
+    def invalidateCache(self, clientName=None):
+        """
+        :param clientName: 清除该无人机的缓存，None表示全部清除
+        """
+        with self._cacheLock:
+            self._cacheGeneration += 1
+            if clientName is None:
+                self._authCache.clear()
+            else:
+                self._authCache.pop(clientName, None)
+
+    def cacheStats(self):
+        total = self.cacheHits + self.cacheMisses
+        return {"hits": self.cacheHits, "misses": self.cacheMisses, "size": len(self._authCache),
+                "hitRate": self.cacheHits / total if total else 0.0}
 
     def queryStartValue(self, clientName):
-        self.executeSql("SELECT startValue FROM startValueTable WHERE clientName = ?", (clientName,))
-        result = self._cursor.fetchone()
+        result = self.querySql("SELECT startValue FROM startValueTable WHERE clientName = ?", (clientName,))
         if result:
             return result[0]
         else:
             return None
 
     def queryAuthTime(self, clientName):
-        self.executeSql("SELECT authTime FROM identityAuthTable WHERE clientName = ?", (clientName,))
-        result = self._cursor.fetchone()
+        result = self._queryAuthRow(clientName)
         if result:
-            return result[0]
+            return result[1]
         else:
             return None
 
     def queryIdentityKey(self, clientName):
-        self.executeSql("SELECT agreeKey FROM identityAuthTable WHERE clientName = ?", (clientName,))
-        result = self._cursor.fetchone()
+        result = self._queryAuthRow(clientName)
         if result:
             return result[0]
         else:
             return None
 
     def queryAgreeKeyAndAuthTime(self, clientName):
-        self.executeSql("SELECT agreeKey, authTime FROM identityAuthTable WHERE clientName = ?", (clientName,))
-        result = self._cursor.fetchone()
-        if result:
-            return result
-        else:
-            return None
+        return self._queryAuthRow(clientName)
 
     def insertStartValueTable(self, clientName, startValue):
         self.executeSql("""
                INSERT INTO startValueTable (clientName, startValue)
                VALUES (?, ?)
                """, (clientName, startValue,))
-        self._conn.commit()
 
     def insertIdentityAuthTable(self, clientName, agreeKey, authTime):
-        self.executeSql("""
-        INSERT INTO identityAuthTable (clientName, agreeKey, authTime)
-        VALUES (?, ?, ?)
-        """, (clientName, agreeKey, authTime,))
-        self._conn.commit()
+        try:
+            self.executeSql("""
+            INSERT INTO identityAuthTable (clientName, agreeKey, authTime)
+            VALUES (?, ?, ?)
+            """, (clientName, agreeKey, authTime,))
+        finally:
+            self.invalidateCache(clientName)
 
     def updateAgreeKeyAndAuthTime(self, clientName, agreeKey, authTime):
-        self.executeSql("""
-                    UPDATE identityAuthTable
-                    SET agreeKey = ?, authTime = ?
-                    WHERE clientName = ?
-                    """, (agreeKey, authTime, clientName,))
-        self._conn.commit()
+        try:
+            self.executeSql("""
+                        UPDATE identityAuthTable
+                        SET agreeKey = ?, authTime = ?
+                        WHERE clientName = ?
+                        """, (agreeKey, authTime, clientName,))
+        finally:
+            self.invalidateCache(clientName)
 
     def updateStartValue(self, clientName, startValue):
         self.executeSql("""
@@ -90,7 +180,10 @@ class DataBase:
                             SET startValue = ?
                             WHERE clientName = ?
                             """, (startValue, clientName,))
-        self._conn.commit()
 
     def close(self):
-        self._conn.close()
+        with self._connectionsLock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
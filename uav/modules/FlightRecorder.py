@@ -0,0 +1,380 @@
+"""
+飞行记录器：把MAVLink遥测（IMU、位置、姿态、飞行模式）和收到的指令以定长二进制记录写入预分配的内存映射文件。
+
+文件格式（小端）：每个分段文件开头是64字节的文件头，之后是capacity条64字节的记录。
+记录的前16字节为公共字段（time, seq, type, source, flags），随后是各类型的载荷，最后4字节是前60字节的CRC32。
+记录按64字节对齐，不会跨越页或扇区；分段写满后切换到后台线程预先分配好的下一个分段，
+超过maxSegments个分段时删除最旧的分段。
+
+掉电保护：后台线程每syncInterval秒msync一次，并把已同步的记录数写入文件头；
+读取时文件头中已同步的记录直接使用，之后的记录逐条校验CRC，写了一半的记录和未写入的全零记录被丢弃，
+掉电时最多丢失最后一个同步周期内的记录。
+
+读取：readSegment/readFlight把分段直接读成NumPy结构化数组，select按类型转换为带字段名的视图，
+字段名和单位与对应的MAVLink消息相同。
+"""
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from operator import attrgetter
+
+RECORD_SIZE = 64
+HEADER_SIZE = 64
+CRC_OFFSET = RECORD_SIZE - 4
+MAGIC = b"UAVFREC1"
+VERSION = 1
+
+# 记录类型
+IMU = 1
+POSITION = 2
+ATTITUDE = 3
+MODE = 4
+COMMAND = 5
+TYPE_NAMES = {IMU: "imu", POSITION: "position", ATTITUDE: "attitude", MODE: "mode", COMMAND: "command"}
+
+# 记录的来源
+SOURCE_DATA = 0
+SOURCE_CONTROL = 1
+SOURCE_LOCAL = 2
+
+# 指令记录的flags：收到指令时为received，执行结束时为执行结果
+COMMAND_STATUS = {"received": 0, "success": 1, "error": 2, "preempted": 3}
+
+_COMMON_FIELDS = [("time", "d"), ("seq", "I"), ("type", "B"), ("source", "B"), ("flags", "H")]
+
+# 各类型的MAVLink消息、载荷字段(字段名, struct格式)以及字段对应的消息属性
+PAYLOADS = {
+    IMU: ("RAW_IMU",
+          [("time_usec", "Q"), ("xacc", "h"), ("yacc", "h"), ("zacc", "h"), ("xgyro", "h"), ("ygyro", "h"),
+           ("zgyro", "h"), ("xmag", "h"), ("ymag", "h"), ("zmag", "h")], None),
+    POSITION: ("GLOBAL_POSITION_INT",
+               [("time_boot_ms", "I"), ("lat", "i"), ("lon", "i"), ("alt", "i"), ("relative_alt", "i"),
+                ("vx", "h"), ("vy", "h"), ("vz", "h"), ("hdg", "H")], None),
+    ATTITUDE: ("ATTITUDE",
+               [("time_boot_ms", "I"), ("roll", "f"), ("pitch", "f"), ("yaw", "f"), ("rollspeed", "f"),
+                ("pitchspeed", "f"), ("yawspeed", "f")], None),
+    # 公共字段中已有type，HEARTBEAT.type记为mav_type
+    MODE: ("HEARTBEAT",
+           [("custom_mode", "I"), ("base_mode", "B"), ("system_status", "B"), ("mav_type", "B"), ("autopilot", "B")],
+           ("custom_mode", "base_mode", "system_status", "type", "autopilot")),
+    COMMAND: (None, [("name", "16s"), ("commandId", "24s")], None),
+}
+
+_HEADER = struct.Struct("<8sHHIdII24s")  # magic, version, recordSize, 分段序号, 创建时刻, capacity, 已同步记录数, 飞行ID
+_SYNCED_OFFSET = struct.calcsize("<8sHHIdI")
+_UINT32 = struct.Struct("<I")
+
+
+def _recordStruct(fields):
+    fmt = "<" + "".join(f for _, f in _COMMON_FIELDS + fields)
+    size = struct.calcsize(fmt)
+    if size > CRC_OFFSET:
+        raise ValueError(f"记录格式{fmt}超过{CRC_OFFSET}字节")
+    return struct.Struct(fmt + "x" * (CRC_OFFSET - size))
+
+
+_STRUCTS = {recordType: _recordStruct(fields) for recordType, (_, fields, _) in PAYLOADS.items()}
+
+
+class Segment:
+    """一个预分配并内存映射的分段文件"""
+
+    def __init__(self, path, index, capacity, flightId):
+        self.path = path
+        self.index = index
+        self.capacity = capacity
+        self.count = 0
+
+        size = HEADER_SIZE + capacity * RECORD_SIZE
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            # 真正分配磁盘空间，避免写入稀疏文件时存储卡已满导致SIGBUS
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.view = memoryview(self.mm)
+        _HEADER.pack_into(self.mm, 0, MAGIC, VERSION, RECORD_SIZE, index, time.time(), capacity, 0,
+                          flightId.encode())
+
+    def sync(self, count):
+        """
+        把已写入的记录同步到存储卡，再在文件头中记录已同步的记录数（文件头在下一次同步时落盘）
+        :param count: 调用前已写完的记录数
+        """
+        self.mm.flush()
+        _UINT32.pack_into(self.mm, _SYNCED_OFFSET, count)
+
+    def close(self):
+        self.sync(self.count)
+        self.mm.flush()
+        self.view.release()
+        self.mm.close()
+
+
+class FlightRecorder:
+    def __init__(self, directory, segmentSize=16 * 1024 * 1024, maxSegments=32, syncInterval=1.0):
+        """
+        :param directory: 分段文件所在目录
+        :param segmentSize: 每个分段的字节数
+        :param maxSegments: 目录中最多保留的分段数（包括之前的飞行）
+        :param syncInterval: 同步到存储卡的间隔（秒），也是掉电时最多丢失的记录时长
+        """
+        self.directory = directory
+        self.capacity = segmentSize // RECORD_SIZE - 1
+        self.maxSegments = maxSegments
+        self.syncInterval = syncInterval
+        now = time.time()
+        # 精确到毫秒，快速重启时不会覆盖上一次飞行的分段
+        self.flightId = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{int(now * 1000) % 1000:03d}"
+
+        self.records = 0
+        self.dropped = 0  # 下一个分段尚未分配好时丢弃的记录数
+        self.segments = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._segment = self._openSegment(0)
+        self._next = None  # 后台线程预先分配的下一个分段
+        self._retired = []  # 已写满、等待后台线程关闭的分段
+        self._prune()
+
+        self._encoders = {}  # 格式：{ "RAW_IMU": (记录类型, struct, 取字段值的函数), ... }
+        for recordType, (msgType, fields, attrs) in PAYLOADS.items():
+            if msgType is not None:
+                self._encoders[msgType] = (recordType, _STRUCTS[recordType],
+                                           attrgetter(*(attrs or [name for name, _ in fields])))
+
+        self._wake = threading.Event()
+        self._running = True
+        self._thread = threading.Thread(target=self._syncLoop, name="flight-recorder", daemon=True)
+        self._thread.start()
+
+    def _openSegment(self, index):
+        path = os.path.join(self.directory, f"{self.flightId}-{index:04d}.rec")
+        segment = Segment(path, index, self.capacity, self.flightId)
+        self.segments += 1
+        return segment
+
+    def listener(self, source):
+        """
+        :param source: SOURCE_DATA/SOURCE_CONTROL
+        :return: MavlinkHub.addListener使用的回调，在读线程中把关心的消息写成一条记录
+        """
+        encoders = self._encoders
+
+        def onMessage(msgType, msg, timestamp):
+            encoder = encoders.get(msgType)
+            if encoder is not None:
+                recordType, packer, getter = encoder
+                self._write(packer, timestamp, recordType, source, 0, getter(msg))
+
+        return onMessage
+
+    def recordCommand(self, name, commandId=None, status="received"):
+        """
+        :param name: 指令名称
+        :param commandId: 服务器指令的commandId
+        :param status: received或执行结果success/error/preempted
+        """
+        self._write(_STRUCTS[COMMAND], time.time(), COMMAND, SOURCE_LOCAL, COMMAND_STATUS.get(status, 0xFFFF),
+                    (name.encode(), (commandId or "").encode()))
+
+    def _write(self, packer, timestamp, recordType, source, flags, values):
+        with self._lock:
+            segment = self._segment
+            if segment.count >= segment.capacity:
+                segment = self._rotate()
+                if segment is None:
+                    self.dropped += 1
+                    return
+            offset = HEADER_SIZE + segment.count * RECORD_SIZE
+            self._seq += 1
+            packer.pack_into(segment.mm, offset, timestamp, self._seq, recordType, source, flags, *values)
+            # 最后写CRC：同步时写了一半的记录CRC不匹配，读取时丢弃
+            _UINT32.pack_into(segment.mm, offset + CRC_OFFSET, zlib.crc32(segment.view[offset:offset + CRC_OFFSET]))
+            segment.count += 1
+            self.records += 1
+            if segment.count == segment.capacity // 2:
+                # 写到一半时通知后台线程分配下一个分段
+                self._wake.set()
+
+    def _rotate(self):
+        """在锁内切换到预先分配的下一个分段，尚未分配好时返回None"""
+        if self._next is None:
+            self._wake.set()
+            return None
+        self._retired.append(self._segment)
+        self._segment, self._next = self._next, None
+        self._wake.set()
+        return self._segment
+
+    def _syncLoop(self):
+        while self._running:
+            self._wake.wait(self.syncInterval)
+            self._wake.clear()
+            with self._lock:
+                segment = self._segment
+                count = segment.count
+                retired, self._retired = self._retired, []
+                needNext = self._next is None and count >= segment.capacity // 2
+            try:
+                for old in retired:
+                    old.close()
+                segment.sync(count)
+                if needNext:
+                    # 在后台线程中分配，写入线程（MAVLink读线程）不会被文件分配阻塞
+                    nextSegment = self._openSegment(segment.index + 1)
+                    with self._lock:
+                        self._next = nextSegment
+                    self._prune()
+            except OSError as e:
+                print(f"[flight-recorder] 同步或分配分段失败: {e}")
+
+    def _prune(self):
+        """删除超过maxSegments的最旧的分段"""
+        with self._lock:
+            inUse = {self._segment.path} | ({self._next.path} if self._next else set())
+        paths = sorted(glob.glob(os.path.join(self.directory, "*.rec")))
+        for path in paths[:max(0, len(paths) - self.maxSegments)]:
+            if path not in inUse:
+                os.remove(path)
+
+    def stats(self):
+        segment = self._segment
+        return {"records": self.records, "dropped": self.dropped, "segments": self.segments,
+                "path": segment.path, "fill": segment.count / segment.capacity}
+
+    def close(self):
+        self._running = False
+        self._wake.set()
+        self._thread.join(timeout=5)
+        with self._lock:
+            segments = self._retired + [self._segment]
+            unused, self._next = self._next, None
+            self._retired = []
+        for segment in segments:
+            segment.close()
+        if unused is not None:
+            unused.close()
+            os.remove(unused.path)
+
+
+# ---------------------------------------------------------------- 读取
+
+np = None
+_dtypes = None  # 格式：{ 0: 公共字段的dtype, IMU: ..., ... }
+
+
+def _loadNumpy():
+    """只有读取时才需要NumPy，记录时不导入"""
+    global np, _dtypes
+    if np is None:
+        import numpy
+        numpyFormats = {"d": "<f8", "f": "<f4", "Q": "<u8", "I": "<u4", "i": "<i4", "H": "<u2", "h": "<i2",
+                        "B": "u1"}
+        dtypes = {}
+        for recordType, fields in [(0, [])] + [(t, fields) for t, (_, fields, _) in PAYLOADS.items()]:
+            names, formats, offsets = [], [], []
+            offset = 0
+            for name, fmt in _COMMON_FIELDS + fields:
+                names.append(name)
+                formats.append(numpyFormats.get(fmt, "S" + fmt[:-1]))
+                offsets.append(offset)
+                offset += struct.calcsize("<" + fmt)
+            if recordType == 0:
+                # 公共dtype也覆盖载荷的字节，拼接和复制时不丢失载荷
+                names.append("payload")
+                formats.append(f"V{CRC_OFFSET - offset}")
+                offsets.append(offset)
+            names.append("crc")
+            formats.append("<u4")
+            offsets.append(CRC_OFFSET)
+            dtypes[recordType] = numpy.dtype({"names": names, "formats": formats, "offsets": offsets,
+                                              "itemsize": RECORD_SIZE})
+        _dtypes = dtypes
+        np = numpy
+    return np
+
+
+def readHeader(path):
+    """
+    :return: 文件头字典，不是记录文件时抛出ValueError
+    """
+    with open(path, "rb") as fp:
+        data = fp.read(_HEADER.size)
+    if len(data) < _HEADER.size:
+        raise ValueError(f"{path}不是飞行记录文件")
+    magic, version, recordSize, index, createdAt, capacity, synced, flightId = _HEADER.unpack(data)
+    if magic != MAGIC or recordSize != RECORD_SIZE:
+        raise ValueError(f"{path}不是飞行记录文件")
+    return {"version": version, "index": index, "createdAt": createdAt, "capacity": capacity, "synced": synced,
+            "flightId": flightId.rstrip(b"\0").decode()}
+
+
+def readSegment(path, verify=False):
+    """
+    把一个分段读成结构化数组（公共字段，载荷为payload字段中的原始字节），丢弃未写入和写了一半的记录
+    :param verify: 是否校验所有记录的CRC，默认只校验文件头中已同步的记录之后的部分
+    :return: (文件头字典, 记录数组)
+    """
+    _loadNumpy()
+    header = readHeader(path)
+    records = np.fromfile(path, dtype=_dtypes[0], offset=HEADER_SIZE, count=header["capacity"])
+    written = np.flatnonzero(records["type"])
+    records = records[:written[-1] + 1] if len(written) else records[:0]
+
+    start = 0 if verify else min(header["synced"], len(records))
+    valid = records["type"] != 0
+    raw = records.view(np.uint8).reshape(-1, RECORD_SIZE)
+    for i in range(start, len(records)):
+        if valid[i] and zlib.crc32(raw[i, :CRC_OFFSET]) != records["crc"][i]:
+            valid[i] = False
+    return header, records if valid.all() else records[valid]
+
+
+def flights(directory):
+    """
+    :return: 目录中的飞行ID列表，按时间排序
+    """
+    names = (os.path.basename(path) for path in glob.glob(os.path.join(directory, "*.rec")))
+    return sorted({name.rsplit("-", 1)[0] for name in names})
+
+
+def readFlight(directory, flightId=None, verify=False):
+    """
+    :param flightId: 飞行ID，None表示最近一次飞行
+    :return: 该次飞行所有分段的记录，按seq排序
+    """
+    _loadNumpy()
+    if flightId is None:
+        flightIds = flights(directory)
+        if not flightIds:
+            return np.zeros(0, dtype=_dtypes[0])
+        flightId = flightIds[-1]
+    paths = sorted(glob.glob(os.path.join(directory, f"{flightId}-*.rec")))
+    parts = [readSegment(path, verify)[1] for path in paths]
+    # np.concatenate会去掉结构化dtype中的填充，逐段复制保持64字节的记录
+    records = np.empty(sum(len(part) for part in parts), dtype=_dtypes[0])
+    offset = 0
+    for part in parts:
+        records[offset:offset + len(part)] = part
+        offset += len(part)
+    return records
+
+
+def select(records, recordType):
+    """
+    :param recordType: IMU/POSITION/ATTITUDE/MODE/COMMAND
+    :return: 该类型的记录，字段名与对应的MAVLink消息相同，例如select(records, IMU)["xacc"]
+    """
+    _loadNumpy()
+    return records[records["type"] == recordType].view(_dtypes[recordType])
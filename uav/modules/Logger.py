@@ -1,9 +1,52 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+_IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None))
+
+
+def _isImmutable(args):
+    if isinstance(args, tuple):
+        return all(isinstance(arg, _IMMUTABLE_TYPES) for arg in args)
+    return isinstance(args, _IMMUTABLE_TYPES)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    有界队列日志处理器：调用线程只把日志记录放入队列，格式化和写SD卡都在QueueListener的后台线程中完成，
+    队列满时丢弃新的日志并计数，指令处理线程不会因为写卡慢而被阻塞
+    """
+
+    def __init__(self, capacity):
+        super().__init__(queue.Queue(capacity))
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 不可变的参数原样交给后台线程，由后台线程格式化；字典、列表等可能在记录日志后被调用线程修改，
+        # 此时在调用线程中先格式化，避免后台线程输出修改后的内容或遍历时出错
+        if record.args and not _isImmutable(record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 
 class Logger:
-    def __init__(self, logFileName, logLevel):
+    def __init__(self, logFileName, logLevel, queueSize=10000, console=True):
+        """
+        :param queueSize: 日志队列容量，写入跟不上时超出的日志被丢弃
+        :param console: 是否同时输出到控制台（在后台线程中输出）
+        """
         # 创建 logger
         self.logger = logging.getLogger(logFileName)
 
@@ -25,24 +68,99 @@ class Logger:
         # 设置日志格式
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         handler.setFormatter(formatter)
+        handlers = [handler]
+
+        if console:
+            # 与原来print的输出一致，只输出消息本身，debug级别不输出
+            consoleHandler = logging.StreamHandler(sys.stdout)
+            consoleHandler.setLevel(logging.INFO)
+            handlers.append(consoleHandler)
 
-        # 添加 handler 到 logger
-        self.logger.addHandler(handler)
+        # 调用线程只入队，由listener线程写文件和控制台
+        self.queueHandler = BoundedQueueHandler(queueSize)
+        self.logger.addHandler(self.queueHandler)
+        self.listener = QueueListener(self.queueHandler.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.shutdown)
+
+        self.suppressed = 0
+        self._callSites = {}  # 限流和抽样的调用点状态，格式：{ (代码对象, 行号): [上次输出时间, 调用次数, 省略条数] }
+        self._callSitesLock = threading.Lock()
 
         self.logger.info("日志模块初始化成功")
 
+    def shutdown(self):
+        """停止后台线程，退出前写完队列中的日志"""
+        if self.listener is None:
+            return
+        try:
+            self.listener.stop()
+        except queue.Full:
+            pass
+        self.listener = None
+
+    def stats(self):
+        """
+        :return: 字典，包含队列中待写入的日志数、队列满时丢弃的日志数、被限流和抽样省略的日志数
+        """
+        return {"queued": self.queueHandler.queue.qsize(), "dropped": self.queueHandler.dropped,
+                "suppressed": self.suppressed}
+
+    def _allow(self, every, sample, stacklevel):
+        """
+        按调用点限流和抽样
+        :param every: 同一调用点两次输出的最小间隔（秒）
+        :param sample: 同一调用点每sample次调用输出一次
+        :param stacklevel: 与logging相同，1表示直接调用debug/info等方法的位置
+        :return: 允许输出时返回上次输出后被省略的条数，否则返回None
+        """
+        frame = sys._getframe(2 + stacklevel)  # 调用方 -> info等 -> _log -> _allow
+        key = (frame.f_code, frame.f_lineno)
+        now = time.monotonic()
+        with self._callSitesLock:
+            state = self._callSites.get(key)
+            if state is None:
+                state = self._callSites[key] = [float("-inf"), 0, 0]
+            state[1] += 1
+            if (sample and (state[1] - 1) % sample) or (every and now - state[0] < every):
+                state[2] += 1
+                self.suppressed += 1
+                return None
+            state[0] = now
+            suppressed, state[2] = state[2], 0
+            return suppressed
+
+    def _log(self, level, message, args, every, sample, stacklevel):
+        if every is not None or sample is not None:
+            suppressed = self._allow(every, sample, stacklevel)
+            if suppressed is None:
+                return
+            if suppressed:
+                if not args:
+                    message = message.replace("%", "%%")
+                message += "（此前省略%d条）"
+                args += (suppressed,)
+        self.logger.log(level, message, *args)
+
     # 提供一些方便的函数
-    def debug(self, message):
-        self.logger.debug(message)
+    # message可以使用%格式的占位符，参数通过args传入，日志级别未开启时不会把参数转换为字符串；
+    # 高频调用点可用every（最小间隔秒数）限流或sample（每N次输出一次）抽样
+    def debug(self, message, *args, every=None, sample=None, stacklevel=1):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, message, args, every, sample, stacklevel)
 
-    def info(self, message):
-        self.logger.info(message)
+    def info(self, message, *args, every=None, sample=None, stacklevel=1):
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, message, args, every, sample, stacklevel)
 
-    def warning(self, message):
-        self.logger.warning(message)
+    def warning(self, message, *args, every=None, sample=None, stacklevel=1):
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, message, args, every, sample, stacklevel)
 
-    def error(self, message):
-        self.logger.error(message)
+    def error(self, message, *args, every=None, sample=None, stacklevel=1):
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, message, args, every, sample, stacklevel)
 
-    def critical(self, message):
-        self.logger.critical(message)
+    def critical(self, message, *args, every=None, sample=None, stacklevel=1):
+        if self.logger.isEnabledFor(logging.CRITICAL):
+            self._log(logging.CRITICAL, message, args, every, sample, stacklevel)
@@ -0,0 +1,228 @@
+import queue
+import threading
+import time
+
+# 带cancel的等待每隔该时间（秒）检查一次是否已取消，即长时间操作被抢占时的最大响应延迟
+CANCEL_POLL_INTERVAL = 0.05
+
+
+def _sliceTimeout(deadline, cancel):
+    """
+    :return: 本次最多等待的秒数，None表示一直等待；已超时返回0
+    """
+    remaining = None if deadline is None else max(0.0, deadline - time.time())
+    if cancel is not None:
+        remaining = CANCEL_POLL_INTERVAL if remaining is None else min(remaining, CANCEL_POLL_INTERVAL)
+    return remaining
+
+
+class Subscription:
+    """
+    消息订阅，按接收顺序缓存指定类型的MAVLink消息，用于任务协议等不能丢消息的场景
+    """
+
+    def __init__(self, hub, types, maxsize):
+        self._hub = hub
+        self.types = set(types) if types else None
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def accepts(self, msgType):
+        return self.types is None or msgType in self.types
+
+    def put(self, msg):
+        try:
+            self._queue.put_nowait(msg)
+        except queue.Full:
+            # 缓冲区满时丢弃最旧的消息，保证读线程不被阻塞
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(msg)
+
+    def get(self, timeout=None, cancel=None):
+        """
+        获取下一条消息
+        :param timeout: 超时时间（秒），None表示一直等待
+        :param cancel: 可选的threading.Event，置位后最多CANCEL_POLL_INTERVAL秒内返回None
+        :return: MAVLink消息，超时或取消时返回None
+        """
+        if cancel is None:
+            try:
+                return self._queue.get(timeout=timeout)
+            except queue.Empty:
+                return None
+
+        deadline = None if timeout is None else time.time() + timeout
+        while not cancel.is_set():
+            wait = _sliceTimeout(deadline, cancel)
+            try:
+                return self._queue.get(timeout=wait)
+            except queue.Empty:
+                if deadline is not None and time.time() >= deadline:
+                    return None
+        return None
+
+    def clear(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self):
+        self._hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+
+class MavlinkHub:
+    """
+    MAVLink遥测中心：由唯一的后台读线程持有连接并读取所有消息，
+    按消息类型缓存最新值及其接收时间，调用方通过latest/wait/subscribe读取，不再直接调用recv_match
+    """
+
+    def __init__(self, connection, name="mavlink"):
+        self.connection = connection
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._latest = {}  # 格式：{ "RAW_IMU": (msg, timestamp, count), ... }
+        self._subscriptions = []
+        self._listeners = []
+
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._readLoop, name=f"{self.name}-reader")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _readLoop(self):
+        while self._running:
+            try:
+                msg = self.connection.recv_match(blocking=True, timeout=0.5)
+            except Exception as e:
+                print(f"[{self.name}] 读取MAVLink消息失败: {e}")
+                time.sleep(0.1)
+                continue
+            if msg is None:
+                continue
+
+            msgType = msg.get_type()
+            if msgType == "BAD_DATA":
+                continue
+            self._dispatch(msgType, msg, time.time())
+
+    def _dispatch(self, msgType, msg, timestamp):
+        with self._cond:
+            entry = self._latest.get(msgType)
+            count = entry[2] + 1 if entry else 1
+            self._latest[msgType] = (msg, timestamp, count)
+            subscriptions = [sub for sub in self._subscriptions if sub.accepts(msgType)]
+            listeners = list(self._listeners)
+            self._cond.notify_all()
+
+        for sub in subscriptions:
+            sub.put(msg)
+        for listener in listeners:
+            try:
+                listener(msgType, msg, timestamp)
+            except Exception as e:
+                print(f"[{self.name}] 消息监听回调出错: {e}")
+
+    def latest(self, msgType, maxAge=None):
+        """
+        获取某类型的最新消息
+        :param msgType: 消息类型，如"RAW_IMU"
+        :param maxAge: 最大允许的消息年龄（秒），超过则视为无效，None表示不限制
+        :return: MAVLink消息，没有则返回None
+        """
+        entry = self._latest.get(msgType)
+        if entry is None:
+            return None
+        if maxAge is not None and time.time() - entry[1] > maxAge:
+            return None
+        return entry[0]
+
+    def latestWithTime(self, msgType):
+        """
+        :return: (消息, 接收时间戳)，没有则返回(None, None)
+        """
+        entry = self._latest.get(msgType)
+        if entry is None:
+            return None, None
+        return entry[0], entry[1]
+
+    def wait(self, msgType, timeout=None, condition=None, fresh=True, cancel=None):
+        """
+        等待某类型的消息
+        :param msgType: 消息类型
+        :param timeout: 超时时间（秒），None表示一直等待
+        :param condition: 可选的判断函数，消息满足条件才返回
+        :param fresh: 为True时只接受调用之后收到的消息，为False时缓存中已有的消息也可直接返回
+        :param cancel: 可选的threading.Event，置位后最多CANCEL_POLL_INTERVAL秒内返回None
+        :return: MAVLink消息，超时或取消时返回None
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            entry = self._latest.get(msgType)
+            seenCount = entry[2] if (entry and fresh) else 0
+            while True:
+                entry = self._latest.get(msgType)
+                if entry and entry[2] > seenCount:
+                    seenCount = entry[2]
+                    if condition is None or condition(entry[0]):
+                        return entry[0]
+
+                if cancel is not None and cancel.is_set():
+                    return None
+                if deadline is None and cancel is None:
+                    self._cond.wait()
+                else:
+                    remaining = _sliceTimeout(deadline, cancel)
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+
+    def subscribe(self, types=None, maxsize=256):
+        """
+        订阅消息，订阅后收到的每条指定类型消息都会按顺序进入订阅队列
+        :param types: 消息类型列表，None表示所有类型
+        :param maxsize: 订阅队列长度
+        :return: Subscription
+        """
+        sub = Subscription(self, types, maxsize)
+        with self._cond:
+            self._subscriptions.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._cond:
+            if sub in self._subscriptions:
+                self._subscriptions.remove(sub)
+
+    def addListener(self, listener):
+        """
+        添加消息监听回调，回调在读线程中执行，形如listener(msgType, msg, timestamp)，必须尽快返回
+        """
+        with self._cond:
+            self._listeners.append(listener)
+
+    def removeListener(self, listener):
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
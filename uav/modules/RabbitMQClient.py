@@ -1,106 +1,244 @@
+import collections
+import threading
 import time
 import pika
 
 
 class RabbitMQClient:
-    def __init__(self, host, port, client_name, userName, password, message_ttl=10000, max_retries=3):
+    """
+    基于事件循环的RabbitMQ客户端：一个线程、一个异步连接，发送和接收各用一个通道。
+    send只把消息放入发送队列后立即返回，由IO线程批量发布并等待Broker确认；
+    接收回调也在IO线程中执行，因此回调必须尽快返回（例如只把消息放入队列）。
+    连接断开后未确认的消息放回队列头部，等待retry_delay秒后在IO线程中重连，发送方不会被阻塞。
+    发送队列最多保留max_queue条消息，Broker长时间不可用时丢弃最旧的消息并计入dropped。
+    """
+
+    def __init__(self, host, port, client_name, userName, password, message_ttl=10000, retry_delay=2,
+                 batch_size=50, max_in_flight=200, max_queue=1000):
         self.host = host
         self.port = port
         self.client_name = client_name
         self.userName = userName
         self.password = password
         self.message_ttl = message_ttl
-        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
         self.credentials = pika.PlainCredentials(self.userName, self.password)
-        self.init_send_connection()
-        self.init_receive_connection()
-
-    def create_connection(self):
-        # 创建连接,添加心跳检测
-        return pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=self.host,
-                port=self.port,
-                credentials=self.credentials,
-                heartbeat=60,  # 添加心跳检测
-                blocked_connection_timeout=300,
-                connection_attempts=3,
-                retry_delay=5
-            )
+
+        self.connection = None
+        self.sendChannel = None
+        self.receiveChannel = None
+        self.queue_name = None
+        self.callback = None
+
+        self.queue = collections.deque()  # 格式：[(service_type, data, properties, 入队时间), ...]
+        self._pending = collections.OrderedDict()  # 格式：{ delivery_tag: 发送队列中的元素 }
+        self._deliveryTag = 0
+        self._wakeScheduled = False
+        self._consuming = False
+
+        self.sendLatency = 0.0  # 从入队到Broker确认耗时的指数滑动平均（秒）
+        self.reconnects = 0
+        self.dropped = 0  # 发送队列满时丢弃的消息数
+
+        self.connected = threading.Event()  # 发送通道就绪后置位，断开时清除
+        self.running = True
+        self._stopEvent = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="rabbitmq-io")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def connection_parameters(self):
+        return pika.ConnectionParameters(
+            host=self.host,
+            port=self.port,
+            credentials=self.credentials,
+            heartbeat=60,  # 添加心跳检测
+            blocked_connection_timeout=300,
+            connection_attempts=3,
+            retry_delay=5
         )
 
-    def init_send_connection(self):
-        if hasattr(self, 'sendConnection') and self.sendConnection.is_open:
+    def _run(self):
+        while self.running:
             try:
-                self.sendConnection.close()
-            except:
-                pass
+                self.connection = pika.SelectConnection(
+                    self.connection_parameters(),
+                    on_open_callback=self._onConnectionOpen,
+                    on_open_error_callback=self._onConnectionOpenError,
+                    on_close_callback=self._onConnectionClosed
+                )
+                self.connection.ioloop.start()
+            except Exception as e:
+                print(f"RabbitMQ连接异常: {e}")
+            self.connected.clear()
+            self.connection = None
+            self.sendChannel = None
+            self.receiveChannel = None
+            self._consuming = False
+            self._requeuePending()
+            if self.running:
+                self.reconnects += 1
+                print(f"RabbitMQ连接断开，{self.retry_delay}秒后重连")
+                self._stopEvent.wait(self.retry_delay)
+
+    def _onConnectionOpen(self, connection):
+        connection.channel(on_open_callback=self._onSendChannelOpen)
+        connection.channel(on_open_callback=self._onReceiveChannelOpen)
 
-        self.sendConnection = self.create_connection()
-        self.sendChannel = self.sendConnection.channel()
-        self.sendChannel.exchange_declare(exchange='client_to_server', exchange_type='topic')
+    def _onConnectionOpenError(self, connection, error):
+        print(f"无法连接RabbitMQ服务器: {error}")
+        connection.ioloop.stop()
 
-    def init_receive_connection(self):
-        if hasattr(self, 'receiveConnection') and self.receiveConnection.is_open:
+    def _onConnectionClosed(self, connection, reason):
+        self.sendChannel = None
+        self.receiveChannel = None
+        connection.ioloop.stop()
+
+    def _onChannelClosed(self, channel, reason):
+        print(f"RabbitMQ通道关闭: {reason}")
+        # 任一通道异常关闭都重建整个连接，由_run负责重连
+        if self.connection is not None and self.connection.is_open:
+            self.connection.close()
+
+    # ---------------------------------------------------------------- 发送 --
+
+    def _onSendChannelOpen(self, channel):
+        channel.add_on_close_callback(self._onChannelClosed)
+        channel.exchange_declare(exchange='client_to_server', exchange_type='topic',
+                                 callback=lambda frame: channel.confirm_delivery(
+                                     self._onConfirm, callback=lambda frame: self._onConfirmSelected(channel)))
+
+    def _onConfirmSelected(self, channel):
+        self.sendChannel = channel
+        self._deliveryTag = 0
+        self.connected.set()
+        self._drain()
+
+    def send(self, service_type, data, properties=None):
+        # 放入发送队列后立即返回，由IO线程发布；队列已满时丢弃最旧的消息，重连后不必重放过时的积压
+        while len(self.queue) >= self.max_queue:
             try:
-                self.receiveConnection.close()
-            except:
-                pass
+                self.queue.popleft()
+            except IndexError:
+                break
+            self.dropped += 1
+        self.queue.append((service_type, data, properties, time.perf_counter()))
+        connection = self.connection
+        if connection is not None and not self._wakeScheduled:
+            self._wakeScheduled = True
+            try:
+                connection.ioloop.add_callback_threadsafe(self._drain)
+            except Exception:
+                self._wakeScheduled = False
 
-        self.receiveConnection = self.create_connection()
-        self.receiveChannel = self.receiveConnection.channel()
+    def _drain(self):
+        self._wakeScheduled = False
+        channel = self.sendChannel
+        if channel is None or not channel.is_open:
+            return
 
-        self.receiveChannel.exchange_declare(exchange='server_to_client', exchange_type='direct')
+        batch = 0
+        while self.queue and batch < self.batch_size and len(self._pending) < self.max_in_flight:
+            item = self.queue.popleft()
+            service_type, data, properties, _ = item
+            try:
+                channel.basic_publish(exchange='client_to_server', routing_key=f'{service_type}', body=data,
+                                      properties=properties)
+            except Exception as e:
+                print(f"发布消息失败: {e}")
+                self.queue.appendleft(item)
+                return
+            self._deliveryTag += 1
+            self._pending[self._deliveryTag] = item
+            batch += 1
+
+        if self.queue and len(self._pending) < self.max_in_flight:
+            # 每批之后让出IO循环，接收到的指令不必等待发送队列清空
+            self._wakeScheduled = True
+            self.connection.ioloop.add_callback_threadsafe(self._drain)
+
+    def _onConfirm(self, frame):
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        if method.multiple:
+            tags = [tag for tag in self._pending if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag] if method.delivery_tag in self._pending else []
+
+        now = time.perf_counter()
+        nackedItems = []
+        for tag in tags:
+            item = self._pending.pop(tag)
+            if acked:
+                self.sendLatency = 0.8 * self.sendLatency + 0.2 * (now - item[3])
+            else:
+                nackedItems.append(item)
+        # Broker拒收的消息放回队列头部重发
+        self.queue.extendleft(reversed(nackedItems))
+
+        if self.queue:
+            self._drain()
+
+    def _requeuePending(self):
+        if self._pending:
+            self.queue.extendleft(reversed(list(self._pending.values())))
+            self._pending.clear()
+
+    def pending(self):
+        """尚未被Broker确认的消息数（包括未发布的）"""
+        return len(self.queue) + len(self._pending)
 
+    # ---------------------------------------------------------------- 接收 --
+
+    def _onReceiveChannelOpen(self, channel):
+        channel.add_on_close_callback(self._onChannelClosed)
         arguments = {
             'x-client_message-ttl': self.message_ttl
         }
-        result = self.receiveChannel.queue_declare(queue='', exclusive=True, arguments=arguments)
-        self.queue_name = result.method.queue
 
-        self.receiveChannel.queue_bind(exchange='server_to_client', queue=self.queue_name,
-                                       routing_key=f'{self.client_name}')
+        def onQueueBound(frame):
+            self.receiveChannel = channel
+            self._startConsuming()
 
-    def send(self, service_type, data):
-        routing_key = f'{service_type}'
+        def onQueueDeclared(frame):
+            self.queue_name = frame.method.queue
+            channel.queue_bind(exchange='server_to_client', queue=self.queue_name,
+                               routing_key=f'{self.client_name}', callback=onQueueBound)
 
-        for retry in range(self.max_retries):
-            try:
-                self.sendChannel.basic_publish(exchange='client_to_server', routing_key=routing_key, body=data)
-                return
-            except:
-                print(f"Send connection lost, reconnecting {retry + 1}/{self.max_retries}")
-                try:
-                    # 重新建立连接，发送消息
-                    self.init_send_connection()
-                    self.sendChannel.basic_publish(exchange='client_to_server', routing_key=routing_key, body=data)
-                    return
-                except:
-                    print(f"Failed to reconnect send connection")
-                    if retry == self.max_retries - 1:
-                        raise
-                    time.sleep(2)
+        channel.exchange_declare(exchange='server_to_client', exchange_type='direct',
+                                 callback=lambda frame: channel.queue_declare(queue='', exclusive=True,
+                                                                              arguments=arguments,
+                                                                              callback=onQueueDeclared))
+
+    def _startConsuming(self):
+        channel = self.receiveChannel
+        if self._consuming or self.callback is None or channel is None or not channel.is_open:
+            return
+        self._consuming = True
+        channel.basic_consume(queue=self.queue_name, on_message_callback=self.callback, auto_ack=True)
 
     def receive(self, callback):
-        # 开始消费消息
-        for retry in range(self.max_retries):
+        """
+        注册接收回调，立即返回；回调在IO线程中执行，断线重连后自动重新订阅
+        :param callback: 形如callback(channel, method, properties, body)
+        """
+        self.callback = callback
+        connection = self.connection
+        if connection is not None:
             try:
-                self.receiveChannel.basic_consume(queue=self.queue_name, on_message_callback=callback, auto_ack=True)
-                self.receiveChannel.start_consuming()
-            except:
-                print(f"Receive connection lost, reconnecting {retry + 1}/{self.max_retries}")
-                try:
-                    # 重新建立连接，接收消息
-                    self.init_receive_connection()
-                    self.receiveChannel.basic_consume(queue=self.queue_name, on_message_callback=callback,
-                                                      auto_ack=True)
-                    self.receiveChannel.start_consuming()
-                except:
-                    print(f"Failed to reconnect receive connection")
-                    if retry == self.max_retries - 1:
-                        raise
-                    time.sleep(2)
+                connection.ioloop.add_callback_threadsafe(self._startConsuming)
+            except Exception:
+                pass
 
     def close(self):
-        self.sendChannel.close()
-        self.receiveChannel.close()
+        self.running = False
+        self._stopEvent.set()
+        connection = self.connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(connection.close)
+            except Exception:
+                pass
@@ -0,0 +1,125 @@
+import threading
+import time
+from pymavlink import mavutil
+
+# 只使用速度和偏航角速率：忽略位置、加速度和偏航角
+VELOCITY_TYPE_MASK = 0b010111000111
+
+
+class SetpointStreamer:
+    """
+    速度设定点发送器：一个常驻线程按固定频率向自驾仪发送当前的速度和偏航角速率目标，
+    目标可以随时原子地更新，在下一个发送周期生效（从悬停开始时立即发送），发送频率不随更新频率变化；
+    超过deadman秒没有更新目标时自动悬停（发送零速度）并停止发送，防止与服务器断线后无人机一直飞下去
+    """
+
+    def __init__(self, connection, rate=10, deadman=2.0):
+        """
+        :param connection: 控制连接（mavutil连接）
+        :param rate: 发送频率（Hz）
+        :param deadman: 目标保持的秒数，0表示一直保持到stop
+        """
+        self.connection = connection
+        self.rate = rate
+        self.deadman = deadman
+
+        self._cond = threading.Condition()
+        self._target = None  # 格式：(前进, 右移, 下降, 偏航角速率)，None表示不发送
+        self._expiresAt = None  # 目标失效的时刻（time.monotonic()），None表示不失效
+        self._thread = None
+
+        self.sent = 0
+        self.late = 0  # 错过发送时刻超过一个周期、重新对齐的次数
+        self.expired = 0  # 超时未更新而悬停的次数
+
+    def configure(self, rate=None, deadman=None):
+        with self._cond:
+            if rate is not None:
+                self.rate = rate
+            if deadman is not None:
+                self.deadman = deadman
+
+    def set(self, forward=0, right=0, down=0, yawRate=0, hold=None):
+        """
+        更新速度目标，重复调用即可作为心跳保持目标
+        :param forward: 前进速度(米/秒),正值前进,负值后退
+        :param right: 右移速度(米/秒),正值右移,负值左移
+        :param down: 下降速度(米/秒),正值下降,负值上升
+        :param yawRate: 偏航角速率(弧度/秒)
+        :param hold: 本次目标保持的秒数，None使用deadman，0表示一直保持到stop
+        """
+        hold = self.deadman if hold is None else hold
+        with self._cond:
+            if self._target is None:
+                # 从悬停开始持续飞行时切换一次GUIDED模式，之后的更新不再切换
+                self.connection.set_mode_apm("GUIDED")
+            self._target = (forward, right, down, yawRate)
+            self._expiresAt = time.monotonic() + hold if hold else None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._streamLoop, name="setpoint-streamer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def stop(self):
+        """停止持续飞行：发送零速度后停止发送"""
+        with self._cond:
+            if self._target is None:
+                return
+            self._target = None
+            self._expiresAt = None
+            # 在锁内发送，保证发送线程不会在零速度之后再发出旧目标
+            self._send((0, 0, 0, 0))
+
+    def target(self):
+        """
+        :return: 当前的速度目标(前进, 右移, 下降, 偏航角速率)，不在持续飞行时返回None
+        """
+        return self._target
+
+    def _send(self, target):
+        forward, right, down, yawRate = target
+        self.connection.mav.set_position_target_local_ned_send(
+            0,  # 时间戳
+            self.connection.target_system,  # 目标系统
+            self.connection.target_component,  # 目标组件
+            mavutil.mavlink.MAV_FRAME_BODY_OFFSET_NED,  # 坐标系
+            VELOCITY_TYPE_MASK,  # 类型掩码
+            0, 0, 0,  # x, y, z位置
+            forward, right, down,  # x, y, z速度
+            0, 0, 0,  # x, y, z加速度
+            0, yawRate  # 偏航角,偏航角速率
+        )
+        self.sent += 1
+
+    def _streamLoop(self):
+        nextTime = None
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._target is None:
+                    nextTime = None
+                    self._cond.wait()
+                    continue
+                if self._expiresAt is not None and now >= self._expiresAt:
+                    # 超时未更新，悬停
+                    self._target = None
+                    self._expiresAt = None
+                    self.expired += 1
+                    self._send((0, 0, 0, 0))
+                    continue
+                if nextTime is None:
+                    # 从悬停开始时立即发送，之后从此刻起按周期发送
+                    nextTime = now
+                if now >= nextTime:
+                    self._send(self._target)
+                    period = 1.0 / self.rate
+                    # 按计划时刻累加，不累积发送耗时造成的漂移；落后超过一个周期时重新对齐，不补发
+                    nextTime += period
+                    if nextTime <= now:
+                        self.late += 1
+                        nextTime = now + period
+                    continue
+                wait = nextTime - now
+                if self._expiresAt is not None:
+                    wait = min(wait, self._expiresAt - now)
+                self._cond.wait(wait)
@@ -1,36 +1,46 @@
+import hashlib
+import struct
+import threading
 import time
 from pymavlink import mavutil
-from trust_start import trustStart
+from modules.MavlinkHub import MavlinkHub
+from modules.SetpointStreamer import SetpointStreamer
+
+MISSION_ITEM_TIMEOUT = 0.5  # 等待自驾仪请求下一个航点的超时时间（秒）
+MISSION_MAX_RETRIES = 5  # 同一步骤连续超时的最大重传次数
+CONTROL_DEVICE = "/dev/ttyACM1"  # 默认的控制连接
+DATA_DEVICE = "/dev/ttyACM0"  # 默认的数据连接
+
+
+class OperationCancelled(Exception):
+    """可取消的操作（起飞、上传和执行任务等）被更高优先级的指令抢占"""
+
+
+def check_cancel(cancel):
+    """
+    :param cancel: threading.Event或None，已置位时抛出OperationCancelled
+    """
+    if cancel is not None and cancel.is_set():
+        raise OperationCancelled()
 
 
 class UAV:
-    def __init__(self, rate=4, jumpTrustStart=False):
+    def __init__(self, rate=4, jumpTrustStart=False, controlDevice=CONTROL_DEVICE, dataDevice=DATA_DEVICE):
         """
         初始化无人机连接和参数
 
         参数:
             rate (int): 数据流速率，默认值为4
             jumpTrustStart (bool): 是否跳过可信启动流程，默认值为False
+            controlDevice (str): 控制连接的pymavlink连接字符串，如串口"/dev/ttyACM1"或"udpout:127.0.0.1:14560"
+            dataDevice (str): 数据连接的pymavlink连接字符串，与controlDevice相同时两者共用一个连接
         """
         if jumpTrustStart:
-            self.controlMavlink = mavutil.mavlink_connection("/dev/ttyACM1")
-            self.dataMavlink = mavutil.mavlink_connection("/dev/ttyACM0")
-
-            self.wait_heartbeat()
-
-            self.controlMavlink.mav.request_data_stream_send(self.controlMavlink.target_system,
-                                                             self.controlMavlink.target_component,
-                                                             mavutil.mavlink.MAV_DATA_STREAM_ALL,
-                                                             rate,
-                                                             1)
-            self.dataMavlink.mav.request_data_stream_send(self.dataMavlink.target_system,
-                                                          self.dataMavlink.target_component,
-                                                          mavutil.mavlink.MAV_DATA_STREAM_ALL,
-                                                          rate,
-                                                          1)
-            self.inAir = False
-            self.clear_mission()
+            self.connect(controlDevice, dataDevice, rate)
         else:
+            # 只有需要可信启动时才加载可信启动模块
+            from trust_start import trustStart
+
             # 可信启动成功前不连接无人机，每秒检查一次可信启动状态
             while trustStart.getTrustStartStatus() is None:
                 time.sleep(1)
@@ -38,29 +48,100 @@ class UAV:
             # 可信启动后更新无人机状态
             if trustStart.getTrustStartStatus() == "success":
                 time.sleep(2)  # 等待固件初始化
-                self.controlMavlink = mavutil.mavlink_connection("/dev/ttyACM1")
-                self.dataMavlink = mavutil.mavlink_connection("/dev/ttyACM0")
-                self.wait_heartbeat()
-                self.controlMavlink.mav.request_data_stream_send(self.controlMavlink.target_system,
-                                                                 self.controlMavlink.target_component,
-                                                                 mavutil.mavlink.MAV_DATA_STREAM_ALL,
-                                                                 rate,
-                                                                 1)
-                self.dataMavlink.mav.request_data_stream_send(self.dataMavlink.target_system,
-                                                              self.dataMavlink.target_component,
-                                                              mavutil.mavlink.MAV_DATA_STREAM_ALL,
-                                                              rate,
-                                                              1)
-                self.inAir = False
-                self.clear_mission()
+                self.connect(controlDevice, dataDevice, rate)
+
+    def connect(self, controlDevice, dataDevice, rate):
+        """打开控制和数据连接，等待心跳，请求数据流，启动读线程并清除自驾仪上已有的任务"""
+        self.controlMavlink = mavutil.mavlink_connection(controlDevice)
+        if dataDevice == controlDevice:
+            self.dataMavlink = self.controlMavlink
+        else:
+            self.dataMavlink = mavutil.mavlink_connection(dataDevice)
+
+        self.wait_heartbeat()
+
+        for connection in self.connections():
+            connection.mav.request_data_stream_send(connection.target_system,
+                                                    connection.target_component,
+                                                    mavutil.mavlink.MAV_DATA_STREAM_ALL,
+                                                    rate,
+                                                    1)
+        # 传感器数据超过两个数据流周期未更新视为数据链路中断，不再使用缓存值
+        self.sensorMaxAge = 2.0 / rate if rate else None
+        self.start_hubs()
+        self.inAir = False
+        self.uploadedMissionHash = None
+        self.lastUploadStats = None
+        self.clear_mission()
+
+    def connections(self):
+        """
+        :return: 控制连接和数据连接，共用一个连接时只返回一个
+        """
+        if self.dataMavlink is self.controlMavlink:
+            return [self.controlMavlink]
+        return [self.controlMavlink, self.dataMavlink]
 
     def wait_heartbeat(self):
-        """等待第一个心跳包"""
+        """等待第一个心跳包，两条连接同时等待"""
         print("等待心跳包...")
-        self.controlMavlink.wait_heartbeat()
-        self.dataMavlink.wait_heartbeat()
+        threads = [threading.Thread(target=self._wait_heartbeat, args=(connection,), name="heartbeat-wait")
+                   for connection in self.connections()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
         print("已收到心跳包!")
 
+    @staticmethod
+    def _wait_heartbeat(connection):
+        # 等待期间每秒发送一次地面站心跳：UDP等连接要先收到本端的数据才知道向哪里回复
+        while True:
+            connection.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS, mavutil.mavlink.MAV_AUTOPILOT_INVALID,
+                                          0, 0, 0)
+            if connection.wait_heartbeat(timeout=1) is not None:
+                return
+
+    def start_hubs(self):
+        """
+        启动后台读线程，此后所有MAVLink消息只能通过controlHub/dataHub读取；
+        同时创建持续飞行使用的速度设定点发送器，其发送线程在第一次持续飞行时才启动
+        """
+        self.controlHub = MavlinkHub(self.controlMavlink, name="control")
+        self.controlHub.start()
+        if self.dataMavlink is self.controlMavlink:
+            # 一个连接只能有一个读线程
+            self.dataHub = self.controlHub
+        else:
+            self.dataHub = MavlinkHub(self.dataMavlink, name="data")
+            self.dataHub.start()
+        self.setpoints = SetpointStreamer(self.controlMavlink)
+
+    def wait_armed(self, timeout=30, cancel=None):
+        """
+        等待电机解锁，替代motors_armed_wait（后者会直接读取连接，与读线程冲突）
+
+        参数:
+            cancel: 可选的threading.Event，置位后抛出OperationCancelled
+        返回:
+            bool: 超时前是否已解锁
+        """
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            # 只看调用之后收到的自驾仪心跳，motors_armed()可能还是降落或返航前旧心跳中的解锁状态
+            heartbeat = self.controlHub.wait('HEARTBEAT', timeout=min(remaining, 1), condition=self._is_autopilot,
+                                             cancel=cancel)
+            check_cancel(cancel)
+            if heartbeat and heartbeat.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED:
+                return True
+
+    def _is_autopilot(self, heartbeat):
+        return (heartbeat.get_srcSystem() == self.controlMavlink.target_system and
+                heartbeat.type != mavutil.mavlink.MAV_TYPE_GCS)
+
     def get_current_mode(self):
         """
         获取当前飞行模式
@@ -80,8 +161,8 @@ class UAV:
             }
 
             for _ in range(5):
-                # 获取心跳包
-                msg = self.controlMavlink.recv_match(type='HEARTBEAT', blocking=True, timeout=1)
+                # 获取心跳包，优先使用缓存中最近的心跳
+                msg = self.controlHub.latest('HEARTBEAT', maxAge=2) or self.controlHub.wait('HEARTBEAT', timeout=1)
                 if msg:
                     # 获取custom_mode值并映射到对应的模式名称
                     mode = mode_mapping.get(msg.custom_mode)
@@ -97,31 +178,36 @@ class UAV:
             print(f"获取飞行模式失败: {str(e)}")
             return None
 
-    def arm_and_takeoff(self, target_altitude):
+    def arm_and_takeoff(self, target_altitude, cancel=None):
         """
         解锁并起飞到目标高度
 
         参数:
             target_altitude (float): 目标高度(米)
+            cancel: 可选的threading.Event，置位后停止等待并抛出OperationCancelled，已发送的起飞命令不撤回
         返回:
             bool: 是否起飞成功
         """
         try:
             print("准备起飞...")
+            check_cancel(cancel)
 
             self.controlMavlink.set_mode_apm("GUIDED")
 
             # 检查GPS状态
-            gps = self.dataMavlink.recv_match(type='GPS_RAW_INT', blocking=True, timeout=1)
+            gps = (self.dataHub.latest('GPS_RAW_INT', maxAge=2) or
+                   self.dataHub.wait('GPS_RAW_INT', timeout=1, cancel=cancel))
+            check_cancel(cancel)
             if not gps or gps.fix_type < 3:
                 print("GPS信号不足，无法起飞")
                 return False
 
-            # 解锁
+            # 解锁，已解锁时自驾仪忽略该命令；缓存的解锁状态可能已过时，因此总是发送并等待新心跳确认
             print("解锁电机...")
-            if not self.controlMavlink.motors_armed():
-                self.controlMavlink.arducopter_arm()
-                self.controlMavlink.motors_armed_wait()
+            self.controlMavlink.arducopter_arm()
+            if not self.wait_armed(cancel=cancel):
+                print("电机解锁超时")
+                return False
             print("电机已解锁")
 
             # 起飞命令
@@ -138,6 +224,7 @@ class UAV:
             timeout = time.time() + 30  # 30秒超时
             last_alt = 0
             while True:
+                check_cancel(cancel)
                 if time.time() > timeout:
                     print("起飞超时")
                     return False
@@ -152,12 +239,16 @@ class UAV:
 
                     if abs(current_altitude - target_altitude) < 0.5:  # 允许0.5米误差
                         break
-                time.sleep(0.5)
+                # 等待下一个位置包，而不是固定休眠
+                self.dataHub.wait('GLOBAL_POSITION_INT', timeout=0.5, cancel=cancel)
 
             print(f"已到达目标高度 {target_altitude} 米")
             self.inAir = True
             return True
 
+        except OperationCancelled:
+            print("起飞被中断")
+            raise
         except Exception as e:
             print(f"起飞过程出错: {str(e)}")
             return False
@@ -204,7 +295,7 @@ class UAV:
                         if not self.controlMavlink.motors_armed():
                             break
 
-                time.sleep(0.5)
+                self.dataHub.wait('GLOBAL_POSITION_INT', timeout=0.5)
 
             print("降落完成")
             self.inAir = False
@@ -214,42 +305,22 @@ class UAV:
             print(f"降落过程出错: {str(e)}")
             return False
 
-    def move_continuous(self, event, forward=0, right=0, down=0):
+    def move_continuous(self, forward=0, right=0, down=0, yawRate=0, hold=None):
         """
-        持续移动无人机直到用户输入停止
+        持续移动无人机，直到stop_continuous、新的目标或超过hold秒未更新。
+        速度目标由常驻的SetpointStreamer按固定频率发送，重复调用只更新目标，不会创建新线程
         参数:
             forward (float): 前进速度(米/秒),正值前进,负值后退
             right (float): 右移速度(米/秒),正值右移,负值左移
             down (float): 下降速度(米/秒),正值下降,负值上升
+            yawRate (float): 偏航角速率(弧度/秒)
+            hold (float): 目标保持的秒数，None使用SetpointStreamer的deadman，0表示一直保持到stop_continuous
         """
-        self.controlMavlink.set_mode_apm("GUIDED")
+        self.setpoints.set(forward, right, down, yawRate, hold)
 
-        print(f"无人机将以速度前进{forward}米/秒，右移{right}米/秒，下降{down}米/秒")
-        type_mask = 0b010111000111  # 使用速度控制
-        while event.is_set():
-            self.controlMavlink.mav.set_position_target_local_ned_send(
-                0,  # 时间戳
-                self.controlMavlink.target_system,  # 目标系统
-                self.controlMavlink.target_component,  # 目标组件
-                mavutil.mavlink.MAV_FRAME_BODY_OFFSET_NED,  # 坐标系
-                type_mask,  # 类型掩码
-                0, 0, 0,  # x, y, z位置
-                forward, right, down,  # x, y, z速度
-                0, 0, 0,  # x, y, z加速度
-                0, 0  # 偏航角,偏航角速率
-            )
-            time.sleep(0.1)
-        self.controlMavlink.mav.set_position_target_local_ned_send(
-            0,  # 时间戳
-            self.controlMavlink.target_system,  # 目标系统
-            self.controlMavlink.target_component,  # 目标组件
-            mavutil.mavlink.MAV_FRAME_BODY_OFFSET_NED,  # 坐标系
-            type_mask,  # 类型掩码
-            0, 0, 0,  # x, y, z位置
-            0, 0, 0,  # x, y, z速度
-            0, 0, 0,  # x, y, z加速度
-            0, 0  # 偏航角,偏航角速率
-        )
+    def stop_continuous(self):
+        """停止持续移动，悬停"""
+        self.setpoints.stop()
 
     def move_relative(self, forward=0, right=0, down=0):
         """
@@ -277,54 +348,74 @@ class UAV:
     def read_mission(self):
         # 验证上传的航点
         print("\n开始读取上传的航点...")
-        self.controlMavlink.mav.mission_request_list_send(
-            self.controlMavlink.target_system,
-            self.controlMavlink.target_component
-        )
+        with self.controlHub.subscribe(['MISSION_COUNT', 'MISSION_ITEM_INT']) as sub:
+            self.controlMavlink.mav.mission_request_list_send(
+                self.controlMavlink.target_system,
+                self.controlMavlink.target_component
+            )
 
-        msg = self.controlMavlink.recv_match(type=['MISSION_COUNT'], blocking=True)
-        if msg:
-            count = msg.count
-            print(f"总航点数：{count}")
-
-            for i in range(count):
-                self.controlMavlink.mav.mission_request_int_send(
-                    self.controlMavlink.target_system,
-                    self.controlMavlink.target_component,
-                    i
-                )
-                msg = self.controlMavlink.recv_match(type=['MISSION_ITEM_INT'], blocking=True)
-                if msg:
-                    if msg.command == mavutil.mavlink.MAV_CMD_NAV_TAKEOFF:
-                        print(
-                            f"航点 {i + 1}: 起飞点 - 纬度={msg.x / 1e7:.7f}, 经度={msg.y / 1e7:.7f}, 高度={msg.z:.1f}米")
-                    elif msg.command == mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH:
-                        print(f"航点 {i + 1}: RTL (返航点)")
+            msg = self._next_message(sub, 'MISSION_COUNT', timeout=5)
+            if msg:
+                count = msg.count
+                print(f"总航点数：{count}")
+
+                for i in range(count):
+                    self.controlMavlink.mav.mission_request_int_send(
+                        self.controlMavlink.target_system,
+                        self.controlMavlink.target_component,
+                        i
+                    )
+                    msg = self._next_message(sub, 'MISSION_ITEM_INT', timeout=5)
+                    if msg:
+                        if msg.command == mavutil.mavlink.MAV_CMD_NAV_TAKEOFF:
+                            print(
+                                f"航点 {i + 1}: 起飞点 - 纬度={msg.x / 1e7:.7f}, 经度={msg.y / 1e7:.7f}, 高度={msg.z:.1f}米")
+                        elif msg.command == mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH:
+                            print(f"航点 {i + 1}: RTL (返航点)")
+                        else:
+                            print(f"航点 {i + 1}: 纬度={msg.x / 1e7:.7f}, 经度={msg.y / 1e7:.7f}, 高度={msg.z:.1f}米")
                     else:
-                        print(f"航点 {i + 1}: 纬度={msg.x / 1e7:.7f}, 经度={msg.y / 1e7:.7f}, 高度={msg.z:.1f}米")
-
-    def clear_mission(self):
+                        print(f"读取航点 {i + 1} 超时")
+            else:
+                print("读取航点失败：未收到MISSION_COUNT")
+
+    @staticmethod
+    def _next_message(sub, msgType, timeout):
+        """从订阅中取出下一条指定类型的消息，超时返回None，timeout为None时一直等待"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+            msg = sub.get(timeout=remaining)
+            if msg is not None and msg.get_type() == msgType:
+                return msg
+
+    def clear_mission(self, timeout=1):
         print("正在清除已有航点任务...")
-        self.controlMavlink.mav.mission_clear_all_send(
-            self.controlMavlink.target_system,
-            self.controlMavlink.target_component
-        )
-        time.sleep(1)
+        with self.controlHub.subscribe(['MISSION_ACK']) as sub:
+            self.controlMavlink.mav.mission_clear_all_send(
+                self.controlMavlink.target_system,
+                self.controlMavlink.target_component
+            )
+            # 等待自驾仪确认，而不是固定等待1秒
+            ack = self._next_message(sub, 'MISSION_ACK', timeout=timeout)
+        self.uploadedMissionHash = None
+        if ack is None:
+            print("清除航点任务未收到确认")
+            return False
         print("已有航点任务已清除")
+        return True
 
-    def upload_mission(self, waypoints, return_to_launch=False):
+    @staticmethod
+    def build_mission_items(waypoints, return_to_launch=False):
         """
-        上传航点任务
-
-        参数:
-            waypoints: 航点列表，每个航点包含 lat(纬度)、lon(经度)、alt(高度)
-            return_to_launch: 是否在任务完成后返航
-        返回:
-            bool: 是否上传成功
+        把航点列表转换为任务项：起飞点 + 用户航点 + 可选的返航点
+        :param waypoints: 航点列表，每个航点包含 lat(纬度)、lon(经度)、alt(高度)
+        :return: 任务项列表
         """
-        print("开始上传航点任务...")
-
-        # 准备任务项
         mission_items = []
 
         # 添加起飞点作为第一个航点
@@ -371,67 +462,142 @@ class UAV:
                 'y': 0,
                 'z': 0
             })
-
-        # 清除已有任务
-        self.clear_mission()
-
-        # 设置任务数量
-        self.controlMavlink.mav.mission_count_send(
+        return mission_items
+
+    @staticmethod
+    def mission_hash(mission_items):
+        """按实际发送给自驾仪的字段（经纬度取1e-7度的整数）计算任务的哈希值"""
+        digest = hashlib.sha256()
+        for item in mission_items:
+            digest.update(struct.pack('<H?4fiif', item['command'], bool(item['autocontinue']),
+                                      item['param1'], item['param2'], item['param3'], item['param4'],
+                                      int(item['x'] * 1e7), int(item['y'] * 1e7), float(item['z'])))
+        return digest.hexdigest()
+
+    def send_mission_item(self, seq, item):
+        self.controlMavlink.mav.mission_item_int_send(
             self.controlMavlink.target_system,
             self.controlMavlink.target_component,
-            len(mission_items)
+            seq,
+            mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
+            item['command'],
+            item['current'],
+            item['autocontinue'],
+            item['param1'],
+            item['param2'],
+            item['param3'],
+            item['param4'],
+            int(item['x'] * 1e7),
+            int(item['y'] * 1e7),
+            float(item['z'])
         )
 
-        # 等待mission_request并发送航点
-        for i, item in enumerate(mission_items):
-            msg = self.controlMavlink.recv_match(type=['MISSION_REQUEST'], blocking=True)
-            if msg is None:
-                print("上传航点失败：未收到MISSION_REQUEST")
-                return False
+    def upload_mission(self, waypoints, return_to_launch=False, force=False, item_timeout=MISSION_ITEM_TIMEOUT,
+                       max_retries=MISSION_MAX_RETRIES, cancel=None):
+        """
+        上传航点任务。按自驾仪请求的序号发送航点（支持MISSION_REQUEST和MISSION_REQUEST_INT、乱序和重复请求），
+        等待超时则重发上一步的消息，连续超时max_retries次后放弃。
+        与上一次成功上传的任务相同时跳过上传。
+
+        参数:
+            waypoints: 航点列表，每个航点包含 lat(纬度)、lon(经度)、alt(高度)
+            return_to_launch: 是否在任务完成后返航
+            force: 为True时即使任务相同也重新上传
+            item_timeout: 等待每个请求的超时时间（秒）
+            max_retries: 连续超时的最大重传次数
+            cancel: 可选的threading.Event，置位后放弃上传并抛出OperationCancelled
+        返回:
+            bool: 是否上传成功
+        """
+        mission_items = self.build_mission_items(waypoints, return_to_launch)
+        missionHash = self.mission_hash(mission_items)
+        if not force and missionHash == self.uploadedMissionHash:
+            print("机载任务与本次任务相同，跳过上传")
+            self.lastUploadStats = {"items": len(mission_items), "seconds": 0.0, "retransmits": 0, "skipped": True}
+            return True
 
-            self.controlMavlink.mav.mission_item_int_send(
+        print(f"开始上传航点任务，共{len(mission_items)}项...")
+        # 上传过程中自驾仪的任务处于未知状态，成功之前不认为与任何任务相同
+        self.uploadedMissionHash = None
+        start = time.time()
+        retransmits = 0
+        retries = 0
+        lastSeq = None  # 最近一次发送的航点序号，None表示还没有收到请求
+        requested = set()
+
+        # 先订阅再发送，避免读线程先收到请求而丢失。MISSION_COUNT会覆盖自驾仪上的已有任务，不需要先清除
+        with self.controlHub.subscribe(['MISSION_REQUEST', 'MISSION_REQUEST_INT', 'MISSION_ACK']) as sub:
+            self.controlMavlink.mav.mission_count_send(
                 self.controlMavlink.target_system,
                 self.controlMavlink.target_component,
-                i,
-                mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
-                item['command'],
-                item['current'],
-                item['autocontinue'],
-                item['param1'],
-                item['param2'],
-                item['param3'],
-                item['param4'],
-                int(item['x'] * 1e7),
-                int(item['y'] * 1e7),
-                float(item['z'])
+                len(mission_items)
             )
 
-        # 等待mission_ack
-        msg = self.controlMavlink.recv_match(type=['MISSION_ACK'], blocking=True)
-        if msg is None:
-            print("上传航点失败：未收到MISSION_ACK")
-            return False
-
-        print("\n航点任务上传成功" + (" (任务结束后将返航)" if return_to_launch else ""))
+            while True:
+                msg = sub.get(timeout=item_timeout, cancel=cancel)
+                check_cancel(cancel)
+                if msg is None:
+                    retries += 1
+                    if retries > max_retries:
+                        print(f"上传航点失败：连续{max_retries}次未收到自驾仪响应")
+                        return False
+                    # 重发上一步：还没有收到请求时重发MISSION_COUNT，否则重发最近请求的航点
+                    retransmits += 1
+                    if lastSeq is None:
+                        self.controlMavlink.mav.mission_count_send(
+                            self.controlMavlink.target_system,
+                            self.controlMavlink.target_component,
+                            len(mission_items)
+                        )
+                    else:
+                        self.send_mission_item(lastSeq, mission_items[lastSeq])
+                    continue
+
+                msgType = msg.get_type()
+                if msgType in ('MISSION_REQUEST', 'MISSION_REQUEST_INT'):
+                    seq = msg.seq
+                    if seq >= len(mission_items):
+                        print(f"自驾仪请求了不存在的航点 {seq}，已忽略")
+                        continue
+                    if seq in requested:
+                        # 重复请求说明自驾仪没有收到该航点
+                        retransmits += 1
+                    else:
+                        requested.add(seq)
+                        retries = 0
+                    lastSeq = seq
+                    self.send_mission_item(seq, mission_items[seq])
+                elif msgType == 'MISSION_ACK':
+                    if lastSeq is None and msg.type == mavutil.mavlink.MAV_MISSION_ACCEPTED:
+                        # 收到请求之前的确认是之前操作（如清除任务）遗留的，忽略
+                        continue
+                    if msg.type != mavutil.mavlink.MAV_MISSION_ACCEPTED:
+                        print(f"上传航点失败：自驾仪拒绝任务，错误码 {msg.type}")
+                        return False
+                    break
+
+        self.uploadedMissionHash = missionHash
+        self.lastUploadStats = {"items": len(mission_items), "seconds": time.time() - start,
+                                "retransmits": retransmits, "skipped": False}
+        print(f"\n航点任务上传成功，共{len(mission_items)}项，耗时{self.lastUploadStats['seconds']:.2f}秒，"
+              f"重传{retransmits}次" + (" (任务结束后将返航)" if return_to_launch else ""))
         return True
 
-    def execute_mission(self, takeoff_altitude=10):
+    def execute_mission(self, takeoff_altitude=10, cancel=None):
         """
         执行已上传的航点任务
         :param takeoff_altitude: 起飞高度
+        :param cancel: 可选的threading.Event，置位后停止等待并抛出OperationCancelled
         :return bool: 是否执行成功
         """
         print("等待GPS初始化...")
 
         # 等待GPS信号
-        while True:
-            msg = self.dataMavlink.recv_match(type=['GPS_RAW_INT'], blocking=True)
-            if msg and msg.fix_type >= 3:
-                print("GPS已锁定")
-                break
-            time.sleep(1)
+        self.dataHub.wait('GPS_RAW_INT', condition=lambda gps: gps.fix_type >= 3, fresh=False, cancel=cancel)
+        check_cancel(cancel)
+        print("GPS已锁定")
 
-        if self.arm_and_takeoff(takeoff_altitude):
+        if self.arm_and_takeoff(takeoff_altitude, cancel):
 
             self.controlMavlink.set_mode_apm("AUTO")
 
@@ -449,11 +615,15 @@ class UAV:
             return True
         else:
             print("无法起飞，任务执行失败")
+            return False
 
-    def wait_mission_complete(self):
+    def wait_mission_complete(self, cancel=None):
         """
         等待航点任务完成，只有在设定航点结束后自动返回才可以使用
 
+        参数:
+            cancel: 可选的threading.Event，置位后停止等待并抛出OperationCancelled，自驾仪上的任务不会停止，
+                    由抢占的指令（如降落）切换飞行模式
         返回:
             bool: 任务是否成功完成
         """
@@ -462,17 +632,20 @@ class UAV:
         startMission = 0
         timeout = time.time() + 600  # 10分钟超时
 
-        while True:
-            if time.time() > timeout:
-                print("任务执行超时")
-                return False
+        # 订阅MISSION_CURRENT，保证不会漏掉航点序号的变化
+        with self.dataHub.subscribe(['MISSION_CURRENT']) as sub:
+            while True:
+                remaining = timeout - time.time()
+                if remaining <= 0:
+                    print("任务执行超时")
+                    return False
 
-            # 获取当前航点信息
-            msg = self.dataMavlink.recv_match(type=['MISSION_CURRENT'], blocking=True)
-            if msg is None:
-                continue
+                # 获取当前航点信息
+                msg = sub.get(timeout=min(remaining, 1), cancel=cancel)
+                check_cancel(cancel)
+                if msg is None:
+                    continue
 
-            if msg.get_type() == 'MISSION_CURRENT':
                 if msg.seq != 0 and startMission == 0:
                     startMission = 1
 
@@ -480,15 +653,16 @@ class UAV:
                     print("航点任务已完成")
                     return True
 
-            time.sleep(0.1)
-
     def getSensorsData(self):
         """
         获取IMU传感器数据(加速度计、陀螺仪和磁力计)和GPS数据
        :return: dict 包含加速度计、陀螺仪、磁力计和GPS数据
        """
-        imuData = self.dataMavlink.recv_match(type=['RAW_IMU'], blocking=True)
-        gpsData = self.dataMavlink.recv_match(type=['GLOBAL_POSITION_INT'], blocking=True)
+        # 直接读取读线程缓存的最新值，缓存为空（刚连接）或已过期（数据链路中断）时最多等待1秒，仍没有新数据则返回None
+        imuData = (self.dataHub.latest('RAW_IMU', maxAge=self.sensorMaxAge) or
+                   self.dataHub.wait('RAW_IMU', timeout=1))
+        gpsData = (self.dataHub.latest('GLOBAL_POSITION_INT', maxAge=self.sensorMaxAge) or
+                   self.dataHub.wait('GLOBAL_POSITION_INT', timeout=1))
         if imuData is not None and gpsData is not None:
             return {
                 "curTime": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time())),
@@ -516,6 +690,37 @@ class UAV:
         else:
             return None
 
+    def getTelemetry(self):
+        """
+        从读线程缓存中组装一帧遥测数据（位置、速度、姿态、IMU），不阻塞
+        :return: dict，字段与codec.TELEMETRY_FIELDS一致（seq除外），尚未收到位置数据时返回None
+        """
+        position, timestamp = self.dataHub.latestWithTime('GLOBAL_POSITION_INT')
+        if position is None:
+            return None
+        attitude = self.dataHub.latest('ATTITUDE')
+        imu = self.dataHub.latest('RAW_IMU')
+
+        return {
+            "time": timestamp,
+            "lat": position.lat / 1e7,  # 转换为度
+            "lon": position.lon / 1e7,
+            "alt": position.alt / 1000.0,  # 转换为米
+            "relativeAlt": position.relative_alt / 1000.0,
+            "vx": position.vx / 100.0,  # 转换为米/秒
+            "vy": position.vy / 100.0,
+            "vz": position.vz / 100.0,
+            "roll": attitude.roll if attitude else 0.0,  # 弧度
+            "pitch": attitude.pitch if attitude else 0.0,
+            "yaw": attitude.yaw if attitude else 0.0,
+            "xacc": imu.xacc / 1000.0 if imu else 0.0,  # 转换为g
+            "yacc": imu.yacc / 1000.0 if imu else 0.0,
+            "zacc": imu.zacc / 1000.0 if imu else 0.0,
+            "xgyro": imu.xgyro / 1000.0 if imu else 0.0,  # 转换为rad/s
+            "ygyro": imu.ygyro / 1000.0 if imu else 0.0,
+            "zgyro": imu.zgyro / 1000.0 if imu else 0.0,
+        }
+
     def get_data_periodically(self, interval=1):
         """
         以指定的时间间隔获取IMU数据和GPS数据
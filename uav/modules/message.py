@@ -1,15 +1,17 @@
 import json
-import threading
 import queue
+import pika
 from modules.RabbitMQClient import RabbitMQClient
+from modules import codec
 
 rabbitMQ = None
 recvQueueDict = {}
-sendQueue = queue.Queue()
+g_clientName = ""
+g_codec = codec.JSON
 
 
 def init():
-    global rabbitMQ, recvQueueDict
+    global rabbitMQ, recvQueueDict, g_clientName, g_codec
     with open("config.json", "r") as fp:
         config = json.loads(fp.read())
         clientName = config.get("clientName")
@@ -18,48 +20,75 @@ def init():
         rabbitMQUserName = config.get("service").get("message").get("rabbitMQ").get("userName")
         rabbitMQPassword = config.get("service").get("message").get("rabbitMQ").get("password")
         serviceTypeList = list(config["service"].keys())
+        # 发送消息使用的编码，同时告知服务器本机可以接收该编码
+        g_codec = config.get("service").get("message").get("codec", codec.JSON)
+        # 发送队列容量，Broker不可用时超出的最旧消息被丢弃
+        sendQueueCapacity = config.get("service").get("message").get("sendQueueSize", 1000)
+        g_clientName = clientName
 
     # 创建rabbitMQ对象
     rabbitMQ = RabbitMQClient(host=rabbitMQHost, port=rabbitMQPort, userName=rabbitMQUserName,
                               password=rabbitMQPassword,
-                              client_name=clientName)
+                              client_name=clientName, max_queue=sendQueueCapacity)
     for serviceType in serviceTypeList:
         recvQueueDict[serviceType] = queue.Queue()
 
-    # 开启消息接收线程
-    threading.Thread(target=rabbitMQ.receive, args=(dataReceiveCallBack,)).start()
-
-    # 开启消息发送线程
-    threading.Thread(target=dataSendService).start()
+    # 收发共用RabbitMQClient的IO线程，接收回调只负责解码并放入对应服务的队列
+    rabbitMQ.receive(dataReceiveCallBack)
 
 
 def dataReceiveCallBack(ch, method, properties, body):
-    messagePackage = json.loads(body.decode())
+    try:
+        messagePackage = codec.decode(body, codec.codecOf(properties.content_type))
+    except Exception as e:
+        print(f"解析服务器消息失败: {e}")
+        return
 
     serviceType = messagePackage.get("serviceType")
 
     recvQueueDict[serviceType].put(messagePackage)
 
 
-def dataSendService():
-    """
-    持续从发送队列中获取数据并调用rabbitmq的send方法发送。
-    :return: 无
-    """
-    while True:
-        serviceType, data = sendQueue.get()
-        rabbitMQ.send(serviceType, data)
-
-
 def send(serviceType, data):
     """
-    外部调用的发送数据方法，将其加入发送队列
+    外部调用的发送数据方法，编码后放入RabbitMQClient的发送队列，不会阻塞调用方
     :param serviceType:
-    :param data:
+    :param data: 消息字典，形如{"dataType": dataType, "dataPackage": dataPackage}，按配置的编码发送；
+                 也可以是已编码的字节串
     :return:
     """
-    sendQueue.put((serviceType, data))
+    if isinstance(data, dict):
+        data.setdefault("clientName", g_clientName)
+        properties = pika.BasicProperties(content_type=codec.contentType(g_codec),
+                                          headers={codec.ACCEPT_HEADER: g_codec})
+        rabbitMQ.send(serviceType, codec.encode(data, g_codec), properties)
+    else:
+        # 兼容直接传入已编码字节串的调用方
+        rabbitMQ.send(serviceType, data)
 
 
 def recv(serviceType):
     return recvQueueDict[serviceType].get()
+
+
+def sendQueueSize():
+    """待发送及等待Broker确认的消息数"""
+    return rabbitMQ.pending()
+
+
+def sendDropped():
+    """发送队列满时丢弃的消息数"""
+    return rabbitMQ.dropped
+
+
+def waitConnected(timeout=None):
+    """
+    等待与Broker的连接就绪，init不会等待连接建立
+    :return: 超时前是否已连接
+    """
+    return rabbitMQ.connected.wait(timeout)
+
+
+def sendLatency():
+    """最近消息从入队到Broker确认耗时的滑动平均（秒），用于判断链路是否拥塞"""
+    return rabbitMQ.sendLatency
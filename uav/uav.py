@@ -1,16 +1,61 @@
+import json
+import sys
+import threading
+import time
+from modules import startup
 from modules import message
-from modules.UAV import UAV
 from flight_control import flightControl
+from flight_control import recorder
+from flight_control import telemetry
+
+# 启动耗时报告，命令行加--startup-report时在启动完成后打印各阶段耗时
+STARTUP_REPORT = "--startup-report" in sys.argv
+
+
+def recordBrokerConnect(start):
+    # message.init不等待连接建立，在后台记录连接就绪的时间，与MAVLink连接同时进行
+    if message.waitConnected(timeout=60):
+        startup.record("broker connect", start)
+
 
 if __name__ == "__main__":
-    message.init()
+    startup.record("imports", startup.g_bootTime)
+
+    brokerStart = time.perf_counter()
+    with startup.phase("message init"):
+        message.init()
+    brokerThread = threading.Thread(target=recordBrokerConnect, args=(brokerStart,), name="startup-broker",
+                                    daemon=True)
+    brokerThread.start()
 
     print("无人机的message初始化成功")
 
-    uav = UAV(jumpTrustStart=True)
+    # pymavlink导入较慢，放在消息服务启动之后导入，与Broker连接同时进行
+    with startup.phase("import pymavlink"):
+        from modules.UAV import UAV, CONTROL_DEVICE, DATA_DEVICE
+
+    with open("config.json", "r") as fp:
+        mavlinkConfig = json.loads(fp.read()).get("service").get("mavlink", {})
+
+    # 连接字符串可以改为模拟自驾仪的地址，如"udpout:127.0.0.1:14560"
+    with startup.phase("mavlink connect"):
+        uav = UAV(mavlinkConfig.get("rate", 4), jumpTrustStart=True,
+                  controlDevice=mavlinkConfig.get("control", CONTROL_DEVICE),
+                  dataDevice=mavlinkConfig.get("data", DATA_DEVICE))
 
     print("无人机的uav初始化成功")
 
-    flightControl.init(uav)
+    with startup.phase("flight control init"):
+        flightControl.init(uav)
+
+    print("无人机的飞行器初始化成功")
+
+    recorder.init(uav)
+
+    telemetry.init(uav)
 
-    print("无人机的飞行器初始化成功")
\ No newline at end of file
+    print(f"无人机启动完成，耗时{startup.elapsed() * 1000:.0f}ms")
+    if STARTUP_REPORT:
+        # Broker连接通常早已就绪，稍等片刻使报告包含该阶段
+        brokerThread.join(timeout=1)
+        print(startup.report())